@@ -31,6 +31,12 @@ async def admin_install_suna_for_user(
             detail=f"Failed to install Suna agent for user {account_id}"
         )
 
+@router.get("/stream-hub/stats")
+async def get_stream_hub_stats(_: bool = Depends(verify_admin_api_key)):
+    """Fan-out hub and Redis pool usage of this API process."""
+    from services.run_hub import run_hub
+    return run_hub.get_stats()
+
 @router.get("/env-vars")
 def get_env_vars() -> Dict[str, str]:
     """Get environment variables (local mode only)."""
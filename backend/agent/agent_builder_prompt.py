@@ -458,9 +458,10 @@ I'm here to help you create an agent that will genuinely transform how you work.
 **Ready to start?** Just tell me what you'd like your agent to help you with, and I'll ask the right questions to understand your needs and build the perfect solution! 🚀"""
 
 
-def get_agent_builder_prompt():
+def get_agent_builder_prompt(include_time: bool = True):
+    # AGENT_BUILDER_SYSTEM_PROMPT is an f-string, so its {{current_time}} reaches .format as {current_time}
     return AGENT_BUILDER_SYSTEM_PROMPT.format(
         current_date=datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d'),
-        current_time=datetime.datetime.now(datetime.timezone.utc).strftime('%H:%M:%S'),
+        current_time=datetime.datetime.now(datetime.timezone.utc).strftime('%H:%M:%S') if include_time else "see the end of this prompt",
         current_year=datetime.datetime.now(datetime.timezone.utc).strftime('%Y')
     )
\ No newline at end of file
@@ -12,13 +12,17 @@ import tempfile
 import os
 
 from agentpress.thread_manager import ThreadManager
+from agentpress.message_cache import message_cache
 from services.supabase import DBConnection
 from services import redis
+from services.response_publisher import publish_control_signal, read_response_stream, response_stream_key, uses_stream_transport
+from services.run_hub import run_hub
 from utils.auth_utils import get_current_user_id_from_jwt, get_user_id_from_stream_auth, verify_thread_access, verify_admin_api_key
 from utils.logger import logger, structlog
 from services.billing import check_billing_status, can_use_model
 from utils.config import config
-from sandbox.sandbox import create_sandbox, delete_sandbox, get_or_start_sandbox
+from sandbox.sandbox import delete_sandbox, get_or_start_sandbox
+from sandbox.pool import acquire_sandbox
 from services.llm import make_llm_api_call
 from run_agent_background import run_agent_background, _cleanup_redis_response_list, update_agent_run_status
 from utils.constants import MODEL_NAME_ALIASES
@@ -222,17 +226,6 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     client = await db.client
     final_status = "failed" if error_message else "stopped"
 
-    # Attempt to fetch final responses from Redis
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    all_responses = []
-    try:
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
-        logger.info(f"Fetched {len(all_responses)} responses from Redis for DB update on stop/fail: {agent_run_id}")
-    except Exception as e:
-        logger.error(f"Failed to fetch responses from Redis for {agent_run_id} during stop/fail: {e}")
-        # Try fetching from DB as a fallback? Or proceed without responses? Proceeding without for now.
-
     # Update the agent run status in the database
     update_success = await update_agent_run_status(
         client, agent_run_id, final_status, error=error_message
@@ -245,7 +238,7 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     # Send STOP signal to the global control channel
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
-        await redis.publish(global_control_channel, "STOP")
+        await publish_control_signal(agent_run_id, "STOP")
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
@@ -703,7 +696,7 @@ async def stream_agent_run(
     token: Optional[str] = None,
     request: Request = None
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run using Redis Lists and Pub/Sub, or Redis Streams."""
     logger.info(f"Starting stream for agent run: {agent_run_id}")
     client = await db.client
 
@@ -715,6 +708,28 @@ async def stream_agent_run(
         user_id=user_id,
     )
 
+    sse_headers = {
+        "Cache-Control": "no-cache, no-transform", "Connection": "keep-alive",
+        "X-Accel-Buffering": "no", "Content-Type": "text/event-stream",
+        "Access-Control-Allow-Origin": "*"
+    }
+
+    if uses_stream_transport():
+        # EventSource sends Last-Event-ID on reconnect; the query parameter covers fetch-based clients
+        last_event_id = None
+        if request:
+            last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+        return StreamingResponse(
+            _follow_response_stream(client, agent_run_id, last_event_id),
+            media_type="text/event-stream", headers=sse_headers
+        )
+
+    if config.STREAM_HUB_ENABLED:
+        return StreamingResponse(
+            _follow_run_hub(client, agent_run_id),
+            media_type="text/event-stream", headers=sse_headers
+        )
+
     response_list_key = f"agent_run:{agent_run_id}:responses"
     response_channel = f"agent_run:{agent_run_id}:new_response"
     control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
@@ -883,11 +898,99 @@ async def stream_agent_run(
             await asyncio.sleep(0.1)
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
-    return StreamingResponse(stream_generator(), media_type="text/event-stream", headers={
-        "Cache-Control": "no-cache, no-transform", "Connection": "keep-alive",
-        "X-Accel-Buffering": "no", "Content-Type": "text/event-stream",
-        "Access-Control-Allow-Origin": "*"
-    })
+    return StreamingResponse(stream_generator(), media_type="text/event-stream", headers=sse_headers)
+
+async def _follow_run_hub(client, agent_run_id: str):
+    """Stream the responses of an agent run from this process's fan-out hub.
+
+    All viewers of a run share one pub/sub subscription and an in-memory
+    buffer instead of subscribing and re-reading the Redis list per client.
+    """
+    logger.debug(f"Streaming responses for {agent_run_id} from the fan-out hub")
+    initial_yield_complete = False
+    try:
+        async for kind, payload in run_hub.subscribe(agent_run_id):
+            if kind == "response":
+                yield f"data: {payload}\n\n"
+                if initial_yield_complete and '"status"' in payload:
+                    response = json.loads(payload)
+                    if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
+                        logger.info(f"Detected run completion via status message in stream: {response.get('status')}")
+                        return
+            elif kind == "replayed":
+                initial_yield_complete = True
+                run_status = await client.table('agent_runs').select('status', 'thread_id').eq("id", agent_run_id).maybe_single().execute()
+                current_status = run_status.data.get('status') if run_status.data else None
+                if current_status != 'running':
+                    logger.info(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
+                    yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+                    return
+                structlog.contextvars.bind_contextvars(thread_id=run_status.data.get('thread_id'))
+            elif kind == "control":
+                yield f"data: {json.dumps({'type': 'status', 'status': payload})}\n\n"
+                return
+            else:
+                logger.error(f"Fan-out hub error for {agent_run_id}: {payload}")
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
+                return
+    except asyncio.CancelledError:
+        logger.info(f"Stream for agent run {agent_run_id} cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming agent run {agent_run_id} from the fan-out hub: {e}", exc_info=True)
+        if not initial_yield_complete:
+            yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+    finally:
+        logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
+
+
+async def _follow_response_stream(client, agent_run_id: str, last_event_id: Optional[str]):
+    """Stream the responses of an agent run from its Redis Stream.
+
+    A single blocking XREAD replaces the list replay and both pub/sub
+    subscriptions. Every event carries the stream entry ID, so a reconnecting
+    client resumes after the last event it received.
+    """
+    logger.debug(f"Streaming responses for {agent_run_id} from Redis Stream (cursor: {last_event_id or 'start'})")
+    try:
+        run_status = await client.table('agent_runs').select('status', 'thread_id').eq("id", agent_run_id).maybe_single().execute()
+        current_status = run_status.data.get('status') if run_status.data else None
+        if run_status.data:
+            structlog.contextvars.bind_contextvars(thread_id=run_status.data.get('thread_id'))
+
+        if current_status != 'running':
+            redis_client = await redis.get_client()
+            if not await redis_client.exists(response_stream_key(agent_run_id)):
+                logger.info(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
+                yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+                return
+
+        async for entry_id, response, control_signal in read_response_stream(agent_run_id, last_event_id):
+            if entry_id is None:
+                # No new entries within the block window: keep the connection alive and
+                # make sure the run did not end without writing a control entry
+                yield ": keep-alive\n\n"
+                run_status = await client.table('agent_runs').select('status').eq("id", agent_run_id).maybe_single().execute()
+                if not run_status.data or run_status.data.get('status') != 'running':
+                    yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+                    return
+                continue
+
+            if control_signal:
+                logger.info(f"Received control signal '{control_signal}' for {agent_run_id}")
+                yield f"id: {entry_id}\ndata: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
+                return
+
+            yield f"id: {entry_id}\ndata: {json.dumps(response)}\n\n"
+            if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
+                logger.info(f"Detected run completion via status message in stream: {response.get('status')}")
+                return
+
+    except asyncio.CancelledError:
+        logger.info(f"Stream for agent run {agent_run_id} cancelled")
+    except Exception as e:
+        logger.error(f"Error streaming agent run {agent_run_id} from Redis Stream: {e}", exc_info=True)
+        yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {e}'})}\n\n"
 
 async def generate_and_update_project_name(project_id: str, prompt: str):
     """Generates a project name using an LLM and updates the database."""
@@ -1087,10 +1190,9 @@ async def initiate_agent_with_files(
         # 2. Create Sandbox
         sandbox_id = None
         try:
-          sandbox_pass = str(uuid.uuid4())
-          sandbox = await create_sandbox(sandbox_pass, project_id)
+          sandbox, sandbox_pass = await acquire_sandbox(project_id)
           sandbox_id = sandbox.id
-          logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
+          logger.info(f"Using sandbox {sandbox_id} for project {project_id}")
           
           # Get preview links
           vnc_link = await sandbox.get_preview_link(6080)
@@ -3011,10 +3113,9 @@ async def create_thread(
         # 2. Create Sandbox
         sandbox_id = None
         try:
-            sandbox_pass = str(uuid.uuid4())
-            sandbox = await create_sandbox(sandbox_pass, project_id)
+            sandbox, sandbox_pass = await acquire_sandbox(project_id)
             sandbox_id = sandbox.id
-            logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
+            logger.info(f"Using sandbox {sandbox_id} for project {project_id}")
             
             # Get preview links
             vnc_link = await sandbox.get_preview_link(6080)
@@ -3217,6 +3318,7 @@ async def delete_message(
     try:
         # Don't allow users to delete the "status" messages
         await client.table('messages').delete().eq('message_id', message_id).eq('is_llm_message', True).eq('thread_id', thread_id).execute()
+        await message_cache.invalidate(thread_id)
         return {"message": "Message deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting message {message_id} from thread {thread_id}: {str(e)}")
@@ -460,9 +460,9 @@ IMPORTANT: Use the `cat` command to view contents of small files (100 kb or less
   5. Try alternative queries if initial search results are inadequate
 
 - TIME CONTEXT FOR RESEARCH:
-  * CCURRENT YEAR: {datetime.datetime.now(datetime.timezone.utc).strftime('%Y')}
-  * CURRENT UTC DATE: {datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d')}
-  * CURRENT UTC TIME: {datetime.datetime.now(datetime.timezone.utc).strftime('%H:%M:%S')}
+  * CCURRENT YEAR: {{current_year}}
+  * CURRENT UTC DATE: {{current_date}}
+  * CURRENT UTC TIME: {{current_time}}
   * CRITICAL: When searching for latest news or time-sensitive information, ALWAYS use these current date/time values as reference points. Never use outdated information or assume different dates.
 
 # 5. WORKFLOW MANAGEMENT
@@ -1091,9 +1091,12 @@ Remember: You maintain all your core Suna capabilities while gaining the power t
   """
 
 
-def get_system_prompt():
+def get_system_prompt(include_time: bool = True):
+    # SYSTEM_PROMPT is an f-string, so its {{current_time}} reaches .format as {current_time}.
+    # Without the time the prompt only changes once a day, which keeps it cacheable;
+    # PromptManager appends the clock after the cached prefix instead.
     return SYSTEM_PROMPT.format(
         current_date=datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d'),
-        current_time=datetime.datetime.now(datetime.timezone.utc).strftime('%H:%M:%S'),
+        current_time=datetime.datetime.now(datetime.timezone.utc).strftime('%H:%M:%S') if include_time else "see the end of this prompt",
         current_year=datetime.datetime.now(datetime.timezone.utc).strftime('%Y')
     )
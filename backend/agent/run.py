@@ -1,6 +1,8 @@
 import os
 import json
 import asyncio
+import datetime
+import hashlib
 from typing import Optional, Dict, List, Any, AsyncGenerator
 from dataclasses import dataclass
 
@@ -23,16 +25,18 @@ from agent.prompt import get_system_prompt
 from agent.custom_prompt import render_prompt_template
 from utils.logger import logger
 from utils.auth_utils import get_account_id_from_thread
+from utils.model_registry import get_model_capabilities
+from agentpress.prompt_cache import prompt_cache
 from services.billing import check_billing_status
 from agent.tools.sb_vision_tool import SandboxVisionTool
 from agent.tools.sb_image_edit_tool import SandboxImageEditTool
-from services.langfuse import langfuse
-from langfuse.client import StatefulTraceClient
+from services.tracing import TraceHandle, tracer
 from agent.gemini_prompt import get_gemini_system_prompt
 from agent.tools.mcp_tool_wrapper import MCPToolWrapper
 from agent.tools.task_list_tool import TaskListTool
 from agentpress.tool import SchemaType
 from agent.tools.sb_sheets_tool import SandboxSheetsTool
+from sandbox.resolver import get_sandbox_resolver
 
 load_dotenv()
 
@@ -49,9 +53,10 @@ class AgentConfig:
     reasoning_effort: Optional[str] = 'low'
     enable_context_manager: bool = True
     agent_config: Optional[dict] = None
-    trace: Optional[StatefulTraceClient] = None
+    trace: Optional[TraceHandle] = None
     is_agent_builder: Optional[bool] = False
     target_agent_id: Optional[str] = None
+    stop_event: Optional[asyncio.Event] = None
 
 
 class ToolManager:
@@ -199,12 +204,7 @@ class MCPManager:
             await mcp_wrapper_instance.initialize_and_register_tools()
             
             updated_schemas = mcp_wrapper_instance.get_schemas()
-            for method_name, schema_list in updated_schemas.items():
-                for schema in schema_list:
-                    self.thread_manager.tool_registry.tools[method_name] = {
-                        "instance": mcp_wrapper_instance,
-                        "schema": schema
-                    }
+            self.thread_manager.tool_registry.register_tool_schemas(mcp_wrapper_instance, updated_schemas)
             
             logger.info(f"⚡ Registered {len(updated_schemas)} MCP tools (Redis cache enabled)")
             return mcp_wrapper_instance
@@ -215,27 +215,25 @@ class MCPManager:
 
 class PromptManager:
     @staticmethod
-    async def build_system_prompt(model_name: str, agent_config: Optional[dict], 
-                                  is_agent_builder: bool, thread_id: str, 
-                                  mcp_wrapper_instance: Optional[MCPToolWrapper]) -> dict:
-        
-        if "gemini-2.5-flash" in model_name.lower() and "gemini-2.5-pro" not in model_name.lower():
-            default_system_content = get_gemini_system_prompt()
-        else:
-            default_system_content = get_system_prompt()
-        
-        if "anthropic" not in model_name.lower():
-            sample_response_path = os.path.join(os.path.dirname(__file__), 'sample_responses/1.txt')
-            with open(sample_response_path, 'r') as file:
-                sample_response = file.read()
-            default_system_content = default_system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
-        
+    def _render_system_content(model_name: str, agent_config: Optional[dict],
+                               is_agent_builder: bool,
+                               mcp_wrapper_instance: Optional[MCPToolWrapper]) -> str:
+        """Render the system prompt without the current time (cacheable for the day)."""
         if is_agent_builder:
-            system_content = get_agent_builder_prompt()
+            system_content = get_agent_builder_prompt(include_time=False)
         elif agent_config and agent_config.get('system_prompt'):
             system_content = render_prompt_template(agent_config['system_prompt'].strip())
         else:
-            system_content = default_system_content
+            if "gemini-2.5-flash" in model_name.lower() and "gemini-2.5-pro" not in model_name.lower():
+                system_content = get_gemini_system_prompt(include_time=False)
+            else:
+                system_content = get_system_prompt(include_time=False)
+
+            if "anthropic" not in model_name.lower():
+                sample_response_path = os.path.join(os.path.dirname(__file__), 'sample_responses/1.txt')
+                with open(sample_response_path, 'r') as file:
+                    sample_response = file.read()
+                system_content = system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
         
         if agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps')) and mcp_wrapper_instance and mcp_wrapper_instance._initialized:
             mcp_info = "\n\n--- MCP Tools Available ---\n"
@@ -251,7 +249,7 @@ class PromptManager:
             mcp_info += "Available MCP tools:\n"
             try:
                 registered_schemas = mcp_wrapper_instance.get_schemas()
-                for method_name, schema_list in registered_schemas.items():
+                for method_name, schema_list in sorted(registered_schemas.items()):
                     for schema in schema_list:
                         if schema.schema_type == SchemaType.OPENAPI:
                             func_info = schema.schema.get('function', {})
@@ -282,11 +280,59 @@ class PromptManager:
             
             system_content += mcp_info
 
-        return {"role": "system", "content": system_content}
+        return system_content
+
+    @staticmethod
+    async def build_system_prompt(model_name: str, agent_config: Optional[dict], 
+                                  is_agent_builder: bool, thread_id: str, 
+                                  mcp_wrapper_instance: Optional[MCPToolWrapper]) -> dict:
+        
+        now_utc = datetime.datetime.now(datetime.timezone.utc)
+        custom_prompt = agent_config.get('system_prompt') if agent_config and not is_agent_builder else None
+        custom_prompt_uses_time = bool(custom_prompt) and '{{current_time}}' in custom_prompt
+
+        if custom_prompt_uses_time:
+            # Changes every second: a cache entry would never be hit again
+            system_content = PromptManager._render_system_content(model_name, agent_config, is_agent_builder, mcp_wrapper_instance)
+            return {"role": "system", "content": system_content}
+
+        mcp_tool_names = []
+        if mcp_wrapper_instance and mcp_wrapper_instance._initialized:
+            try:
+                mcp_tool_names = sorted(mcp_wrapper_instance.get_schemas().keys())
+            except Exception as e:
+                logger.warning(f"Could not fingerprint MCP tools for prompt cache: {e}")
+
+        # Everything the rendered prompt depends on; the date changes daily, the time is not part of it
+        cache_key = prompt_cache.make_key(
+            "gemini-flash" if "gemini-2.5-flash" in model_name.lower() and "gemini-2.5-pro" not in model_name.lower() else "default",
+            "anthropic" in model_name.lower(),
+            is_agent_builder,
+            agent_config.get('agent_id') if agent_config else None,
+            agent_config.get('current_version_id') if agent_config else None,
+            hashlib.md5(custom_prompt.encode()).hexdigest() if custom_prompt else None,
+            bool(agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps'))),
+            mcp_tool_names,
+            now_utc.strftime('%Y-%m-%d'),
+        )
+        system_content = await prompt_cache.get_or_build(
+            "system_prompt", cache_key,
+            lambda: PromptManager._render_system_content(model_name, agent_config, is_agent_builder, mcp_wrapper_instance)
+        )
+
+        time_note = f"CURRENT UTC TIME: {now_utc.strftime('%H:%M:%S')}"
+        if get_model_capabilities(model_name).supports_prompt_caching:
+            # Keep the cached prefix byte-identical across runs; the clock goes into a trailing block
+            return {"role": "system", "content": [
+                {"type": "text", "text": system_content},
+                {"type": "text", "text": time_note}
+            ]}
+
+        return {"role": "system", "content": system_content + "\n\n" + time_note}
 
 
 class MessageManager:
-    def __init__(self, client, thread_id: str, model_name: str, trace: Optional[StatefulTraceClient]):
+    def __init__(self, client, thread_id: str, model_name: str, trace: Optional[TraceHandle]):
         self.client = client
         self.thread_id = thread_id
         self.model_name = model_name
@@ -369,19 +415,21 @@ class AgentRunner:
     
     async def setup(self):
         if not self.config.trace:
-            self.config.trace = langfuse.trace(name="run_agent", session_id=self.config.thread_id, metadata={"project_id": self.config.project_id})
+            self.config.trace = tracer.trace(name="run_agent", session_id=self.config.thread_id, metadata={"project_id": self.config.project_id})
         
         self.thread_manager = ThreadManager(
             trace=self.config.trace, 
             is_agent_builder=self.config.is_agent_builder or False, 
             target_agent_id=self.config.target_agent_id, 
-            agent_config=self.config.agent_config
+            agent_config=self.config.agent_config,
+            stop_event=self.config.stop_event
         )
         
         self.client = await self.thread_manager.db.client
         self.account_id = await get_account_id_from_thread(self.client, self.config.thread_id)
         if not self.account_id:
             raise ValueError("Could not determine account ID for thread")
+        self.thread_manager.response_processor.account_id = self.account_id
 
         project = await self.client.table('projects').select('*').eq('project_id', self.config.project_id).execute()
         if not project.data or len(project.data) == 0:
@@ -391,6 +439,8 @@ class AgentRunner:
         sandbox_info = project_data.get('sandbox', {})
         if not sandbox_info.get('id'):
             raise ValueError(f"No sandbox found for project {self.config.project_id}")
+        # The sandbox tools resolve the sandbox from this instead of reading the project again
+        get_sandbox_resolver(self.thread_manager, self.config.project_id).seed(sandbox_info)
     
     async def setup_tools(self):
         tool_manager = ToolManager(self.thread_manager, self.config.project_id, self.config.thread_id)
@@ -429,15 +479,7 @@ class AgentRunner:
         return await mcp_manager.register_mcp_tools(self.config.agent_config)
     
     def get_max_tokens(self) -> Optional[int]:
-        if "sonnet" in self.config.model_name.lower():
-            return 8192
-        elif "gpt-4" in self.config.model_name.lower():
-            return 4096
-        elif "gemini-2.5-pro" in self.config.model_name.lower():
-            return 64000
-        elif "kimi-k2" in self.config.model_name.lower():
-            return 8192
-        return None
+        return get_model_capabilities(self.config.model_name).default_max_tokens
     
     async def run(self) -> AsyncGenerator[Dict[str, Any], None]:
         await self.setup()
@@ -615,7 +657,7 @@ class AgentRunner:
             if generation:
                 generation.end(output=full_response)
 
-        asyncio.create_task(asyncio.to_thread(lambda: langfuse.flush()))
+        tracer.flush()
 
 
 async def run_agent(
@@ -630,9 +672,10 @@ async def run_agent(
     reasoning_effort: Optional[str] = 'low',
     enable_context_manager: bool = True,
     agent_config: Optional[dict] = None,    
-    trace: Optional[StatefulTraceClient] = None,
+    trace: Optional[TraceHandle] = None,
     is_agent_builder: Optional[bool] = False,
-    target_agent_id: Optional[str] = None
+    target_agent_id: Optional[str] = None,
+    stop_event: Optional[asyncio.Event] = None
 ):
     config = AgentConfig(
         thread_id=thread_id,
@@ -647,7 +690,8 @@ async def run_agent(
         agent_config=agent_config,
         trace=trace,
         is_agent_builder=is_agent_builder,
-        target_agent_id=target_agent_id
+        target_agent_id=target_agent_id,
+        stop_event=stop_event
     )
     
     runner = AgentRunner(config)
@@ -1,7 +1,7 @@
 import json
 from typing import Union, Dict, Any
 
-from agentpress.tool import Tool, ToolResult, openapi_schema, usage_example
+from agentpress.tool import Tool, ToolResult, cacheable, openapi_schema, usage_example
 from agent.tools.data_providers.LinkedinProvider import LinkedinProvider
 from agent.tools.data_providers.YahooFinanceProvider import YahooFinanceProvider
 from agent.tools.data_providers.AmazonProvider import AmazonProvider
@@ -52,6 +52,7 @@ Use this tool when you need to discover what endpoints are available.
 </invoke>
 </function_calls>
         ''')
+    @cacheable(ttl=3600)
     async def get_data_provider_endpoints(
         self,
         service_name: str
@@ -120,6 +121,7 @@ Use this tool when you need to discover what endpoints are available.
         </invoke>
         </function_calls>
         ''')
+    @cacheable(ttl=600)
     async def execute_data_provider_call(
         self,
         service_name: str,
@@ -1,14 +1,15 @@
 import traceback
-import json
 import base64
 import io
+import time
 from PIL import Image
 
 from agentpress.tool import ToolResult, openapi_schema, usage_example
 from agentpress.thread_manager import ThreadManager
 from sandbox.tool_base import SandboxToolsBase
 from utils.logger import logger
-from utils.s3_upload_utils import upload_base64_image
+from utils.s3_upload_utils import upload_base64_image, upload_image_bytes
+from agent.tools.utils.browser_channel import browser_channels
 
 
 class SandboxBrowserTool(SandboxToolsBase):
@@ -57,6 +58,24 @@ class SandboxBrowserTool(SandboxToolsBase):
             except Exception as e:
                 return False, f"Base64 decoding failed: {str(e)}"
             
+            return self._validate_image_bytes(image_data, max_size_mb)
+            
+        except Exception as e:
+            logger.error(f"Unexpected error during base64 image validation: {e}")
+            return False, f"Validation error: {str(e)}"
+
+    def _validate_image_bytes(self, image_data: bytes, max_size_mb: int = 10) -> tuple[bool, str]:
+        """
+        Validation of decoded image data.
+        
+        Args:
+            image_data (bytes): The image data
+            max_size_mb (int): Maximum allowed image size in megabytes
+            
+        Returns:
+            tuple[bool, str]: (is_valid, error_message)
+        """
+        try:
             # Check decoded data size
             if len(image_data) == 0:
                 return False, "Decoded image data is empty"
@@ -100,7 +119,7 @@ class SandboxBrowserTool(SandboxToolsBase):
             return True, "Valid image"
             
         except Exception as e:
-            logger.error(f"Unexpected error during base64 image validation: {e}")
+            logger.error(f"Unexpected error during image validation: {e}")
             return False, f"Validation error: {str(e)}"
 
     async def _execute_browser_action(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
@@ -118,100 +137,100 @@ class SandboxBrowserTool(SandboxToolsBase):
             # Ensure sandbox is initialized
             await self._ensure_sandbox()
             
-            # Build the curl command
-            url = f"http://localhost:8003/api/automation/{endpoint}"
-            
-            if method == "GET" and params:
-                query_params = "&".join([f"{k}={v}" for k, v in params.items()])
-                url = f"{url}?{query_params}"
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-            else:
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-                if params:
-                    json_data = json.dumps(params)
-                    curl_cmd += f" -d '{json_data}'"
-            
-            logger.debug("\033[95mExecuting curl command:\033[0m")
-            logger.debug(f"{curl_cmd}")
-            
-            response = await self.sandbox.process.exec(curl_cmd, timeout=30)
+            start = time.monotonic()
+            response = await browser_channels.request(self.sandbox, endpoint, params, method)
+            result = response.result
+
+            if not "content" in result:
+                result["content"] = ""
             
-            if response.exit_code == 0:
-                try:
-                    result = json.loads(response.result)
+            if not "role" in result:
+                result["role"] = "assistant"
+
+            logger.info("Browser automation request completed successfully")
 
-                    if not "content" in result:
-                        result["content"] = ""
+            upload_start = time.monotonic()
+            if response.screenshot:
+                try:
+                    is_valid, validation_message = self._validate_image_bytes(response.screenshot)
                     
-                    if not "role" in result:
-                        result["role"] = "assistant"
-
-                    logger.info("Browser automation request completed successfully")
-
-                    if "screenshot_base64" in result:
-                        try:
-                            # Comprehensive validation of the base64 image data
-                            screenshot_data = result["screenshot_base64"]
-                            is_valid, validation_message = self._validate_base64_image(screenshot_data)
-                            
-                            if is_valid:
-                                logger.debug(f"Screenshot validation passed: {validation_message}")
-                                image_url = await upload_base64_image(screenshot_data)
-                                result["image_url"] = image_url
-                                logger.debug(f"Uploaded screenshot to {image_url}")
-                            else:
-                                logger.warning(f"Screenshot validation failed: {validation_message}")
-                                result["image_validation_error"] = validation_message
-                                
-                            # Remove base64 data from result to keep it clean
-                            del result["screenshot_base64"]
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to process screenshot: {e}")
-                            result["image_upload_error"] = str(e)
-
-                    added_message = await self.thread_manager.add_message(
-                        thread_id=self.thread_id,
-                        type="browser_state",
-                        content=result,
-                        is_llm_message=False
-                    )
-
-                    success_response = {}
-
-                    if result.get("success"):
-                        success_response["success"] = result["success"]
-                        success_response["message"] = result.get("message", "Browser action completed successfully")
-                    else:
-                        success_response["success"] = False
-                        success_response["message"] = result.get("message", "Browser action failed")
-
-                    if added_message and 'message_id' in added_message:
-                        success_response['message_id'] = added_message['message_id']
-                    if result.get("url"):
-                        success_response["url"] = result["url"]
-                    if result.get("title"):
-                        success_response["title"] = result["title"]
-                    if result.get("element_count"):
-                        success_response["elements_found"] = result["element_count"]
-                    if result.get("pixels_below"):
-                        success_response["scrollable_content"] = result["pixels_below"] > 0
-                    if result.get("ocr_text"):
-                        success_response["ocr_text"] = result["ocr_text"]
-                    if result.get("image_url"):
-                        success_response["image_url"] = result["image_url"]
-
-                    if success_response.get("success"):
-                        return self.success_response(success_response)
+                    if is_valid:
+                        logger.debug(f"Screenshot validation passed: {validation_message}")
+                        image_url = await upload_image_bytes(response.screenshot, content_type="image/jpeg", extension="jpg")
+                        result["image_url"] = image_url
+                        logger.debug(f"Uploaded screenshot to {image_url}")
                     else:
-                        return self.fail_response(success_response)
+                        logger.warning(f"Screenshot validation failed: {validation_message}")
+                        result["image_validation_error"] = validation_message
+                    
+                except Exception as e:
+                    logger.error(f"Failed to process screenshot: {e}")
+                    result["image_upload_error"] = str(e)
 
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse response JSON: {response.result} {e}")
-                    return self.fail_response(f"Failed to parse response JSON: {response.result} {e}")
+            elif "screenshot_base64" in result:
+                try:
+                    # Comprehensive validation of the base64 image data
+                    screenshot_data = result["screenshot_base64"]
+                    is_valid, validation_message = self._validate_base64_image(screenshot_data)
+                    
+                    if is_valid:
+                        logger.debug(f"Screenshot validation passed: {validation_message}")
+                        image_url = await upload_base64_image(screenshot_data)
+                        result["image_url"] = image_url
+                        logger.debug(f"Uploaded screenshot to {image_url}")
+                    else:
+                        logger.warning(f"Screenshot validation failed: {validation_message}")
+                        result["image_validation_error"] = validation_message
+                        
+                    # Remove base64 data from result to keep it clean
+                    del result["screenshot_base64"]
+                    
+                except Exception as e:
+                    logger.error(f"Failed to process screenshot: {e}")
+                    result["image_upload_error"] = str(e)
+
+            action_ms = f", browser {response.action_ms:.0f}ms" if response.action_ms is not None else ""
+            logger.info(
+                f"Browser action {endpoint} took {(time.monotonic() - start) * 1000:.0f}ms "
+                f"({response.transport} request {response.request_ms:.0f}ms{action_ms}, "
+                f"screenshot upload {(time.monotonic() - upload_start) * 1000:.0f}ms)"
+            )
+
+            added_message = await self.thread_manager.add_message(
+                thread_id=self.thread_id,
+                type="browser_state",
+                content=result,
+                is_llm_message=False
+            )
+
+            success_response = {}
+
+            if result.get("success"):
+                success_response["success"] = result["success"]
+                success_response["message"] = result.get("message", "Browser action completed successfully")
+            else:
+                success_response["success"] = False
+                success_response["message"] = result.get("message", "Browser action failed")
+
+            if added_message and 'message_id' in added_message:
+                success_response['message_id'] = added_message['message_id']
+            if result.get("url"):
+                success_response["url"] = result["url"]
+            if result.get("title"):
+                success_response["title"] = result["title"]
+            if result.get("element_count"):
+                success_response["elements_found"] = result["element_count"]
+            if result.get("pixels_below"):
+                success_response["scrollable_content"] = result["pixels_below"] > 0
+            if result.get("ocr_text"):
+                success_response["ocr_text"] = result["ocr_text"]
+            if result.get("image_url"):
+                success_response["image_url"] = result["image_url"]
+
+            if success_response.get("success"):
+                return self.success_response(success_response)
             else:
-                logger.error(f"Browser automation request failed 2: {response}")
-                return self.fail_response(f"Browser automation request failed 2: {response}")
+                return self.fail_response(success_response)
 
         except Exception as e:
             logger.error(f"Error executing browser action: {e}")
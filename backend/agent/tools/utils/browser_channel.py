@@ -0,0 +1,266 @@
+"""
+HTTP channel from the browser tool to the browser API in a sandbox.
+
+Every browser action used to run `curl` through `sandbox.process.exec` and
+parse its stdout, so each navigate/click/type paid an exec round trip and a
+shell, and the screenshot travelled base64 inside JSON inside the exec result.
+The channel instead:
+
+- Calls the browser API (port 8003) directly through the sandbox's preview URL
+  on a shared keep-alive httpx client (HTTP/2 when the `h2` package is
+  installed, so concurrent actions share one connection)
+- Asks for the framed result format, which carries the screenshot as raw
+  bytes after the JSON result; older browser APIs still answer JSON
+- Reports per-action timing: round trip and the action's duration in the
+  browser API (Server-Timing header)
+- Falls back to curl over exec when the preview URL cannot be reached, and
+  retries the direct channel after DIRECT_RETRY_SECONDS
+- Fetches a fresh preview link once when the proxy rejects the cached token
+  (401/403)
+
+BROWSER_API_URL points the channel at a browser API running elsewhere, e.g. a
+local `python browser_api.py` for tests.
+"""
+
+import json
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from utils.config import config
+from utils.logger import logger
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+BROWSER_API_PORT = 8003
+FRAMED_RESULT_MEDIA_TYPE = "application/x-browser-action-result"
+ACTION_TIMEOUT_SECONDS = 30
+DIRECT_RETRY_SECONDS = 300
+PREVIEW_TOKEN_HEADER = "X-Daytona-Preview-Token"
+MAX_CACHED_SANDBOXES = 256
+
+
+class BrowserChannelUnavailable(Exception):
+    """The browser API could not be reached directly; the action was not sent."""
+
+
+class BrowserActionResponse:
+    """Result of a browser action and how long it took."""
+
+    def __init__(self, result: Dict[str, Any], screenshot: Optional[bytes], transport: str,
+                 request_ms: float, action_ms: Optional[float] = None):
+        self.result = result
+        # Raw screenshot bytes; None when the result carries screenshot_base64 (or no screenshot)
+        self.screenshot = screenshot
+        self.transport = transport
+        self.request_ms = request_ms
+        self.action_ms = action_ms
+
+
+def _parse_server_timing(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    for metric in value.split(","):
+        for part in metric.split(";"):
+            if part.strip().startswith("dur="):
+                try:
+                    return float(part.strip()[4:])
+                except ValueError:
+                    return None
+    return None
+
+
+def _parse_framed_result(body: bytes) -> Tuple[Dict[str, Any], bytes]:
+    (header_length,) = struct.unpack(">I", body[:4])
+    result = json.loads(body[4:4 + header_length])
+    return result, body[4 + header_length:]
+
+
+class BrowserChannels:
+    """Direct channels to the browser APIs of the sandboxes used by this process."""
+
+    def __init__(self):
+        self.enabled = config.BROWSER_CHANNEL_ENABLED
+        self._client: Optional[httpx.AsyncClient] = None
+        # sandbox id -> (base URL, headers) of its browser API, least recently used first
+        self._endpoints: "OrderedDict[str, Tuple[str, Dict[str, str]]]" = OrderedDict()
+        # sandbox id -> when the direct channel last failed, least recently used first
+        self._unavailable: "OrderedDict[str, float]" = OrderedDict()
+        self.stats = {
+            "actions": 0,
+            "direct": 0,
+            "exec": 0,
+            "fallbacks": 0,
+            "token_refreshes": 0,
+            "errors": 0,
+            "request_ms": 0.0,
+            "action_ms": 0.0,
+            "screenshot_bytes": 0,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(ACTION_TIMEOUT_SECONDS, connect=10),
+                limits=httpx.Limits(max_keepalive_connections=50, keepalive_expiry=120),
+            )
+        return self._client
+
+    async def _get_endpoint(self, sandbox) -> Tuple[str, Dict[str, str]]:
+        endpoint = self._endpoints.get(sandbox.id)
+        if endpoint is not None:
+            self._endpoints.move_to_end(sandbox.id)
+            return endpoint
+        headers = {"Accept": f"{FRAMED_RESULT_MEDIA_TYPE}, application/json"}
+        if config.BROWSER_API_URL:
+            base_url = config.BROWSER_API_URL
+        else:
+            link = await sandbox.get_preview_link(BROWSER_API_PORT)
+            base_url = link.url if hasattr(link, 'url') else str(link).split("url='")[1].split("'")[0]
+            token = getattr(link, 'token', None)
+            if token:
+                headers[PREVIEW_TOKEN_HEADER] = token
+        endpoint = (base_url.rstrip("/"), headers)
+        self._remember(self._endpoints, sandbox.id, endpoint)
+        return endpoint
+
+    @staticmethod
+    def _remember(entries: OrderedDict, sandbox_id: str, value: Any):
+        entries[sandbox_id] = value
+        entries.move_to_end(sandbox_id)
+        while len(entries) > MAX_CACHED_SANDBOXES:
+            entries.popitem(last=False)
+
+    def _direct_available(self, sandbox_id: str) -> bool:
+        failed_at = self._unavailable.get(sandbox_id)
+        if failed_at is None:
+            return True
+        if time.monotonic() - failed_at > DIRECT_RETRY_SECONDS:
+            del self._unavailable[sandbox_id]
+            return True
+        return False
+
+    async def _send(self, sandbox, endpoint: str, params: Optional[dict], method: str) -> Tuple[str, httpx.Response]:
+        try:
+            base_url, headers = await self._get_endpoint(sandbox)
+        except Exception as e:
+            raise BrowserChannelUnavailable(f"No preview URL for the browser API: {e}")
+        url = f"{base_url}/api/automation/{endpoint}"
+        try:
+            if method == "GET":
+                return base_url, await self._get_client().get(url, params=params, headers=headers)
+            return base_url, await self._get_client().request(method, url, json=params or {}, headers=headers)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            self._endpoints.pop(sandbox.id, None)
+            raise BrowserChannelUnavailable(f"Cannot connect to {base_url}: {e}")
+
+    async def _request_direct(self, sandbox, endpoint: str, params: Optional[dict], method: str) -> BrowserActionResponse:
+        start = time.monotonic()
+        base_url, response = await self._send(sandbox, endpoint, params, method)
+        if response.status_code in (401, 403) and not config.BROWSER_API_URL:
+            # The proxy rejected the cached preview token before the browser API saw the action
+            self._endpoints.pop(sandbox.id, None)
+            self.stats["token_refreshes"] += 1
+            logger.info(f"Preview token of sandbox {sandbox.id} rejected ({response.status_code}), fetching a fresh link")
+            base_url, response = await self._send(sandbox, endpoint, params, method)
+            if response.status_code in (401, 403):
+                self._endpoints.pop(sandbox.id, None)
+                raise BrowserChannelUnavailable(f"Preview link of {base_url} rejected again ({response.status_code})")
+        request_ms = (time.monotonic() - start) * 1000
+        action_ms = _parse_server_timing(response.headers.get("server-timing"))
+
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith(FRAMED_RESULT_MEDIA_TYPE):
+            result, screenshot = _parse_framed_result(response.content)
+            return BrowserActionResponse(result, screenshot or None, "direct", request_ms, action_ms)
+        if content_type.startswith("application/json"):
+            return BrowserActionResponse(response.json(), None, "direct", request_ms, action_ms)
+        # Only the proxy in front of the browser API answers anything else (e.g. port not exposed)
+        self._endpoints.pop(sandbox.id, None)
+        raise BrowserChannelUnavailable(f"Unexpected {response.status_code} response from {base_url} ({content_type or 'no content type'})")
+
+    async def _request_exec(self, sandbox, endpoint: str, params: Optional[dict], method: str) -> BrowserActionResponse:
+        url = f"http://localhost:{BROWSER_API_PORT}/api/automation/{endpoint}"
+        if method == "GET" and params:
+            query_params = "&".join([f"{k}={v}" for k, v in params.items()])
+            url = f"{url}?{query_params}"
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+        else:
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+            if params:
+                json_data = json.dumps(params)
+                curl_cmd += f" -d '{json_data}'"
+
+        logger.debug("\033[95mExecuting curl command:\033[0m")
+        logger.debug(f"{curl_cmd}")
+
+        start = time.monotonic()
+        response = await sandbox.process.exec(curl_cmd, timeout=ACTION_TIMEOUT_SECONDS)
+        request_ms = (time.monotonic() - start) * 1000
+        if response.exit_code != 0:
+            raise RuntimeError(f"Browser automation request failed 2: {response}")
+        try:
+            result = json.loads(response.result)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Failed to parse response JSON: {response.result} {e}")
+        return BrowserActionResponse(result, None, "exec", request_ms)
+
+    async def request(self, sandbox, endpoint: str, params: Optional[dict] = None, method: str = "POST") -> BrowserActionResponse:
+        """Run a browser action in a sandbox.
+
+        Uses the direct channel when available and curl over exec otherwise.
+        An action whose request reached the browser API is never sent again.
+
+        Raises:
+            RuntimeError: If the exec fallback failed or returned invalid JSON
+            httpx.HTTPError: If the direct request failed after it was sent
+        """
+        self.stats["actions"] += 1
+        try:
+            if self.enabled and self._direct_available(sandbox.id):
+                try:
+                    response = await self._request_direct(sandbox, endpoint, params, method)
+                except BrowserChannelUnavailable as e:
+                    self._remember(self._unavailable, sandbox.id, time.monotonic())
+                    self.stats["fallbacks"] += 1
+                    logger.warning(f"Browser API of sandbox {sandbox.id} unreachable, using exec for {DIRECT_RETRY_SECONDS}s: {e}")
+                    response = await self._request_exec(sandbox, endpoint, params, method)
+            else:
+                response = await self._request_exec(sandbox, endpoint, params, method)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+        self.stats[response.transport] += 1
+        self.stats["request_ms"] += response.request_ms
+        self.stats["action_ms"] += response.action_ms or 0.0
+        self.stats["screenshot_bytes"] += len(response.screenshot or b"")
+        return response
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._endpoints.clear()
+        self._unavailable.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        actions = self.stats["direct"] + self.stats["exec"]
+        return dict(
+            self.stats,
+            http2=HTTP2_AVAILABLE,
+            cached_endpoints=len(self._endpoints),
+            unavailable_sandboxes=len(self._unavailable),
+            avg_request_ms=round(self.stats["request_ms"] / actions, 2) if actions else 0.0,
+        )
+
+
+browser_channels = BrowserChannels()
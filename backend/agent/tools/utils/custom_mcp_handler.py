@@ -6,7 +6,7 @@ from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamablehttp_client
 from utils.logger import logger
-from .mcp_connection_manager import MCPConnectionManager
+from .mcp_connection_manager import MCPConnectionManager, tool_annotations
 
 
 class CustomMCPHandler:
@@ -228,6 +228,7 @@ class CustomMCPHandler:
                     'name': tool_name,
                     'description': tool.description,
                     'parameters': tool.inputSchema,
+                    'annotations': tool_annotations(tool),
                     'server': server_name,
                     'original_name': tool_name_from_server,
                     'is_custom': True,
@@ -250,6 +251,7 @@ class CustomMCPHandler:
                     'name': tool_name,
                     'description': tool_info['description'],
                     'parameters': tool_info['input_schema'],
+                    'annotations': tool_info.get('annotations', {}),
                     'server': server_name,
                     'original_name': tool_name_from_server,
                     'is_custom': True,
@@ -1,5 +1,6 @@
 from typing import Dict, Any, List, Callable, Awaitable
-from agentpress.tool import ToolResult, ToolSchema, SchemaType
+from agentpress.tool import ToolCachePolicy, ToolResult, ToolSchema, SchemaType
+from utils.config import config
 from utils.logger import logger
 
 
@@ -22,7 +23,15 @@ class DynamicToolBuilder:
             openapi_tool_info = {
                 "name": tool_name,
                 "description": tool_info['description'],
-                "parameters": tool_info['parameters']
+                "parameters": tool_info['parameters'],
+                "annotations": tool_info.get('annotations', {}),
+                # Identifies the server connection a cached result came from
+                "cache_scope": {
+                    "server": tool_info.get('server'),
+                    "custom_type": tool_info.get('custom_type'),
+                    "custom_config": tool_info.get('custom_config'),
+                    "tool": tool_info.get('original_name', tool_name)
+                }
             }
             method = self._create_dynamic_method(tool_name, openapi_tool_info, execute_callback)
             if method:
@@ -46,6 +55,13 @@ class DynamicToolBuilder:
         schema = self._create_tool_schema(method_name, description, tool_info)
         
         dynamic_tool_method.tool_schemas = [schema]
+        # Only tools the MCP server declares read-only are safe to serve from the result cache
+        if (tool_info.get("annotations") or {}).get("readOnlyHint"):
+            cache_scope = tool_info.get("cache_scope", tool_name)
+            dynamic_tool_method.tool_cache_policy = ToolCachePolicy(
+                ttl=config.TOOL_RESULT_CACHE_MCP_TTL_SECONDS,
+                key=lambda arguments: (cache_scope, arguments)
+            )
         
         tool_data = {
             'method': dynamic_tool_method,
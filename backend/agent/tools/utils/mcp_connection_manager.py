@@ -7,6 +7,11 @@ from mcp.client.streamable_http import streamablehttp_client
 from utils.logger import logger
 
 
+def tool_annotations(tool) -> Dict[str, Any]:
+    annotations = getattr(tool, "annotations", None)
+    return annotations.model_dump(exclude_none=True) if annotations is not None else {}
+
+
 class MCPConnectionManager:
     def __init__(self):
         self.connected_servers: Dict[str, Dict[str, Any]] = {}
@@ -26,7 +31,8 @@ class MCPConnectionManager:
                             {
                                 "name": tool.name,
                                 "description": tool.description,
-                                "input_schema": tool.inputSchema
+                                "input_schema": tool.inputSchema,
+                                "annotations": tool_annotations(tool)
                             }
                             for tool in tools_result.tools
                         ]
@@ -53,7 +59,8 @@ class MCPConnectionManager:
                                 {
                                     "name": tool.name,
                                     "description": tool.description,
-                                    "input_schema": tool.inputSchema
+                                    "input_schema": tool.inputSchema,
+                                    "annotations": tool_annotations(tool)
                                 }
                                 for tool in tools_result.tools
                             ]
@@ -84,7 +91,8 @@ class MCPConnectionManager:
                         {
                             "name": tool.name,
                             "description": tool.description,
-                            "input_schema": tool.inputSchema
+                            "input_schema": tool.inputSchema,
+                            "annotations": tool_annotations(tool)
                         }
                         for tool in tools_result.tools
                     ]
@@ -117,7 +125,8 @@ class MCPConnectionManager:
                         {
                             "name": tool.name,
                             "description": tool.description,
-                            "input_schema": tool.inputSchema
+                            "input_schema": tool.inputSchema,
+                            "annotations": tool_annotations(tool)
                         }
                         for tool in tools_result.tools
                     ]
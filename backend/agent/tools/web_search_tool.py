@@ -1,7 +1,7 @@
 from tavily import AsyncTavilyClient
 import httpx
 from dotenv import load_dotenv
-from agentpress.tool import Tool, ToolResult, openapi_schema, usage_example
+from agentpress.tool import Tool, ToolResult, cacheable, openapi_schema, usage_example
 from utils.config import config
 from sandbox.tool_base import SandboxToolsBase
 from agentpress.thread_manager import ThreadManager
@@ -54,7 +54,7 @@ class SandboxWebSearchTool(SandboxToolsBase):
                 "required": ["query"]
             }
         }
-    })
+    }, timeout=60)
     @usage_example('''
         <function_calls>
         <invoke name="web_search">
@@ -71,6 +71,7 @@ class SandboxWebSearchTool(SandboxToolsBase):
         </invoke>
         </function_calls>
         ''')
+    @cacheable(ttl=600, key=lambda args: (" ".join(str(args.get("query", "")).lower().split()), args.get("num_results", 20)))
     async def web_search(
         self, 
         query: str,
@@ -153,7 +154,7 @@ class SandboxWebSearchTool(SandboxToolsBase):
                 "required": ["urls"]
             }
         }
-    })
+    }, timeout=180)
     @usage_example('''
         <function_calls>
         <invoke name="scrape_webpage">
@@ -0,0 +1,123 @@
+"""
+Coalescing of streamed assistant content for AgentPress.
+
+Every LLM delta used to become its own yielded message (two JSON encodings and
+a timestamp), which the worker serializes again and publishes to Redis. Fast
+models produce hundreds of deltas per second per run. The ChunkCoalescer merges
+consecutive content deltas and releases them as one chunk:
+
+- once STREAM_COALESCE_MAX_CHARS characters are buffered, or
+- STREAM_COALESCE_WINDOW_MS after the first buffered delta, even if the model
+  pauses (`with_flush_deadlines` wakes the stream loop at the deadline)
+
+Each released chunk gets the next sequence number, so the frontend still sees a
+gap-free, ordered sequence. A window of 0 disables coalescing.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterable, AsyncGenerator, Dict, List, Optional
+
+from utils.config import config
+
+# Yielded by with_flush_deadlines when buffered content is due
+FLUSH_DUE = object()
+
+
+class ChunkCoalescer:
+    """Buffers content deltas of one streamed response."""
+
+    def __init__(self, window_ms: Optional[int] = None, max_chars: Optional[int] = None):
+        """Initialize the coalescer.
+
+        Args:
+            window_ms: Maximum time a delta waits before it is released
+            max_chars: Buffered characters that release the buffer immediately
+        """
+        window_ms = config.STREAM_COALESCE_WINDOW_MS if window_ms is None else window_ms
+        self.window = window_ms / 1000
+        self.max_chars = config.STREAM_COALESCE_MAX_CHARS if max_chars is None else max_chars
+        self.enabled = self.window > 0 and self.max_chars > 1
+
+        self._parts: List[str] = []
+        self._chars = 0
+        self._first_at = 0.0
+        self.stats = {"deltas": 0, "chunks": 0}
+
+    def add(self, content: str) -> Optional[str]:
+        """Buffer a delta.
+
+        Returns:
+            The merged content if it should be yielded now, else None
+        """
+        self.stats["deltas"] += 1
+        if not self.enabled:
+            self.stats["chunks"] += 1
+            return content
+        if not self._parts:
+            self._first_at = time.monotonic()
+        self._parts.append(content)
+        self._chars += len(content)
+        if self._chars >= self.max_chars or time.monotonic() - self._first_at >= self.window:
+            return self.take()
+        return None
+
+    def take(self) -> Optional[str]:
+        """Release the buffered content, if any."""
+        if not self._parts:
+            return None
+        content = "".join(self._parts)
+        self._parts = []
+        self._chars = 0
+        self.stats["chunks"] += 1
+        return content
+
+    def seconds_until_due(self) -> Optional[float]:
+        """Time left before the buffered content must be released, None if empty."""
+        if not self._parts:
+            return None
+        return max(self.window - (time.monotonic() - self._first_at), 0.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["deltas_per_chunk"] = round(stats["deltas"] / stats["chunks"], 2) if stats["chunks"] else 0.0
+        return stats
+
+
+async def with_flush_deadlines(stream: AsyncIterable, coalescer: ChunkCoalescer) -> AsyncGenerator[Any, None]:
+    """Iterate `stream`, yielding FLUSH_DUE whenever buffered content is due.
+
+    The pending read of the stream is never cancelled by a deadline, it is
+    awaited again after the flush.
+    """
+    iterator = stream.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            timeout = coalescer.seconds_until_due()
+            if pending is None and timeout is None:
+                # Nothing buffered: read directly, without a task per delta
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                yield item
+                continue
+
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            if timeout is not None:
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    yield FLUSH_DUE
+                    continue
+
+            task, pending = pending, None
+            try:
+                item = await task
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
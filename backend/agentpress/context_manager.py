@@ -3,16 +3,73 @@ Context Management for AgentPress Threads.
 
 This module handles token counting and thread summarization to prevent
 reaching the context window limitations of LLM models.
+
+Long threads are summarized incrementally: once a thread crosses the token
+threshold, everything before a recent tail is folded (together with the previous
+summary) into a new `summary` message. get_llm_messages then only loads the
+latest summary and the messages after it.
 """
 
 import json
-from typing import List, Dict, Any, Optional, Union
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, Union
 
-from litellm.utils import token_counter
+from agentpress.message_cache import message_cache
+from agentpress.token_cache import token_cache
+from services.llm import make_llm_api_call
 from services.supabase import DBConnection
+from utils.model_registry import get_input_budget
 from utils.logger import logger
 
 DEFAULT_TOKEN_THRESHOLD = 120000
+SUMMARY_TARGET_TOKENS = 10000
+MIN_TAIL_MESSAGES = 10
+SUMMARY_HEADER = "======== CONVERSATION HISTORY SUMMARY ========"
+
+SUMMARY_SYSTEM_PROMPT = f"""You are a specialized summarization assistant. Your task is to create a concise but comprehensive summary of the conversation history.
+
+The summary should:
+1. Preserve all key information including decisions, conclusions, and important context
+2. Include any tools that were used and their results
+3. Maintain chronological order of events
+4. Be presented as a narrated list of key points with section headers
+5. Include only factual information from the conversation (no new information)
+6. Be concise but detailed enough that the conversation can continue with this summary as context
+
+If a previous summary is provided, merge it with the new messages into a single updated summary.
+
+VERY IMPORTANT: This summary will replace older parts of the conversation in the LLM's context window, so ensure it contains ALL key information and LATEST STATE OF THE CONVERSATION - SO WE WILL KNOW HOW TO PICK UP WHERE WE LEFT OFF.
+
+Keep the summary under {SUMMARY_TARGET_TOKENS} tokens."""
+
+@dataclass
+class CompressionAction:
+    """A single change made to fit the context budget."""
+    index: int
+    message_id: Optional[str]
+    role: str
+    action: str  # "safe_truncate", "truncate@<threshold>" or "omit"
+    tokens_before: int
+    tokens_after: int
+
+@dataclass
+class CompressionPlan:
+    """Result of planning context compression against a token budget."""
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    actions: List[CompressionAction] = field(default_factory=list)
+
+    def explain(self) -> str:
+        """Human-readable summary of what was truncated or dropped."""
+        lines = [f"Context compression plan: {self.tokens_before} -> {self.tokens_after} tokens (budget {self.budget}), {len(self.actions)} actions"]
+        for action in self.actions:
+            lines.append(
+                f"  - {action.action} #{action.index} {action.role} "
+                f"(message_id={action.message_id}): {action.tokens_before} -> {action.tokens_after} tokens"
+            )
+        return "\n".join(lines)
 
 class ContextManager:
     """Manages thread context including token counting and summarization."""
@@ -25,6 +82,176 @@ class ContextManager:
         """
         self.db = DBConnection()
         self.token_threshold = token_threshold
+        self.last_compression_plan: Optional[CompressionPlan] = None
+
+    def is_summary_message(self, msg: Dict[str, Any]) -> bool:
+        """Check if a message is a rolling summary written by this manager."""
+        return isinstance(msg, dict) and isinstance(msg.get('content'), str) and msg['content'].startswith(SUMMARY_HEADER)
+
+    def find_summary_boundary(self, messages: List[Dict[str, Any]], llm_model: str, keep_tokens: int) -> int:
+        """Find the index of the first message to keep verbatim after summarizing.
+
+        The tail holds roughly `keep_tokens` tokens (at least MIN_TAIL_MESSAGES
+        messages) and starts at a plain user message, so tool calls are never
+        separated from their results.
+
+        Returns:
+            Index of the first tail message, or 0 if nothing can be summarized.
+        """
+        start = 1 if messages and self.is_summary_message(messages[0]) else 0
+        boundary = len(messages)
+        tail_tokens = 0
+        while boundary > start:
+            cost = token_cache.count_message(llm_model, messages[boundary - 1])
+            if tail_tokens + cost > keep_tokens and len(messages) - boundary >= MIN_TAIL_MESSAGES:
+                break
+            tail_tokens += cost
+            boundary -= 1
+
+        # Move forward to the next turn boundary
+        while boundary < len(messages):
+            msg = messages[boundary]
+            if isinstance(msg, dict) and msg.get('role') == 'user' and not self.is_tool_result_message(msg):
+                break
+            boundary += 1
+
+        if boundary >= len(messages) or boundary - start < 2:
+            return 0
+        return boundary
+
+    async def create_summary(self, messages: List[Dict[str, Any]], llm_model: str, previous_summary: Optional[str] = None) -> Optional[str]:
+        """Summarize messages, folding in the previous summary if there is one.
+
+        Args:
+            messages: Messages to summarize, oldest first
+            llm_model: Model used for summarization
+            previous_summary: Content of the previous summary message
+
+        Returns:
+            Summary text, or None if summarization failed
+        """
+        # Individual messages are truncated so the request itself fits the model
+        conversation = []
+        for msg in self.remove_meta_messages(messages):
+            content = self.compress_message(msg.get('content', ''), msg.get('message_id'), max_length=6000)
+            if not isinstance(content, str):
+                content = json.dumps(content)
+            conversation.append({"role": msg.get('role', 'unknown'), "content": content})
+        conversation = self.compress_messages_by_omitting_messages(
+            conversation, llm_model, max_tokens=get_input_budget(llm_model, SUMMARY_TARGET_TOKENS) // 2
+        )
+
+        user_content = ""
+        if previous_summary:
+            user_content += f"PREVIOUS SUMMARY:\n{previous_summary}\n\n"
+        user_content += f"NEW MESSAGES:\n{json.dumps(conversation, indent=1)}\n\nPROVIDE THE UPDATED SUMMARY NOW."
+
+        try:
+            response = await make_llm_api_call(
+                messages=[
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content}
+                ],
+                model_name=llm_model,
+                temperature=0,
+                max_tokens=SUMMARY_TARGET_TOKENS,
+                stream=False
+            )
+            summary = response.choices[0].message.content if response and response.choices else None
+            if not summary:
+                logger.error("Failed to generate summary: empty response")
+                return None
+            return summary
+        except Exception as e:
+            logger.error(f"Error creating summary: {str(e)}", exc_info=True)
+            return None
+
+    async def summarize_if_needed(
+        self,
+        thread_id: str,
+        messages: List[Dict[str, Any]],
+        llm_model: str,
+        token_count: int,
+        llm_max_tokens: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Replace older history with a rolling summary once the thread crosses the threshold.
+
+        The summary is stored as a `summary` message timestamped right after the
+        last summarized message, so it sorts before the tail it precedes.
+
+        Args:
+            thread_id: The thread the messages belong to
+            messages: Messages from get_llm_messages (latest summary first, if any)
+            llm_model: Model used for the thread (and for summarization)
+            token_count: Current token count of the prompt
+            llm_max_tokens: Configured max_tokens for the response
+
+        Returns:
+            The summary message followed by the tail, or the original messages if
+            no summary was needed or summarization failed.
+        """
+        threshold = min(self.token_threshold, int(get_input_budget(llm_model, llm_max_tokens) * 0.8))
+        if token_count < threshold:
+            return messages
+
+        boundary = self.find_summary_boundary(messages, llm_model, keep_tokens=threshold // 4)
+        if not boundary:
+            logger.debug(f"Thread {thread_id} is over the summary threshold but has no summarizable history")
+            return messages
+
+        previous_summary = messages[0]['content'] if self.is_summary_message(messages[0]) else None
+        start = 1 if previous_summary else 0
+        to_summarize = messages[start:boundary]
+        logger.info(f"Thread {thread_id}: summarizing {len(to_summarize)} messages ({token_count} tokens >= {threshold})")
+
+        summary = await self.create_summary(to_summarize, llm_model, previous_summary)
+        if not summary:
+            return messages
+
+        summary_message = {
+            "role": "user",
+            "content": f"{SUMMARY_HEADER}\n\n{summary}\n\n======== END OF SUMMARY ========\n\nThe above is a summary of the conversation history. The conversation continues below."
+        }
+
+        try:
+            client = await self.db.client
+            last_summarized_id = messages[boundary - 1].get('message_id')
+            created_at = None
+            if last_summarized_id:
+                result = await client.table('messages').select('created_at').eq('message_id', last_summarized_id).limit(1).execute()
+                if result.data:
+                    created_at = (datetime.fromisoformat(result.data[0]['created_at']) + timedelta(microseconds=1)).isoformat()
+            if created_at is None:
+                logger.warning(f"Could not determine position for summary of thread {thread_id}, skipping")
+                return messages
+
+            result = await client.table('messages').insert({
+                'thread_id': thread_id,
+                'type': 'summary',
+                'content': summary_message,
+                'is_llm_message': True,
+                'metadata': {
+                    'token_count': token_count,
+                    'summarized_messages': len(to_summarize),
+                    'summarized_through': last_summarized_id
+                },
+                'created_at': created_at
+            }).execute()
+            if not result.data:
+                logger.error(f"Failed to store summary for thread {thread_id}")
+                return messages
+
+            message_cache.record(thread_id, result.data[0])
+            # Other processes have to reload to pick up a summary inserted behind their high-water mark
+            await message_cache.invalidate(thread_id, keep_local=True)
+            summary_message['message_id'] = result.data[0]['message_id']
+        except Exception as e:
+            logger.error(f"Failed to store summary for thread {thread_id}: {str(e)}", exc_info=True)
+            return messages
+
+        summarized = [summary_message] + messages[boundary:]
+        logger.info(f"Thread {thread_id}: replaced {len(to_summarize)} messages with summary ({len(summarized)} messages remain)")
+        return summarized
 
     def is_tool_result_message(self, msg: Dict[str, Any]) -> bool:
         """Check if a message is a tool result message."""
@@ -107,79 +334,6 @@ class ContextManager:
             else:
                 return msg_content
   
-    def compress_tool_result_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the tool result messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of ToolResult messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if self.is_tool_result_message(msg):  # Only compress ToolResult messages
-                    _i += 1  # Count the number of ToolResult messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent ToolResult message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-        return messages
-
-    def compress_user_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the user messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of User messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if msg.get('role') == 'user':  # Only compress User messages
-                    _i += 1  # Count the number of User messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent User message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-        return messages
-
-    def compress_assistant_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the assistant messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-        
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of Assistant messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if msg.get('role') == 'assistant':  # Only compress Assistant messages
-                    _i += 1  # Count the number of Assistant messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent Assistant message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-                            
-        return messages
-
     def remove_meta_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove meta messages from the messages."""
         result: List[Dict[str, Any]] = []
@@ -207,49 +361,181 @@ class ContextManager:
                 result.append(msg)
         return result
 
-    def compress_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int] = 41000, token_threshold: int = 4096, max_iterations: int = 5) -> List[Dict[str, Any]]:
-        """Compress the messages.
-        
+    def _message_category(self, msg: Dict[str, Any]) -> Optional[str]:
+        """Classify a message for compression: tool result, user or assistant."""
+        if not isinstance(msg, dict):
+            return None
+        if self.is_tool_result_message(msg):
+            return "tool_result"
+        if msg.get('role') in ("user", "assistant"):
+            return msg['role']
+        return None
+
+    def plan_compression(
+        self,
+        messages: List[Dict[str, Any]],
+        llm_model: str,
+        max_tokens: int,
+        token_threshold: int = 4096,
+        min_token_threshold: int = 256,
+        min_messages_to_keep: int = 10
+    ) -> Tuple[List[Dict[str, Any]], CompressionPlan]:
+        """Fit messages into a token budget in a single planning pass.
+
+        Per-message token costs are computed once (through the token cache) and
+        the running total is updated by deltas, so the list is never re-counted.
+
+        1. Truncate older tool results, then user, then assistant messages,
+           largest first, to `token_threshold * 3` characters. If that is not
+           enough, repeat with the threshold halved down to `min_token_threshold`.
+           The most recent message of each category is only middle-truncated.
+        2. If the budget is still exceeded, omit messages from the middle of the
+           conversation outward, keeping the system message and at least
+           `min_messages_to_keep` conversation messages.
+
         Args:
-            messages: List of messages to compress
+            messages: Messages to fit (not modified)
             llm_model: Model name for token counting
-            max_tokens: Maximum allowed tokens
-            token_threshold: Token threshold for individual message compression (must be a power of 2)
-            max_iterations: Maximum number of compression iterations
+            max_tokens: Token budget for the prompt
+            token_threshold: Initial per-message threshold (must be a power of 2)
+            min_token_threshold: Smallest per-message threshold to try
+            min_messages_to_keep: Minimum number of conversation messages to preserve
+
+        Returns:
+            Tuple of (compressed messages, plan describing what was changed)
         """
-        # Set model-specific token limits
-        if 'sonnet' in llm_model.lower():
-            max_tokens = 200 * 1000 - 64000 - 28000
-        elif 'gpt' in llm_model.lower():
-            max_tokens = 128 * 1000 - 28000
-        elif 'gemini' in llm_model.lower():
-            max_tokens = 1000 * 1000 - 300000
-        elif 'deepseek' in llm_model.lower():
-            max_tokens = 128 * 1000 - 28000
-        else:
-            max_tokens = 41 * 1000 - 10000
+        result = [msg.copy() if isinstance(msg, dict) else msg for msg in self.remove_meta_messages(messages)]
+        costs = [token_cache.count_message(llm_model, msg) for msg in result]
+        total = sum(costs)
+        plan = CompressionPlan(budget=max_tokens, tokens_before=total, tokens_after=total)
+
+        if total <= max_tokens:
+            return result, plan
+
+        def truncate(index: int, action: str, new_content: Union[str, dict]):
+            nonlocal total
+            msg = result[index]
+            msg['content'] = new_content
+            new_cost = token_cache.count_message(llm_model, msg)
+            plan.actions.append(CompressionAction(
+                index=index, message_id=msg.get('message_id'), role=msg.get('role', 'unknown'),
+                action=action, tokens_before=costs[index], tokens_after=new_cost
+            ))
+            total += new_cost - costs[index]
+            costs[index] = new_cost
+
+        # Group candidates by category; the most recent message of each category is kept readable
+        categories = {"tool_result": [], "user": [], "assistant": []}
+        for i, msg in enumerate(result):
+            category = self._message_category(msg)
+            if category and isinstance(msg.get('content'), (str, dict)):
+                categories[category].append(i)
+
+        latest = {category: indices[-1] for category, indices in categories.items() if indices}
+        for category, index in latest.items():
+            if total <= max_tokens:
+                break
+            if costs[index] > token_threshold:
+                truncated = self.safe_truncate(result[index]['content'], int(max_tokens * 2))
+                if truncated != result[index]['content']:
+                    truncate(index, "safe_truncate", truncated)
+
+        # Older messages, largest first within each category
+        older = []
+        for priority, category in enumerate(("tool_result", "user", "assistant")):
+            for index in categories[category][:-1]:
+                if result[index].get('message_id'):
+                    older.append((priority, -costs[index], index))
+                else:
+                    logger.warning(f"UNEXPECTED: Message has no message_id {str(result[index])[:100]}")
+        older.sort()
+
+        threshold = token_threshold
+        while total > max_tokens and threshold >= min_token_threshold and older:
+            for _, _, index in older:
+                if total <= max_tokens:
+                    break
+                if costs[index] > threshold:
+                    msg = result[index]
+                    compressed = self.compress_message(msg['content'], msg['message_id'], threshold * 3)
+                    if compressed != msg['content']:
+                        truncate(index, f"truncate@{threshold}", compressed)
+            threshold //= 2
 
-        result = messages
-        result = self.remove_meta_messages(result)
+        if total > max_tokens:
+            result, total = self._omit_middle_messages(result, costs, total, max_tokens, min_messages_to_keep, plan)
 
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=result)
+        plan.tokens_after = total
+        return result, plan
 
-        result = self.compress_tool_result_messages(result, llm_model, max_tokens, token_threshold)
-        result = self.compress_user_messages(result, llm_model, max_tokens, token_threshold)
-        result = self.compress_assistant_messages(result, llm_model, max_tokens, token_threshold)
+    def _omit_middle_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        costs: List[int],
+        total: int,
+        max_tokens: int,
+        min_messages_to_keep: int,
+        plan: CompressionPlan
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Omit messages from the middle of the conversation outward until the budget fits."""
+        start = 1 if messages and isinstance(messages[0], dict) and messages[0].get('role') == 'system' else 0
+        conversation_len = len(messages) - start
+        removable = conversation_len - min_messages_to_keep
+        if removable <= 0:
+            logger.warning(f"Cannot compress further: only {conversation_len} messages remain (min: {min_messages_to_keep})")
+            return messages, total
 
-        compressed_token_count = token_counter(model=llm_model, messages=result)
+        # Expand a window around the middle of the conversation, alternating right/left
+        center = start + conversation_len // 2
+        left, right = center - 1, center
+        omitted = set()
+        take_right = True
+        while total > max_tokens and len(omitted) < removable:
+            if take_right and right < len(messages):
+                index, right = right, right + 1
+            elif left >= start:
+                index, left = left, left - 1
+            else:
+                index, right = right, right + 1
+            take_right = not take_right
+            omitted.add(index)
+            total -= costs[index]
+            plan.actions.append(CompressionAction(
+                index=index, message_id=messages[index].get('message_id') if isinstance(messages[index], dict) else None,
+                role=messages[index].get('role', 'unknown') if isinstance(messages[index], dict) else 'unknown',
+                action="omit", tokens_before=costs[index], tokens_after=0
+            ))
 
-        logger.info(f"compress_messages: {uncompressed_total_token_count} -> {compressed_token_count}")  # Log the token compression for debugging later
+        if total > max_tokens:
+            logger.warning(f"Cannot compress further: {total} > {max_tokens} tokens with {conversation_len - len(omitted)} messages remaining (min: {min_messages_to_keep})")
 
-        if max_iterations <= 0:
-            logger.warning(f"compress_messages: Max iterations reached, omitting messages")
-            result = self.compress_messages_by_omitting_messages(messages, llm_model, max_tokens)
-            return result
+        return [msg for i, msg in enumerate(messages) if i not in omitted], total
 
-        if compressed_token_count > max_tokens:
-            logger.warning(f"Further token compression is needed: {compressed_token_count} > {max_tokens}")
-            result = self.compress_messages(messages, llm_model, max_tokens, token_threshold // 2, max_iterations - 1)
+    def compress_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int] = None, token_threshold: int = 4096, max_iterations: int = 5, llm_max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Compress the messages.
+        
+        Args:
+            messages: List of messages to compress
+            llm_model: Model name for token counting
+            max_tokens: Prompt token budget; derived from the model registry when not set
+            token_threshold: Token threshold for individual message compression (must be a power of 2)
+            max_iterations: Number of times the per-message threshold may be halved
+            llm_max_tokens: Configured max_tokens for the response, reserved out of the context window
+        """
+        if max_tokens is None:
+            max_tokens = get_input_budget(llm_model, llm_max_tokens)
+
+        result, plan = self.plan_compression(
+            messages, llm_model, max_tokens,
+            token_threshold=token_threshold,
+            min_token_threshold=max(1, token_threshold >> max_iterations)
+        )
+
+        self.last_compression_plan = plan
+        logger.info(f"compress_messages: {plan.tokens_before} -> {plan.tokens_after}")  # Log the token compression for debugging later
+        if plan.actions:
+            logger.info(plan.explain())
+        token_cache.log_stats()
 
         return self.middle_out_messages(result)
     
@@ -257,8 +543,7 @@ class ContextManager:
             self, 
             messages: List[Dict[str, Any]], 
             llm_model: str, 
-            max_tokens: Optional[int] = 41000,
-            removal_batch_size: int = 10,
+            max_tokens: Optional[int] = None,
             min_messages_to_keep: int = 10
         ) -> List[Dict[str, Any]]:
         """Compress the messages by omitting messages from the middle.
@@ -266,63 +551,23 @@ class ContextManager:
         Args:
             messages: List of messages to compress
             llm_model: Model name for token counting
-            max_tokens: Maximum allowed tokens
-            removal_batch_size: Number of messages to remove per iteration
+            max_tokens: Maximum allowed tokens; derived from the model registry when not set
             min_messages_to_keep: Minimum number of messages to preserve
         """
         if not messages:
             return messages
-            
-        result = messages
-        result = self.remove_meta_messages(result)
 
-        # Early exit if no compression needed
-        initial_token_count = token_counter(model=llm_model, messages=result)
-        max_allowed_tokens = max_tokens or (100 * 1000)
-        
-        if initial_token_count <= max_allowed_tokens:
-            return result
+        result = self.remove_meta_messages(messages)
+        costs = [token_cache.count_message(llm_model, msg) for msg in result]
+        total = sum(costs)
+        max_allowed_tokens = max_tokens or get_input_budget(llm_model)
+        plan = CompressionPlan(budget=max_allowed_tokens, tokens_before=total, tokens_after=total)
 
-        # Separate system message (assumed to be first) from conversation messages
-        system_message = messages[0] if messages and isinstance(messages[0], dict) and messages[0].get('role') == 'system' else None
-        conversation_messages = result[1:] if system_message else result
-        
-        safety_limit = 500
-        current_token_count = initial_token_count
-        
-        while current_token_count > max_allowed_tokens and safety_limit > 0:
-            safety_limit -= 1
-            
-            if len(conversation_messages) <= min_messages_to_keep:
-                logger.warning(f"Cannot compress further: only {len(conversation_messages)} messages remain (min: {min_messages_to_keep})")
-                break
-
-            # Calculate removal strategy based on current message count
-            if len(conversation_messages) > (removal_batch_size * 2):
-                # Remove from middle, keeping recent and early context
-                middle_start = len(conversation_messages) // 2 - (removal_batch_size // 2)
-                middle_end = middle_start + removal_batch_size
-                conversation_messages = conversation_messages[:middle_start] + conversation_messages[middle_end:]
-            else:
-                # Remove from earlier messages, preserving recent context
-                messages_to_remove = min(removal_batch_size, len(conversation_messages) // 2)
-                if messages_to_remove > 0:
-                    conversation_messages = conversation_messages[messages_to_remove:]
-                else:
-                    # Can't remove any more messages
-                    break
-
-            # Recalculate token count
-            messages_to_count = ([system_message] + conversation_messages) if system_message else conversation_messages
-            current_token_count = token_counter(model=llm_model, messages=messages_to_count)
+        if total > max_allowed_tokens:
+            result, plan.tokens_after = self._omit_middle_messages(result, costs, total, max_allowed_tokens, min_messages_to_keep, plan)
+            logger.info(f"compress_messages_by_omitting_messages: {plan.tokens_before} -> {plan.tokens_after} tokens ({len(messages)} -> {len(result)} messages)")
 
-        # Prepare final result
-        final_messages = ([system_message] + conversation_messages) if system_message else conversation_messages
-        final_token_count = token_counter(model=llm_model, messages=final_messages)
-        
-        logger.info(f"compress_messages_by_omitting_messages: {initial_token_count} -> {final_token_count} tokens ({len(messages)} -> {len(final_messages)} messages)")
-            
-        return final_messages
+        return result
     
     def middle_out_messages(self, messages: List[Dict[str, Any]], max_messages: int = 320) -> List[Dict[str, Any]]:
         """Remove messages from the middle of the list, keeping max_messages total."""
@@ -0,0 +1,261 @@
+"""
+Per-thread LLM message cache for AgentPress.
+
+ThreadManager.get_llm_messages is called on every auto-continue iteration. Without
+a cache each call re-pages the whole `messages` table for the thread and re-parses
+every JSON blob, even though only a handful of rows were appended since the last
+turn. This module keeps the parsed messages of recently used threads in-process
+together with a high-water mark (created_at of the newest row read from the
+database), so callers only have to fetch rows newer than that mark.
+
+created_at comes from two clocks: the worker assigns it to write-behind rows,
+the database's now() to rows inserted by the API (user messages). A row can
+therefore land just behind the mark, so incremental fetches start
+THREAD_MESSAGE_CACHE_SKEW_SECONDS below it (see `rewind`) and rows already
+cached are de-duplicated by message_id.
+
+Tiers:
+- In-process LRU of parsed messages (always on)
+- Optional Redis snapshot so a fresh worker can skip the full reload
+  (enabled with THREAD_MESSAGE_CACHE_REDIS)
+
+Invalidation works across processes through a per-thread generation counter in
+Redis: deleting a message bumps the generation and every process drops its local
+copy on the next read.
+
+Threads with a rolling summary (a `summary` row) only keep the latest summary and
+the messages after it; older rows are dropped as soon as a summary is merged.
+"""
+
+import copy
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+GENERATION_KEY_PREFIX = "thread_llm_messages_gen:"
+SNAPSHOT_KEY_PREFIX = "thread_llm_messages:"
+SNAPSHOT_TTL = 3600  # 1 hour
+
+
+def parse_message_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Parse a `messages` row into the LLM message dict used by ThreadManager."""
+    content = row.get('content')
+    if isinstance(content, str):
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse message: {content}")
+            return None
+    else:
+        parsed = content
+    if not isinstance(parsed, dict):
+        logger.error(f"Unexpected message content type for {row.get('message_id')}: {type(parsed)}")
+        return None
+    parsed['message_id'] = row['message_id']
+    return parsed
+
+
+def rewind(created_at: Optional[str], seconds: Optional[int] = None) -> Optional[str]:
+    """Move a created_at high-water mark back by `seconds` to tolerate clock skew.
+
+    Defaults to THREAD_MESSAGE_CACHE_SKEW_SECONDS.
+    """
+    if seconds is None:
+        seconds = config.THREAD_MESSAGE_CACHE_SKEW_SECONDS
+    if not created_at or seconds <= 0:
+        return created_at
+    try:
+        return (datetime.fromisoformat(created_at) - timedelta(seconds=seconds)).isoformat()
+    except ValueError:
+        logger.warning(f"Unparseable high-water mark {created_at}, fetching from it unchanged")
+        return created_at
+
+
+@dataclass
+class _ThreadEntry:
+    """Cached state for a single thread."""
+    generation: Optional[str] = None
+    high_water_mark: Optional[str] = None
+    # Each row is {"message_id", "created_at", "type", "message"}; kept ordered by created_at
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    message_ids: Set[str] = field(default_factory=set)
+
+    def add(self, message_id: str, created_at: Optional[str], message: Dict[str, Any], type: Optional[str] = None) -> bool:
+        if message_id in self.message_ids:
+            return False
+        created_at = created_at or ""
+        if type != 'summary' and self.rows and self.rows[0].get('type') == 'summary' and created_at < self.rows[0]['created_at']:
+            # Re-read from the skew window, but already covered by the summary
+            self.message_ids.add(message_id)
+            return False
+        out_of_order = bool(self.rows) and created_at < self.rows[-1]['created_at']
+        self.rows.append({"message_id": message_id, "created_at": created_at, "type": type, "message": message})
+        self.message_ids.add(message_id)
+        if out_of_order:
+            self.rows.sort(key=lambda r: r['created_at'])
+        if type == 'summary':
+            self._drop_before_latest_summary()
+        return True
+
+    def _drop_before_latest_summary(self):
+        latest = max((i for i, row in enumerate(self.rows) if row.get('type') == 'summary'), default=0)
+        if latest:
+            # message_ids of dropped rows are kept so re-fetched boundary rows stay de-duplicated
+            self.rows = self.rows[latest:]
+
+
+class ThreadMessageCache:
+    """Process-wide LRU cache of parsed LLM messages keyed by thread_id."""
+
+    def __init__(self, max_threads: int = 256, use_redis_snapshot: bool = False):
+        """Initialize the cache.
+
+        Args:
+            max_threads: Maximum number of threads kept in-process
+            use_redis_snapshot: Whether to mirror cached threads into Redis
+        """
+        self.max_threads = max_threads
+        self.use_redis_snapshot = use_redis_snapshot
+        self._entries: "OrderedDict[str, _ThreadEntry]" = OrderedDict()
+
+    async def _get_generation(self, thread_id: str) -> Optional[str]:
+        try:
+            return await redis.get(f"{GENERATION_KEY_PREFIX}{thread_id}")
+        except Exception as e:
+            logger.warning(f"Could not read message cache generation for thread {thread_id}: {e}")
+            return None
+
+    async def _load_snapshot(self, thread_id: str, generation: Optional[str]) -> Optional[_ThreadEntry]:
+        try:
+            raw = await redis.get(f"{SNAPSHOT_KEY_PREFIX}{thread_id}")
+            if not raw:
+                return None
+            data = json.loads(raw)
+            if data.get('generation') != generation:
+                return None
+            entry = _ThreadEntry(generation=generation, high_water_mark=data.get('high_water_mark'))
+            for row in data.get('rows', []):
+                entry.add(row['message_id'], row.get('created_at'), row['message'], row.get('type'))
+            logger.debug(f"Loaded {len(entry.rows)} cached messages for thread {thread_id} from Redis")
+            return entry
+        except Exception as e:
+            logger.warning(f"Failed to load message cache snapshot for thread {thread_id}: {e}")
+            return None
+
+    async def _save_snapshot(self, thread_id: str, entry: _ThreadEntry):
+        try:
+            data = {
+                "generation": entry.generation,
+                "high_water_mark": entry.high_water_mark,
+                "rows": entry.rows,
+            }
+            await redis.set(f"{SNAPSHOT_KEY_PREFIX}{thread_id}", json.dumps(data), ex=SNAPSHOT_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to save message cache snapshot for thread {thread_id}: {e}")
+
+    def _store(self, thread_id: str, entry: _ThreadEntry):
+        self._entries[thread_id] = entry
+        self._entries.move_to_end(thread_id)
+        while len(self._entries) > self.max_threads:
+            self._entries.popitem(last=False)
+
+    async def get_high_water_mark(self, thread_id: str) -> Optional[str]:
+        """Validate the cached entry for a thread and return its high-water mark.
+
+        Returns:
+            created_at of the newest row read from the database, or None if the
+            thread has to be loaded from scratch.
+        """
+        generation = await self._get_generation(thread_id)
+        entry = self._entries.get(thread_id)
+
+        if entry is not None and entry.generation != generation:
+            logger.debug(f"Message cache for thread {thread_id} invalidated (generation {entry.generation} -> {generation})")
+            entry = None
+            self._entries.pop(thread_id, None)
+
+        if entry is None and self.use_redis_snapshot:
+            entry = await self._load_snapshot(thread_id, generation)
+
+        if entry is None:
+            entry = _ThreadEntry(generation=generation)
+
+        self._store(thread_id, entry)
+        return entry.high_water_mark
+
+    async def merge(self, thread_id: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge freshly fetched rows into the cache and return the thread's messages.
+
+        Args:
+            thread_id: The thread the rows belong to
+            rows: Rows with message_id, type, content and created_at, ordered by created_at
+
+        Returns:
+            Copies of the latest summary (if any) and all cached messages after it, oldest first.
+        """
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            entry = _ThreadEntry()
+            self._store(thread_id, entry)
+
+        added = 0
+        for row in rows:
+            created_at = row.get('created_at')
+            if created_at and (entry.high_water_mark is None or created_at > entry.high_water_mark):
+                entry.high_water_mark = created_at
+            if row['message_id'] in entry.message_ids:
+                continue
+            message = parse_message_row(row)
+            if message is not None and entry.add(row['message_id'], created_at, message, row.get('type')):
+                added += 1
+
+        if added:
+            logger.debug(f"Message cache for thread {thread_id}: +{added} messages ({len(entry.rows)} total)")
+            if self.use_redis_snapshot:
+                await self._save_snapshot(thread_id, entry)
+
+        # Callers (context compression, prompt caching) mutate messages in place
+        return [copy.deepcopy(row['message']) for row in entry.rows]
+
+    def record(self, thread_id: str, row: Dict[str, Any]):
+        """Write-through a message that was just inserted by this process.
+
+        The high-water mark is intentionally not advanced: rows written by other
+        processes with an earlier created_at must still be picked up on the next
+        incremental fetch.
+        """
+        entry = self._entries.get(thread_id)
+        if entry is None or not row.get('message_id'):
+            return
+        message = parse_message_row(copy.deepcopy(row))
+        if message is not None:
+            entry.add(row['message_id'], row.get('created_at'), message, row.get('type'))
+
+    async def invalidate(self, thread_id: str, keep_local: bool = False):
+        """Drop cached messages for a thread in every process.
+
+        Args:
+            thread_id: The thread to invalidate
+            keep_local: Keep this process's entry (already updated through record)
+                and only make other processes reload
+        """
+        entry = self._entries.get(thread_id) if keep_local else self._entries.pop(thread_id, None)
+        try:
+            redis_client = await redis.get_client()
+            generation = await redis_client.incr(f"{GENERATION_KEY_PREFIX}{thread_id}")
+            await redis_client.expire(f"{GENERATION_KEY_PREFIX}{thread_id}", redis.REDIS_KEY_TTL)
+            await redis_client.delete(f"{SNAPSHOT_KEY_PREFIX}{thread_id}")
+            if keep_local and entry is not None:
+                entry.generation = str(generation)
+            logger.debug(f"Invalidated message cache for thread {thread_id}")
+        except Exception as e:
+            logger.warning(f"Failed to invalidate message cache for thread {thread_id}: {e}")
+
+
+message_cache = ThreadMessageCache(use_redis_snapshot=config.THREAD_MESSAGE_CACHE_REDIS)
@@ -0,0 +1,169 @@
+"""
+Write-behind message persistence for AgentPress.
+
+ResponseProcessor stores a message for the run start, every tool status, every
+tool result and the finish of a turn. Awaiting one Supabase insert per message
+put a full HTTP round trip on the streaming path each time. The MessageWriter
+assigns message_id and created_at client-side, returns the row immediately and
+writes buffered rows with one bulk insert:
+
+- after `flush_interval_ms`, or as soon as `max_batch_size` rows are buffered
+- before ThreadManager.get_llm_messages and at the end of every turn, so
+  LLM-visible messages are durable before the next LLM call or agent iteration
+
+Ordering does not depend on insert order: created_at is taken when the message
+is produced, so rows written in one batch keep the order they were created in. Because
+these timestamps come from the worker clock while API-inserted rows use the
+database's now(), incremental message fetches re-read a skew window below their
+high-water mark (see message_cache.rewind).
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from services.supabase import DBConnection
+from utils.config import config
+from utils.logger import logger
+
+
+def build_message_row(
+    thread_id: str,
+    type: str,
+    content: Union[Dict[str, Any], List[Any], str],
+    is_llm_message: bool = False,
+    metadata: Optional[Dict[str, Any]] = None,
+    agent_id: Optional[str] = None,
+    agent_version_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build a complete `messages` row, including the client-assigned ID and timestamps."""
+    now = datetime.now(timezone.utc).isoformat()
+    # Every row has the same keys so rows can share one bulk insert
+    return {
+        'message_id': str(uuid.uuid4()),
+        'thread_id': thread_id,
+        'type': type,
+        'content': content,
+        'is_llm_message': is_llm_message,
+        'metadata': metadata or {},
+        'agent_id': agent_id,
+        'agent_version_id': agent_version_id,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+class MessageWriter:
+    """Buffers message rows of a run and writes them with bulk inserts."""
+
+    def __init__(
+        self,
+        db: DBConnection,
+        on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        flush_interval_ms: Optional[int] = None,
+        max_batch_size: Optional[int] = None
+    ):
+        """Initialize the writer.
+
+        Args:
+            db: Database connection
+            on_written: Called with the rows of every successful insert
+            flush_interval_ms: Maximum time a row waits in the buffer
+            max_batch_size: Buffered rows that trigger an immediate flush
+        """
+        self.db = db
+        self.on_written = on_written
+        self.enabled = config.MESSAGE_WRITE_BEHIND
+        self.flush_interval = (flush_interval_ms or config.MESSAGE_FLUSH_INTERVAL_MS) / 1000
+        self.max_batch_size = max_batch_size or config.MESSAGE_FLUSH_MAX_ITEMS
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._scheduled: Optional[asyncio.Task] = None
+
+        self.stats = {"messages": 0, "inserts": 0, "failed_inserts": 0, "dropped": 0, "max_batch": 0}
+        self.turn_stats = {"messages": 0, "inserts": 0}
+
+    async def write(self, row: Dict[str, Any]):
+        """Queue a row built with build_message_row."""
+        self._buffer.append(row)
+        self.stats["messages"] += 1
+        self.turn_stats["messages"] += 1
+        if len(self._buffer) >= self.max_batch_size:
+            self._wake.set()
+        if self._scheduled is None or self._scheduled.done():
+            self._scheduled = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        try:
+            # Rows written while a flush is in progress are picked up by the next pass
+            while self._buffer:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Scheduled message flush failed: {e}", exc_info=True)
+
+    async def flush(self):
+        """Write all buffered rows with a single insert."""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+
+            client = await self.db.client
+            for attempt in range(2):
+                try:
+                    await client.table('messages').insert(batch).execute()
+                    self._record_insert(batch)
+                    return
+                except Exception as e:
+                    if attempt == 0:
+                        logger.warning(f"Failed to insert {len(batch)} messages, retrying: {e}")
+                        continue
+                    logger.error(f"Bulk insert of {len(batch)} messages failed, inserting them one by one: {e}")
+                    self.stats["failed_inserts"] += 1
+
+            # Isolate the row that breaks the batch instead of losing the whole turn
+            for row in batch:
+                try:
+                    await client.table('messages').insert(row).execute()
+                    self._record_insert([row])
+                except Exception as e:
+                    self.stats["dropped"] += 1
+                    logger.error(f"Dropping message {row['message_id']} of type '{row['type']}' for thread {row['thread_id']}: {e}")
+
+    def _record_insert(self, rows: List[Dict[str, Any]]):
+        self.stats["inserts"] += 1
+        self.turn_stats["inserts"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(rows))
+        if self.on_written:
+            self.on_written(rows)
+
+    def end_turn(self) -> Dict[str, int]:
+        """Log and reset the per-turn counters.
+
+        Returns:
+            Messages written and inserts used during the turn (one insert per
+            message before write-behind)
+        """
+        turn_stats, self.turn_stats = self.turn_stats, {"messages": 0, "inserts": 0}
+        if turn_stats["messages"]:
+            logger.debug(
+                f"Persisted {turn_stats['messages']} messages with {turn_stats['inserts']} inserts this turn "
+                f"(previously {turn_stats['messages']}); totals: {self.get_stats()}"
+            )
+        return turn_stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["pending"] = len(self._buffer)
+        stats["messages_per_insert"] = round(stats["messages"] / stats["inserts"], 2) if stats["inserts"] else 0.0
+        return stats
@@ -0,0 +1,96 @@
+"""
+Rendered prompt cache for AgentPress.
+
+The system prompt and the XML tool block are large strings that only depend on
+the agent version, the registered tool set and the model family, yet they used to
+be rebuilt on every run and every auto-continue iteration. This module memoizes
+rendered prompt sections by a caller-provided key.
+
+Tiers:
+- In-process LRU (always on)
+- Redis, so concurrent runs of the same agent on other workers reuse the bytes
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+from services import redis
+from utils.logger import logger
+
+KEY_PREFIX = "prompt_cache:"
+REDIS_TTL = 3600  # 1 hour
+
+
+class PromptCache:
+    """Two-tier cache of rendered prompt sections."""
+
+    def __init__(self, max_entries: int = 128, redis_ttl: int = REDIS_TTL):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of rendered sections kept in-process
+            redis_ttl: Expiry of the Redis copies in seconds
+        """
+        self.max_entries = max_entries
+        self.redis_ttl = redis_ttl
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a cache key from the values a rendered section depends on."""
+        serialized = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.md5(serialized.encode()).hexdigest()
+
+    def _store(self, cache_key: str, value: str):
+        self._entries[cache_key] = value
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_build(self, namespace: str, key: str, builder: Callable[[], str]) -> str:
+        """Return the cached section for a key, rendering it with `builder` on a miss.
+
+        Args:
+            namespace: Kind of section, e.g. "system_prompt" or "xml_tools"
+            key: Key from make_key (or another stable fingerprint)
+            builder: Renders the section; only called on a miss
+
+        Returns:
+            The rendered section
+        """
+        cache_key = f"{namespace}:{key}"
+        value = self._entries.get(cache_key)
+        if value is not None:
+            self._entries.move_to_end(cache_key)
+            self.stats["local_hits"] += 1
+            return value
+
+        try:
+            value = await redis.get(f"{KEY_PREFIX}{cache_key}")
+        except Exception as e:
+            logger.warning(f"Failed to read prompt cache entry {cache_key}: {e}")
+            value = None
+
+        if value is not None:
+            self.stats["redis_hits"] += 1
+            self._store(cache_key, value)
+            return value
+
+        self.stats["misses"] += 1
+        value = builder()
+        self._store(cache_key, value)
+        try:
+            await redis.set(f"{KEY_PREFIX}{cache_key}", value, ex=self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"Failed to write prompt cache entry {cache_key}: {e}")
+        logger.debug(f"Rendered {namespace} prompt section ({len(value)} chars), cache stats: {self.stats}")
+        return value
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, entries=len(self._entries))
+
+
+prompt_cache = PromptCache()
@@ -18,9 +18,11 @@ from dataclasses import dataclass
 from utils.logger import logger
 from agentpress.tool import ToolResult
 from agentpress.tool_registry import ToolRegistry
-from agentpress.xml_tool_parser import XMLToolParser
-from langfuse.client import StatefulTraceClient
-from services.langfuse import langfuse
+from agentpress.chunk_coalescer import FLUSH_DUE, ChunkCoalescer, with_flush_deadlines
+from agentpress.tool_scheduler import tool_scheduler
+from agentpress.tool_cache import tool_result_cache
+from agentpress.xml_tool_parser import StreamingXMLToolParser, XMLToolCall, XMLToolParser
+from services.tracing import TraceHandle, tracer
 from utils.json_helpers import (
     ensure_dict, ensure_list, safe_json_parse, 
     to_json_string, format_for_yield
@@ -86,7 +88,7 @@ class ProcessorConfig:
 class ResponseProcessor:
     """Processes LLM responses, extracting and executing tool calls."""
     
-    def __init__(self, tool_registry: ToolRegistry, add_message_callback: Callable, trace: Optional[StatefulTraceClient] = None, is_agent_builder: bool = False, target_agent_id: Optional[str] = None, agent_config: Optional[dict] = None):
+    def __init__(self, tool_registry: ToolRegistry, add_message_callback: Callable, trace: Optional[TraceHandle] = None, is_agent_builder: bool = False, target_agent_id: Optional[str] = None, agent_config: Optional[dict] = None, stop_event: Optional[asyncio.Event] = None):
         """Initialize the ResponseProcessor.
         
         Args:
@@ -94,15 +96,31 @@ class ResponseProcessor:
             add_message_callback: Callback function to add messages to the thread.
                 MUST return the full saved message object (dict) or None.
             agent_config: Optional agent configuration with version information
+            stop_event: Optional event set when the run is stopped; cancels queued and running tools
         """
         self.tool_registry = tool_registry
         self.add_message = add_message_callback
-        self.trace = trace or langfuse.trace(name="anonymous:response_processor")
+        self.trace = trace or tracer.trace(name="anonymous:response_processor")
         # Initialize the XML parser
         self.xml_parser = XMLToolParser()
         self.is_agent_builder = is_agent_builder
         self.target_agent_id = target_agent_id
         self.agent_config = agent_config
+        self.stop_event = stop_event
+        # Set by the agent runner once the account is known; scopes the tool result cache
+        self.account_id: Optional[str] = None
+
+    def _build_content_chunk(self, thread_id: str, thread_run_id: str, sequence: int, content: str) -> Dict[str, Any]:
+        """Build a transient (unsaved) assistant content chunk for the stream."""
+        now_chunk = datetime.now(timezone.utc).isoformat()
+        return {
+            "sequence": sequence,
+            "message_id": None, "thread_id": thread_id, "type": "assistant",
+            "is_llm_message": True,
+            "content": to_json_string({"role": "assistant", "content": content}),
+            "metadata": to_json_string({"stream_status": "chunk", "thread_run_id": thread_run_id}),
+            "created_at": now_chunk, "updated_at": now_chunk
+        }
 
     async def _yield_message(self, message_obj: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """Helper to yield a message with proper formatting.
@@ -169,7 +187,9 @@ class ResponseProcessor:
         continuous_state = continuous_state or {}
         accumulated_content = continuous_state.get('accumulated_content', "")
         tool_calls_buffer = {}
-        current_xml_content = accumulated_content   # equal to accumulated_content if auto-continuing, else blank
+        # Content carried over from a previous auto-continue pass is parsed together with the first delta
+        unparsed_xml_content = accumulated_content
+        xml_stream_parser = StreamingXMLToolParser(self.xml_parser)
         xml_chunks_buffer = []
         pending_tool_executions = []
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
@@ -190,7 +210,9 @@ class ResponseProcessor:
             "usage": {
                 "prompt_tokens": 0,
                 "completion_tokens": 0,
-                "total_tokens": 0
+                "total_tokens": 0,
+                "cache_read_input_tokens": 0,
+                "cache_creation_input_tokens": 0
             },
             "response_ms": None,
             "first_chunk_time": None,
@@ -203,6 +225,7 @@ class ResponseProcessor:
         # Reuse thread_run_id for auto-continue or create new one
         thread_run_id = continuous_state.get('thread_run_id') or str(uuid.uuid4())
         continuous_state['thread_run_id'] = thread_run_id
+        llm_chunks = None
 
         try:
             # --- Save and Yield Start Events (only if not auto-continuing) ---
@@ -223,8 +246,18 @@ class ResponseProcessor:
             # --- End Start Events ---
 
             __sequence = continuous_state.get('sequence', 0)    # get the sequence from the previous auto-continue cycle
+            # Merges content deltas into fewer chunks; flushed before any other message is yielded
+            coalescer = ChunkCoalescer()
+
+            llm_chunks = with_flush_deadlines(llm_response, coalescer)
+            async for chunk in llm_chunks:
+                if chunk is FLUSH_DUE:
+                    coalesced_content = coalescer.take()
+                    if coalesced_content:
+                        yield self._build_content_chunk(thread_id, thread_run_id, __sequence, coalesced_content)
+                        __sequence += 1
+                    continue
 
-            async for chunk in llm_response:
                 # Extract streaming metadata from chunks
                 current_time = datetime.now(timezone.utc).timestamp()
                 if streaming_metadata["first_chunk_time"] is None:
@@ -244,6 +277,16 @@ class ResponseProcessor:
                         streaming_metadata["usage"]["completion_tokens"] = chunk.usage.completion_tokens
                     if hasattr(chunk.usage, 'total_tokens') and chunk.usage.total_tokens is not None:
                         streaming_metadata["usage"]["total_tokens"] = chunk.usage.total_tokens
+                    # Prompt cache accounting: Anthropic reports reads and writes, OpenAI only cached reads
+                    cache_read = getattr(chunk.usage, 'cache_read_input_tokens', None)
+                    if cache_read is None:
+                        prompt_details = getattr(chunk.usage, 'prompt_tokens_details', None)
+                        cache_read = getattr(prompt_details, 'cached_tokens', None) if prompt_details else None
+                    if cache_read is not None:
+                        streaming_metadata["usage"]["cache_read_input_tokens"] = cache_read
+                    cache_creation = getattr(chunk.usage, 'cache_creation_input_tokens', None)
+                    if cache_creation is not None:
+                        streaming_metadata["usage"]["cache_creation_input_tokens"] = cache_creation
 
                 if hasattr(chunk, 'choices') and chunk.choices and hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
                     finish_reason = chunk.choices[0].finish_reason
@@ -266,31 +309,34 @@ class ResponseProcessor:
                         chunk_content = delta.content
                         # print(chunk_content, end='', flush=True)
                         accumulated_content += chunk_content
-                        current_xml_content += chunk_content
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            # Yield ONLY content chunk (don't save)
-                            now_chunk = datetime.now(timezone.utc).isoformat()
-                            yield {
-                                "sequence": __sequence,
-                                "message_id": None, "thread_id": thread_id, "type": "assistant",
-                                "is_llm_message": True,
-                                "content": to_json_string({"role": "assistant", "content": chunk_content}),
-                                "metadata": to_json_string({"stream_status": "chunk", "thread_run_id": thread_run_id}),
-                                "created_at": now_chunk, "updated_at": now_chunk
-                            }
-                            __sequence += 1
+                            # Yield ONLY content chunk (don't save), merged with neighbouring deltas
+                            coalesced_content = coalescer.add(chunk_content)
+                            if coalesced_content:
+                                yield self._build_content_chunk(thread_id, thread_run_id, __sequence, coalesced_content)
+                                __sequence += 1
                         else:
                             logger.info("XML tool call limit reached - not yielding more content chunks")
                             self.trace.event(name="xml_tool_call_limit_reached", level="DEFAULT", status_message=(f"XML tool call limit reached - not yielding more content chunks"))
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
-                            for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
-                                xml_chunks_buffer.append(xml_chunk)
-                                result = self._parse_xml_tool_call(xml_chunk)
+                            # Only the new delta is scanned; completed <function_calls> blocks come back as they close
+                            xml_blocks = xml_stream_parser.feed(unparsed_xml_content + chunk_content)
+                            unparsed_xml_content = ""
+                            if xml_blocks:
+                                # The closing tag goes out before the tool's status messages
+                                coalesced_content = coalescer.take()
+                                if coalesced_content:
+                                    yield self._build_content_chunk(thread_id, thread_run_id, __sequence, coalesced_content)
+                                    __sequence += 1
+                            for xml_block in xml_blocks:
+                                xml_chunks_buffer.append(xml_block.raw_xml)
+                                if not xml_block.tool_calls:
+                                    logger.error(f"No tool calls found in XML chunk: {xml_block.raw_xml}")
+                                    continue
+                                result = self._convert_xml_tool_call(xml_block.tool_calls[0])
                                 if result:
                                     tool_call, parsing_details = result
                                     xml_tool_call_count += 1
@@ -319,6 +365,10 @@ class ResponseProcessor:
 
                     # --- Process Native Tool Call Chunks ---
                     if config.native_tool_calling and delta and hasattr(delta, 'tool_calls') and delta.tool_calls:
+                        coalesced_content = coalescer.take()
+                        if coalesced_content:
+                            yield self._build_content_chunk(thread_id, thread_run_id, __sequence, coalesced_content)
+                            __sequence += 1
                         for tool_call_chunk in delta.tool_calls:
                             # Yield Native Tool Call Chunk (transient status, not saved)
                             # ... (safe extraction logic for tool_call_data_chunk) ...
@@ -390,6 +440,21 @@ class ResponseProcessor:
             # print() # Add a final newline after the streaming loop finishes
 
             # --- After Streaming Loop ---
+            # Cancels the pending read of the LLM stream when the loop stopped early
+            await llm_chunks.aclose()
+            coalesced_content = coalescer.take()
+            if coalesced_content:
+                yield self._build_content_chunk(thread_id, thread_run_id, __sequence, coalesced_content)
+                __sequence += 1
+            logger.debug(f"Streamed content chunks for thread {thread_id}: {coalescer.get_stats()}")
+
+            usage = streaming_metadata["usage"]
+            if usage["prompt_tokens"]:
+                logger.info(
+                    f"Prompt cache for thread {thread_id}: {usage['cache_read_input_tokens']} read, "
+                    f"{usage['cache_creation_input_tokens']} written, {usage['prompt_tokens']} prompt tokens "
+                    f"({usage['cache_read_input_tokens'] / usage['prompt_tokens'] * 100:.1f}% hit)"
+                )
             
             if (
                 streaming_metadata["usage"]["total_tokens"] == 0
@@ -574,10 +639,7 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
-                    xml_chunks_buffer.extend(xml_chunks)
-                    # Process only chunks not already handled in the stream loop
+                    # Complete blocks were collected by the streaming parser; process those not handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
                     xml_chunks_to_process = xml_chunks_buffer[:remaining_limit] # Ensure limit is respected
 
@@ -833,6 +895,9 @@ class ResponseProcessor:
             raise # Use bare 'raise' to preserve the original exception with its traceback
 
         finally:
+            if llm_chunks is not None:
+                await llm_chunks.aclose()
+
             # Update continuous state for potential auto-continue
             if should_auto_continue:
                 continuous_state['accumulated_content'] = accumulated_content
@@ -1081,25 +1146,11 @@ class ResponseProcessor:
             if not chunks:
                 pos = 0
                 while pos < len(content):
-                    # Find the next tool tag
-                    next_tag_start = -1
-                    current_tag = None
-                    
-                    # Find the earliest occurrence of any registered tool function name
-                    # Check for available function names
-                    available_functions = self.tool_registry.get_available_functions()
-                    for func_name in available_functions.keys():
-                        # Convert function name to potential tag name (underscore to dash)
-                        tag_name = func_name.replace('_', '-')
-                        start_pattern = f'<{tag_name}'
-                        tag_pos = content.find(start_pattern, pos)
-                        
-                        if tag_pos != -1 and (next_tag_start == -1 or tag_pos < next_tag_start):
-                            next_tag_start = tag_pos
-                            current_tag = tag_name
-                    
-                    if next_tag_start == -1 or not current_tag:
+                    # Find the earliest occurrence of any registered tool tag (function name with dashes)
+                    tag_match = self.tool_registry.find_tool_tag(content, pos)
+                    if not tag_match:
                         break
+                    next_tag_start, current_tag = tag_match
                     
                     # Find the matching end tag
                     end_pattern = f'</{current_tag}>'
@@ -1163,21 +1214,7 @@ class ResponseProcessor:
                     return None
                 
                 # Take the first tool call (should only be one per chunk)
-                xml_tool_call = parsed_calls[0]
-                
-                # Convert to the expected format
-                tool_call = {
-                    "function_name": xml_tool_call.function_name,
-                    "xml_tag_name": xml_tool_call.function_name.replace('_', '-'),  # For backwards compatibility
-                    "arguments": xml_tool_call.parameters
-                }
-                
-                # Include the parsing details
-                parsing_details = xml_tool_call.parsing_details
-                parsing_details["raw_xml"] = xml_tool_call.raw_xml
-                
-                logger.debug(f"Parsed new format tool call: {tool_call}")
-                return tool_call, parsing_details
+                return self._convert_xml_tool_call(parsed_calls[0])
             
             # If not the expected <function_calls><invoke> format, return None
             logger.error(f"XML chunk does not contain expected <function_calls><invoke> format: {xml_chunk}")
@@ -1189,6 +1226,21 @@ class ResponseProcessor:
             self.trace.event(name="error_parsing_xml_chunk", level="ERROR", status_message=(f"Error parsing XML chunk: {e}"), metadata={"xml_chunk": xml_chunk})
             return None
 
+    def _convert_xml_tool_call(self, xml_tool_call: XMLToolCall) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Convert an XMLToolCall into (tool_call, parsing_details)."""
+        tool_call = {
+            "function_name": xml_tool_call.function_name,
+            "xml_tag_name": xml_tool_call.function_name.replace('_', '-'),  # For backwards compatibility
+            "arguments": xml_tool_call.parameters
+        }
+        
+        # Include the parsing details
+        parsing_details = xml_tool_call.parsing_details
+        parsing_details["raw_xml"] = xml_tool_call.raw_xml
+        
+        logger.debug(f"Parsed new format tool call: {tool_call}")
+        return tool_call, parsing_details
+
     def _parse_xml_tool_calls(self, content: str) -> List[Dict[str, Any]]:
         """Parse XML tool calls from content string.
         
@@ -1223,8 +1275,9 @@ class ResponseProcessor:
             function_name = tool_call["function_name"]
             arguments = tool_call["arguments"]
 
-            logger.info(f"Executing tool: {function_name} with arguments: {arguments}")
-            self.trace.event(name="executing_tool", level="DEFAULT", status_message=(f"Executing tool: {function_name} with arguments: {arguments}"))
+            logger.info(f"Executing tool: {function_name}")
+            logger.debug(f"Arguments of {function_name}", arguments=arguments)
+            self.trace.event(name="executing_tool", level="DEFAULT", status_message=(f"Executing tool: {function_name}"), metadata={"arguments": arguments})
             
             if isinstance(arguments, str):
                 try:
@@ -1232,19 +1285,32 @@ class ResponseProcessor:
                 except json.JSONDecodeError:
                     arguments = {"text": arguments}
             
-            # Get available functions from tool registry
-            available_functions = self.tool_registry.get_available_functions()
-            
-            # Look up the function by name
-            tool_fn = available_functions.get(function_name)
+            # Look up the function in the registry's dispatch table
+            tool_fn = self.tool_registry.get_available_functions().get(function_name)
             if not tool_fn:
                 logger.error(f"Tool function '{function_name}' not found in registry")
                 span.end(status_message="tool_not_found", level="ERROR")
                 return ToolResult(success=False, output=f"Tool function '{function_name}' not found")
             
+            cache_policy = None
+            if tool_result_cache.enabled and self.account_id:
+                cache_policy = self.tool_registry.get_cache_policy(function_name)
+            if cache_policy:
+                cached_result = await tool_result_cache.get(self.account_id, function_name, cache_policy, arguments)
+                if cached_result:
+                    logger.info(f"Serving cached result for tool {function_name}")
+                    span.end(status_message="tool_cache_hit", output=cached_result)
+                    return cached_result
+
             logger.debug(f"Found tool function for '{function_name}', executing...")
-            result = await tool_fn(**arguments)
-            logger.info(f"Tool execution complete: {function_name} -> {result}")
+            limits, concurrency_key = self.tool_registry.get_execution_limits(function_name)
+            result = await tool_scheduler.run(
+                function_name, tool_fn, arguments,
+                limits=limits, concurrency_key=concurrency_key, stop_event=self.stop_event
+            )
+            if cache_policy and isinstance(result, ToolResult):
+                await tool_result_cache.set(self.account_id, function_name, cache_policy, arguments, result)
+            logger.info(f"Tool execution complete: {function_name} (success: {getattr(result, 'success', None)})")
             span.end(status_message="tool_executed", output=result)
             return result
         except Exception as e:
@@ -1346,6 +1412,7 @@ class ResponseProcessor:
         
         This method executes all tool calls simultaneously using asyncio.gather, which
         can significantly improve performance when executing multiple independent tools.
+        Concurrency is bounded by the tool scheduler's per-tool and per-sandbox limits.
         
         Args:
             tool_calls: List of tool calls to execute
@@ -1431,6 +1498,10 @@ class ResponseProcessor:
                 logger.info("Adding parsing_details to tool result metadata")
                 self.trace.event(name="adding_parsing_details_to_tool_result_metadata", level="DEFAULT", status_message=(f"Adding parsing_details to tool result metadata"), metadata={"parsing_details": parsing_details})
             # ---
+
+            # Execution details reported by the tool layer (e.g. cache_hit)
+            if isinstance(result, ToolResult) and result.metadata:
+                metadata.update(result.metadata)
             
             # Check if this is a native function call (has id field)
             if "id" in tool_call:
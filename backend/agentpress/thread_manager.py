@@ -10,22 +10,27 @@ This module provides comprehensive conversation management, including:
 - Context summarization to manage token limits
 """
 
+import asyncio
+import copy
 import json
 from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal, cast
-from services.llm import make_llm_api_call
+from services.llm import make_llm_api_call, get_openrouter_fallback
 from agentpress.tool import Tool
 from agentpress.tool_registry import ToolRegistry
 from agentpress.context_manager import ContextManager
+from agentpress.message_cache import message_cache, rewind
+from agentpress.message_writer import MessageWriter, build_message_row
+from agentpress.prompt_cache import prompt_cache
 from agentpress.response_processor import (
     ResponseProcessor,
     ProcessorConfig
 )
 from services.supabase import DBConnection
 from utils.logger import logger
-from langfuse.client import StatefulGenerationClient, StatefulTraceClient
-from services.langfuse import langfuse
+from services.tracing import TraceHandle, tracer
 import datetime
-from litellm.utils import token_counter
+from agentpress.token_cache import token_cache
+from utils.model_registry import get_input_budget
 
 # Type alias for tool choice
 ToolChoice = Literal["auto", "required", "none"]
@@ -38,7 +43,7 @@ class ThreadManager:
     XML-based tool execution patterns.
     """
 
-    def __init__(self, trace: Optional[StatefulTraceClient] = None, is_agent_builder: bool = False, target_agent_id: Optional[str] = None, agent_config: Optional[dict] = None):
+    def __init__(self, trace: Optional[TraceHandle] = None, is_agent_builder: bool = False, target_agent_id: Optional[str] = None, agent_config: Optional[dict] = None, stop_event: Optional[asyncio.Event] = None):
         """Initialize ThreadManager.
 
         Args:
@@ -46,6 +51,7 @@ class ThreadManager:
             is_agent_builder: Whether this is an agent builder session
             target_agent_id: ID of the agent being built (if in agent builder mode)
             agent_config: Optional agent configuration with version information
+            stop_event: Optional event set when the run is stopped (cancels running tools)
         """
         self.db = DBConnection()
         self.tool_registry = ToolRegistry()
@@ -54,14 +60,16 @@ class ThreadManager:
         self.target_agent_id = target_agent_id
         self.agent_config = agent_config
         if not self.trace:
-            self.trace = langfuse.trace(name="anonymous:thread_manager")
+            self.trace = tracer.trace(name="anonymous:thread_manager")
+        self.message_writer = MessageWriter(self.db, on_written=self._on_messages_written)
         self.response_processor = ResponseProcessor(
             tool_registry=self.tool_registry,
-            add_message_callback=self.add_message,
+            add_message_callback=self.queue_message,
             trace=self.trace,
             is_agent_builder=self.is_agent_builder,
             target_agent_id=self.target_agent_id,
-            agent_config=self.agent_config
+            agent_config=self.agent_config,
+            stop_event=stop_event
         )
         self.context_manager = ContextManager()
 
@@ -148,20 +156,10 @@ class ThreadManager:
         logger.debug(f"Adding message of type '{type}' to thread {thread_id} (agent: {agent_id}, version: {agent_version_id})")
         client = await self.db.client
 
-        # Prepare data for insertion
-        data_to_insert = {
-            'thread_id': thread_id,
-            'type': type,
-            'content': content,
-            'is_llm_message': is_llm_message,
-            'metadata': metadata or {},
-        }
-        
-        # Add agent information if provided
-        if agent_id:
-            data_to_insert['agent_id'] = agent_id
-        if agent_version_id:
-            data_to_insert['agent_version_id'] = agent_version_id
+        # Same client-side IDs and timestamps as queued messages, so both sort on one clock
+        data_to_insert = build_message_row(
+            thread_id, type, content, is_llm_message, metadata, agent_id, agent_version_id
+        )
 
         try:
             # Insert the message and get the inserted row data including the id
@@ -169,6 +167,8 @@ class ThreadManager:
             logger.info(f"Successfully added message to thread {thread_id}")
 
             if result.data and len(result.data) > 0 and isinstance(result.data[0], dict) and 'message_id' in result.data[0]:
+                if is_llm_message:
+                    message_cache.record(thread_id, result.data[0])
                 return result.data[0]
             else:
                 logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result.data}")
@@ -177,11 +177,50 @@ class ThreadManager:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
             raise
 
+    async def queue_message(
+        self,
+        thread_id: str,
+        type: str,
+        content: Union[Dict[str, Any], List[Any], str],
+        is_llm_message: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        agent_id: Optional[str] = None,
+        agent_version_id: Optional[str] = None
+    ):
+        """Add a message through the run's write-behind buffer.
+
+        Takes the same arguments as add_message and returns the complete row
+        right away; the insert happens on the next flush (at the latest before
+        the next get_llm_messages and at the end of the turn). Falls back to
+        add_message when MESSAGE_WRITE_BEHIND is disabled.
+        """
+        if not self.message_writer.enabled:
+            return await self.add_message(thread_id, type, content, is_llm_message, metadata, agent_id, agent_version_id)
+
+        row = build_message_row(thread_id, type, content, is_llm_message, metadata, agent_id, agent_version_id)
+        await self.message_writer.write(row)
+        return dict(row)
+
+    def _on_messages_written(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            if row['is_llm_message']:
+                message_cache.record(row['thread_id'], row)
+
+    async def _end_turn_after(self, response_generator: AsyncGenerator) -> AsyncGenerator:
+        """Pass a turn's responses through and persist its queued messages at the end."""
+        try:
+            async for chunk in response_generator:
+                yield chunk
+        finally:
+            await self.message_writer.flush()
+            self.message_writer.end_turn()
+
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a thread.
 
-        This method uses the SQL function which handles context truncation
-        by considering summary messages.
+        Messages are served from the per-thread message cache; only rows newer
+        than the cache's high-water mark are fetched from the database. Threads
+        with a rolling summary are loaded from their latest summary message on.
 
         Args:
             thread_id: The ID of the thread to get messages for.
@@ -193,55 +232,106 @@ class ThreadManager:
         client = await self.db.client
 
         try:
-            # result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
-            
-            # Fetch messages in batches of 1000 to avoid overloading the database
-            all_messages = []
-            batch_size = 1000
-            offset = 0
-            
-            while True:
-                result = await client.table('messages').select('message_id, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
-                
-                if not result.data or len(result.data) == 0:
-                    break
-                    
-                all_messages.extend(result.data)
-                
-                # If we got fewer than batch_size records, we've reached the end
-                if len(result.data) < batch_size:
-                    break
-                    
-                offset += batch_size
-            
-            # Use all_messages instead of result.data in the rest of the method
-            result_data = all_messages
-
-            # Parse the returned data which might be stringified JSON
-            if not result_data:
-                return []
-
-            # Return properly parsed JSON objects
-            messages = []
-            for item in result_data:
-                if isinstance(item['content'], str):
-                    try:
-                        parsed_item = json.loads(item['content'])
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item['content']}")
-                else:
-                    content = item['content']
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
-
-            return messages
+            # LLM-visible messages still in the write-behind buffer must be in the database first
+            await self.message_writer.flush()
+            high_water_mark = await message_cache.get_high_water_mark(thread_id)
+            if high_water_mark is None:
+                since = await self._get_latest_summary_time(client, thread_id)
+            else:
+                # Rows stamped by a different clock can sort just behind the mark
+                since = rewind(high_water_mark)
+            new_rows = await self._fetch_llm_message_rows(client, thread_id, since=since)
+            return await message_cache.merge(thread_id, new_rows)
 
         except Exception as e:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
             return []
 
+    async def _get_latest_summary_time(self, client, thread_id: str) -> Optional[str]:
+        """Get created_at of the latest summary message of a thread, if any."""
+        result = await client.table('messages').select('created_at').eq('thread_id', thread_id).eq('type', 'summary').eq('is_llm_message', True).order('created_at', desc=True).limit(1).execute()
+        if result.data:
+            return result.data[0]['created_at']
+        return None
+
+    async def _fetch_llm_message_rows(self, client, thread_id: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch LLM message rows for a thread, optionally only those created at or after `since`.
+
+        Rows are fetched in batches of 1000 to avoid overloading the database.
+        """
+        all_rows = []
+        batch_size = 1000
+        offset = 0
+
+        while True:
+            query = client.table('messages').select('message_id, type, content, created_at').eq('thread_id', thread_id).eq('is_llm_message', True)
+            if since:
+                # gte rather than gt: rows sharing the boundary timestamp are de-duplicated by message_id
+                query = query.gte('created_at', since)
+            result = await query.order('created_at').range(offset, offset + batch_size - 1).execute()
+
+            if not result.data or len(result.data) == 0:
+                break
+
+            all_rows.extend(result.data)
+
+            # If we got fewer than batch_size records, we've reached the end
+            if len(result.data) < batch_size:
+                break
+
+            offset += batch_size
+
+        if since:
+            logger.debug(f"Fetched {len(all_rows)} new message rows for thread {thread_id} since {since}")
+        return all_rows
+
+    def _build_xml_tool_examples(self) -> str:
+        """Render the XML tool calling instructions for the registered tools.
+
+        Returns:
+            The instructions block, or an empty string if no tools are registered
+        """
+        openapi_schemas = self.tool_registry.get_openapi_schemas()
+        if not openapi_schemas:
+            return ""
+        usage_examples = self.tool_registry.get_usage_examples()
+
+        # Convert schemas to JSON string
+        schemas_json = json.dumps(openapi_schemas, indent=2)
+
+        # Build usage examples section if any exist
+        usage_examples_section = ""
+        if usage_examples:
+            usage_examples_section = "\n\nUsage Examples:\n"
+            for func_name, example in sorted(usage_examples.items()):
+                usage_examples_section += f"\n{func_name}:\n{example}\n"
+
+        return f"""
+In this environment you have access to a set of tools you can use to answer the user's question.
+
+You can invoke functions by writing a <function_calls> block like the following as part of your reply to the user:
+
+<function_calls>
+<invoke name="function_name">
+<parameter name="param_name">param_value</parameter>
+...
+</invoke>
+</function_calls>
+
+String and scalar parameters should be specified as-is, while lists and objects should use JSON format.
+
+Here are the functions available in JSON Schema format:
+
+```json
+{schemas_json}
+```
+
+When using the tools:
+- Use the exact function names from the JSON schema above
+- Include all required parameters as specified in the schema
+- Format complex data (objects, arrays) as JSON strings within the parameter tags
+- Boolean values should be "true" or "false" (lowercase)
+{usage_examples_section}"""
 
     async def run_thread(
         self,
@@ -260,7 +350,7 @@ class ThreadManager:
         enable_thinking: Optional[bool] = False,
         reasoning_effort: Optional[str] = 'low',
         enable_context_manager: bool = True,
-        generation: Optional[StatefulGenerationClient] = None,
+        generation: Optional[TraceHandle] = None,
     ) -> Union[Dict[str, Any], AsyncGenerator]:
         """Run a conversation thread with LLM integration and tool execution.
 
@@ -302,59 +392,16 @@ class ThreadManager:
             config.max_xml_tool_calls = max_xml_tool_calls
 
         # Create a working copy of the system prompt to potentially modify
-        working_system_prompt = system_prompt.copy()
+        # (deep, since list content blocks are modified in place below)
+        working_system_prompt = copy.deepcopy(system_prompt)
 
         # Add XML tool calling instructions to system prompt if requested
         if include_xml_examples and config.xml_tool_calling:
-            openapi_schemas = self.tool_registry.get_openapi_schemas()
-            usage_examples = self.tool_registry.get_usage_examples()
-            
-            if openapi_schemas:
-                # Convert schemas to JSON string
-                schemas_json = json.dumps(openapi_schemas, indent=2)
-                
-                # Build usage examples section if any exist
-                usage_examples_section = ""
-                if usage_examples:
-                    usage_examples_section = "\n\nUsage Examples:\n"
-                    for func_name, example in usage_examples.items():
-                        usage_examples_section += f"\n{func_name}:\n{example}\n"
-                
-                examples_content = f"""
-In this environment you have access to a set of tools you can use to answer the user's question.
-
-You can invoke functions by writing a <function_calls> block like the following as part of your reply to the user:
-
-<function_calls>
-<invoke name="function_name">
-<parameter name="param_name">param_value</parameter>
-...
-</invoke>
-</function_calls>
-
-String and scalar parameters should be specified as-is, while lists and objects should use JSON format.
-
-Here are the functions available in JSON Schema format:
-
-```json
-{schemas_json}
-```
-
-When using the tools:
-- Use the exact function names from the JSON schema above
-- Include all required parameters as specified in the schema
-- Format complex data (objects, arrays) as JSON strings within the parameter tags
-- Boolean values should be "true" or "false" (lowercase)
-{usage_examples_section}"""
-
-                # # Save examples content to a file
-                # try:
-                #     with open('xml_examples.txt', 'w') as f:
-                #         f.write(examples_content)
-                #     logger.debug("Saved XML examples to xml_examples.txt")
-                # except Exception as e:
-                #     logger.error(f"Failed to save XML examples to file: {e}")
+            examples_content = await prompt_cache.get_or_build(
+                "xml_tools", self.tool_registry.get_fingerprint(), self._build_xml_tool_examples
+            )
 
+            if examples_content:
                 system_content = working_system_prompt.get('content')
 
                 if isinstance(system_content, str):
@@ -397,10 +444,15 @@ When using the tools:
                 token_count = 0
                 try:
                     # Use the potentially modified working_system_prompt for token counting
-                    token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages)
-                    token_threshold = self.context_manager.token_threshold
+                    token_count = token_cache.count_messages(llm_model, [working_system_prompt] + messages)
+                    token_threshold = get_input_budget(llm_model, llm_max_tokens)
                     logger.info(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
 
+                    if enable_context_manager:
+                        messages = await self.context_manager.summarize_if_needed(
+                            thread_id, messages, llm_model, token_count, llm_max_tokens=llm_max_tokens
+                        )
+
                 except Exception as e:
                     logger.error(f"Error counting tokens or summarizing: {str(e)}")
 
@@ -442,12 +494,13 @@ When using the tools:
                 # 4. Prepare tools for LLM call
                 openapi_tool_schemas = None
                 if config.native_tool_calling:
-                    openapi_tool_schemas = self.tool_registry.get_openapi_schemas()
+                    # Copy the cached tuple so the request can't alter the registry's schemas list
+                    openapi_tool_schemas = list(self.tool_registry.get_openapi_schemas())
                     logger.debug(f"Retrieved {len(openapi_tool_schemas) if openapi_tool_schemas else 0} OpenAPI tool schemas")
 
                 # print(f"\n\n\n\n prepared_messages: {prepared_messages}\n\n\n\n")
 
-                prepared_messages = self.context_manager.compress_messages(prepared_messages, llm_model)
+                prepared_messages = self.context_manager.compress_messages(prepared_messages, llm_model, llm_max_tokens=llm_max_tokens)
 
                 # 5. Make LLM API call
                 logger.debug("Making LLM API call")
@@ -509,7 +562,7 @@ When using the tools:
                             llm_model=llm_model,
                         )
 
-                    return response_generator
+                    return self._end_turn_after(response_generator)
                 else:
                     logger.debug("Processing non-streaming response")
                     # Pass through the response generator without try/except to let errors propagate up
@@ -520,7 +573,7 @@ When using the tools:
                         prompt_messages=prepared_messages,
                         llm_model=llm_model,
                     )
-                    return response_generator # Return the generator
+                    return self._end_turn_after(response_generator) # Return the generator
 
             except Exception as e:
                 logger.error(f"Error in run_thread: {str(e)}", exc_info=True)
@@ -591,9 +644,8 @@ When using the tools:
                         if ("AnthropicException - Overloaded" in str(e)):
                             logger.error(f"AnthropicException - Overloaded detected - Falling back to OpenRouter: {str(e)}", exc_info=True)
                             nonlocal llm_model
-                            # Remove "-20250514" from the model name if present
-                            model_name_cleaned = llm_model.replace("-20250514", "")
-                            llm_model = f"openrouter/{model_name_cleaned}"
+                            # Same OpenRouter mapping as the call-level fallback and hedging
+                            llm_model = get_openrouter_fallback(llm_model) or f"openrouter/{llm_model.replace('-20250514', '')}"
                             auto_continue = True
                             continue # Continue the loop
                         else:
@@ -0,0 +1,88 @@
+"""
+Token count memoization for AgentPress.
+
+Tokenizing a long thread is the most expensive CPU step of context management and
+used to happen several times per LLM turn. This module caches the token count of
+each individual message, keyed by tokenizer family, message_id and a hash of the message
+content, so the total for a prompt becomes a sum of cached counts and only new or
+modified messages are tokenized.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from litellm.utils import token_counter
+from utils.logger import logger
+from utils.model_registry import get_model_capabilities
+
+DEFAULT_MAX_ENTRIES = 50000
+
+
+class TokenCountCache:
+    """Process-wide LRU cache of per-message token counts."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of per-message counts to keep
+        """
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_key(self, model: str, message: Dict[str, Any]) -> str:
+        # The hash covers the whole message, so in-place compression of the
+        # content naturally produces a new key.
+        serialized = json.dumps(message, sort_keys=True, default=str)
+        content_hash = hashlib.md5(serialized.encode()).hexdigest()
+        # Models sharing a tokenizer (e.g. a provider and its OpenRouter fallback) share counts
+        tokenizer = get_model_capabilities(model).tokenizer
+        return f"{tokenizer}:{message.get('message_id') or ''}:{content_hash}"
+
+    def count_message(self, model: str, message: Dict[str, Any]) -> int:
+        """Get the token count of a single message, tokenizing only on a miss."""
+        if not isinstance(message, dict):
+            return token_counter(model=model, messages=[message])
+
+        key = self._cache_key(model, message)
+        count = self._counts.get(key)
+        if count is not None:
+            self.hits += 1
+            self._counts.move_to_end(key)
+            return count
+
+        self.misses += 1
+        count = token_counter(model=model, messages=[message])
+        self._counts[key] = count
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return count
+
+    def count_messages(self, model: str, messages: List[Dict[str, Any]]) -> int:
+        """Get the token count of a message list as the sum of per-message counts.
+
+        The sum slightly over-estimates litellm's list count (per-request priming
+        tokens are counted once per message), which is the safe direction for
+        budget checks.
+        """
+        return sum(self.count_message(model, msg) for msg in messages)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._counts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+    def log_stats(self, prefix: Optional[str] = None):
+        stats = self.get_stats()
+        logger.debug(f"{prefix or 'Token count cache'}: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+
+token_cache = TokenCountCache()
@@ -7,7 +7,7 @@ This module defines the base classes and decorators for creating tools in AgentP
 - Result containers for standardized tool outputs
 """
 
-from typing import Dict, Any, Union, Optional, List
+from typing import Dict, Any, Union, Optional, List, Callable
 from dataclasses import dataclass, field
 from abc import ABC
 import json
@@ -31,6 +31,29 @@ class ToolSchema:
     schema_type: SchemaType
     schema: Dict[str, Any]
 
+@dataclass(frozen=True)
+class ToolLimits:
+    """Execution limits of a tool function, declared with @openapi_schema.
+    
+    Attributes:
+        timeout (Optional[float]): Seconds before the call is cancelled (None = scheduler default)
+        max_concurrency (Optional[int]): Concurrent calls of this function per worker (None = scheduler default)
+    """
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+
+@dataclass(frozen=True)
+class ToolCachePolicy:
+    """Result caching of an idempotent tool function, declared with @cacheable.
+    
+    Attributes:
+        ttl (int): Seconds a successful result is served from the cache
+        key (Optional[Callable]): Maps the call arguments to the value identifying
+            the result (None = all arguments)
+    """
+    ttl: int
+    key: Optional[Callable[[Dict[str, Any]], Any]] = None
+
 @dataclass
 class ToolResult:
     """Container for tool execution results.
@@ -38,9 +61,12 @@ class ToolResult:
     Attributes:
         success (bool): Whether the tool execution succeeded
         output (str): Output message or error description
+        metadata (Dict[str, Any]): Execution details stored with the tool result message
+            (e.g. cache_hit)
     """
     success: bool
     output: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
 
 class Tool(ABC):
     """Abstract base class for all tools.
@@ -50,6 +76,8 @@ class Tool(ABC):
     
     Attributes:
         _schemas (Dict[str, List[ToolSchema]]): Registered schemas for tool methods
+        concurrency_key (Optional[str]): Shared resource the tool's calls are limited on
+            (e.g. a sandbox), None if calls are only limited per function
         
     Methods:
         get_schemas: Get all registered tool schemas
@@ -57,6 +85,8 @@ class Tool(ABC):
         fail_response: Create a failed result
     """
     
+    concurrency_key: Optional[str] = None
+    
     def __init__(self):
         """Initialize tool with empty schema registry."""
         self._schemas: Dict[str, List[ToolSchema]] = {}
@@ -114,16 +144,40 @@ def _add_schema(func, schema: ToolSchema):
     logger.debug(f"Added {schema.schema_type.value} schema to function {func.__name__}")
     return func
 
-def openapi_schema(schema: Dict[str, Any]):
-    """Decorator for OpenAPI schema tools."""
+def openapi_schema(schema: Dict[str, Any], timeout: Optional[float] = None, max_concurrency: Optional[int] = None):
+    """Decorator for OpenAPI schema tools.
+    
+    Args:
+        schema: OpenAPI function schema
+        timeout: Optional execution timeout in seconds for this function
+        max_concurrency: Optional limit on concurrent calls of this function per worker
+    """
     def decorator(func):
         logger.debug(f"Applying OpenAPI schema to function {func.__name__}")
+        if timeout is not None or max_concurrency is not None:
+            func.tool_limits = ToolLimits(timeout=timeout, max_concurrency=max_concurrency)
         return _add_schema(func, ToolSchema(
             schema_type=SchemaType.OPENAPI,
             schema=schema
         ))
     return decorator
 
+def cacheable(ttl: int, key: Optional[Callable[[Dict[str, Any]], Any]] = None):
+    """Decorator marking a tool function as idempotent so its results can be cached.
+    
+    Only successful results are cached, separately for every account.
+    
+    Args:
+        ttl: Seconds a result is served from the cache
+        key: Optional function mapping the call arguments to the cache key value,
+            e.g. to normalize a search query
+    """
+    def decorator(func):
+        logger.debug(f"Marking function {func.__name__} as cacheable (ttl: {ttl}s)")
+        func.tool_cache_policy = ToolCachePolicy(ttl=ttl, key=key)
+        return func
+    return decorator
+
 def usage_example(example: str):
     """Decorator for providing usage examples for tools in prompts."""
     def decorator(func):
@@ -0,0 +1,137 @@
+"""
+Result cache for idempotent tools in AgentPress.
+
+Agents repeat identical web searches, scrapes, data-provider and read-only MCP
+calls within a run and across runs of the same account. Tool functions marked
+with @cacheable(ttl, key) have their successful results cached:
+
+- In-process LRU, evicted by entry count, total size and TTL
+- Redis, so runs on other workers reuse the result until the TTL expires
+- Keys are scoped to the account, results are never shared between accounts
+- Results served from the cache carry `cache_hit` in ToolResult.metadata
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from agentpress.tool import ToolCachePolicy, ToolResult
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+KEY_PREFIX = "tool_cache:"
+
+
+class ToolResultCache:
+    """Two-tier cache of successful results of cacheable tool functions."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_result_bytes: Optional[int] = None
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of results kept in-process
+            max_bytes: Maximum total size of the results kept in-process
+            max_result_bytes: Results larger than this are not cached
+        """
+        self.enabled = config.TOOL_RESULT_CACHE_ENABLED
+        self.max_entries = max_entries or config.TOOL_RESULT_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.TOOL_RESULT_CACHE_MAX_BYTES
+        self.max_result_bytes = max_result_bytes or config.TOOL_RESULT_CACHE_MAX_RESULT_BYTES
+        # cache key -> (expires_at, serialized output, size)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0, "too_large": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(account_id: str, function_name: str, policy: ToolCachePolicy, arguments: Dict[str, Any]) -> str:
+        """Build the cache key of a call, scoped to the account."""
+        key_value = policy.key(arguments) if policy.key else arguments
+        serialized = json.dumps(key_value, sort_keys=True, default=str)
+        return f"{account_id}:{function_name}:{hashlib.sha256(serialized.encode()).hexdigest()}"
+
+    def _remove(self, cache_key: str):
+        _, _, size = self._entries.pop(cache_key)
+        self._bytes -= size
+
+    def _store(self, cache_key: str, expires_at: float, output_json: str):
+        if cache_key in self._entries:
+            self._remove(cache_key)
+        size = len(output_json)
+        self._entries[cache_key] = (expires_at, output_json, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    @staticmethod
+    def _to_result(output_json: str) -> ToolResult:
+        return ToolResult(success=True, output=json.loads(output_json), metadata={"cache_hit": True})
+
+    async def get(self, account_id: str, function_name: str, policy: ToolCachePolicy, arguments: Dict[str, Any]) -> Optional[ToolResult]:
+        """Return the cached result of a call, or None on a miss."""
+        cache_key = self.make_key(account_id, function_name, policy, arguments)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(cache_key)
+                self.stats["local_hits"] += 1
+                return self._to_result(entry[1])
+            self._remove(cache_key)
+            self.stats["expired"] += 1
+
+        try:
+            value = await redis.get(f"{KEY_PREFIX}{cache_key}")
+        except Exception as e:
+            logger.warning(f"Failed to read tool cache entry for {function_name}: {e}")
+            value = None
+
+        if value is not None:
+            try:
+                stored = json.loads(value)
+                # Keep the expiry of the first store instead of restarting the TTL
+                if stored["expires_at"] > time.time():
+                    self.stats["redis_hits"] += 1
+                    self._store(cache_key, stored["expires_at"], stored["output"])
+                    return self._to_result(stored["output"])
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring malformed tool cache entry for {function_name}: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, account_id: str, function_name: str, policy: ToolCachePolicy, arguments: Dict[str, Any], result: ToolResult):
+        """Cache a successful result of a call."""
+        if not result.success:
+            return
+        output_json = json.dumps(result.output, default=str)
+        if len(output_json) > self.max_result_bytes:
+            self.stats["too_large"] += 1
+            logger.debug(f"Not caching {len(output_json)} byte result of {function_name}")
+            return
+
+        cache_key = self.make_key(account_id, function_name, policy, arguments)
+        expires_at = time.time() + policy.ttl
+        self._store(cache_key, expires_at, output_json)
+        self.stats["stores"] += 1
+        try:
+            await redis.set(
+                f"{KEY_PREFIX}{cache_key}",
+                json.dumps({"expires_at": expires_at, "output": output_json}),
+                ex=policy.ttl
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write tool cache entry for {function_name}: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+
+tool_result_cache = ToolResultCache()
@@ -1,7 +1,10 @@
-from typing import Dict, Type, Any, List, Optional, Callable
-from agentpress.tool import Tool, SchemaType
+from types import MappingProxyType
+from typing import Dict, Type, Any, List, Mapping, Optional, Callable, Pattern, Tuple
+from agentpress.tool import Tool, SchemaType, ToolCachePolicy, ToolLimits, ToolSchema
 from utils.logger import logger
+import hashlib
 import json
+import re
 
 
 class ToolRegistry:
@@ -15,13 +18,21 @@ class ToolRegistry:
         
     Methods:
         register_tool: Register a tool with optional function filtering
+        register_tool_schemas: Register already created schemas (MCP tools)
         get_tool: Get a specific tool by name
         get_openapi_schemas: Get OpenAPI schemas for function calling
+
+    Lookups used on every tool call (dispatch table, schemas, usage examples,
+    legacy tag matcher) are served from a frozen index that is rebuilt only
+    after a registration.
     """
     
     def __init__(self):
         """Initialize a new ToolRegistry instance."""
         self.tools = {}
+        self._fingerprint = None  # (function names, fingerprint)
+        self._index = None
+        self._indexed_count = 0
         logger.debug("Initialized new ToolRegistry instance")
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -55,25 +66,116 @@ class ToolRegistry:
                         registered_openapi += 1
                         logger.debug(f"Registered OpenAPI function {func_name} from {tool_class.__name__}")
         
+        self._index = None
         logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions")
 
-    def get_available_functions(self) -> Dict[str, Callable]:
+    def register_tool_schemas(self, tool_instance: Tool, schemas: Dict[str, List[ToolSchema]]) -> int:
+        """Register functions of an already initialized tool instance.
+
+        Used for MCP wrappers, whose functions are only known after connecting.
+
+        Args:
+            tool_instance: Instance implementing the functions
+            schemas: Function name -> schemas, as returned by get_schemas()
+
+        Returns:
+            Number of registered functions
+        """
+        for method_name, schema_list in schemas.items():
+            for schema in schema_list:
+                self.tools[method_name] = {
+                    "instance": tool_instance,
+                    "schema": schema
+                }
+        self._index = None
+        return len(schemas)
+
+    def _get_index(self) -> Dict[str, Any]:
+        """Get the lookup index, rebuilding it if the registrations changed."""
+        # The length check also catches entries written to `tools` directly
+        if self._index is not None and self._indexed_count == len(self.tools):
+            return self._index
+
+        functions = {}
+        examples = {}
+        limits = {}
+        cache_policies = {}
+        for tool_name, tool_info in sorted(self.tools.items()):
+            tool_instance = tool_info['instance']
+            try:
+                # MCP wrappers resolve their functions through __getattr__; do it once here
+                functions[tool_name] = getattr(tool_instance, tool_name)
+            except AttributeError:
+                logger.warning(f"Registered tool {tool_name} has no implementation on {type(tool_instance).__name__}")
+            else:
+                limits[tool_name] = (getattr(functions[tool_name], 'tool_limits', None), tool_instance.concurrency_key)
+                cache_policy = getattr(functions[tool_name], 'tool_cache_policy', None)
+                if cache_policy is not None:
+                    cache_policies[tool_name] = cache_policy
+
+            for schema in tool_instance.get_schemas().get(tool_name, []):
+                if schema.schema_type == SchemaType.USAGE_EXAMPLE:
+                    examples[tool_name] = schema.schema.get('example', '')
+                    break
+
+        schemas = tuple(
+            tool_info['schema'].schema
+            for _, tool_info in sorted(self.tools.items())
+            if tool_info['schema'].schema_type == SchemaType.OPENAPI
+        )
+
+        # One alternation over all legacy tag names, longest first so that a tag
+        # that is a prefix of another does not shadow it
+        tag_names = sorted({name.replace('_', '-') for name in functions}, key=len, reverse=True)
+        tag_pattern = re.compile('<(' + '|'.join(map(re.escape, tag_names)) + ')') if tag_names else None
+
+        self._index = {
+            "functions": MappingProxyType(functions),
+            "schemas": schemas,
+            "examples": MappingProxyType(examples),
+            "limits": MappingProxyType(limits),
+            "cache_policies": MappingProxyType(cache_policies),
+            "tag_pattern": tag_pattern,
+        }
+        self._indexed_count = len(self.tools)
+        logger.debug(f"Built tool index: {len(functions)} functions, {len(schemas)} OpenAPI schemas")
+        return self._index
+
+    def get_available_functions(self) -> Mapping[str, Callable]:
         """Get all available tool functions.
         
         Returns:
-            Dict mapping function names to their implementations
+            Read-only mapping of function names to their implementations
         """
-        available_functions = {}
-        
-        # Get OpenAPI tool functions
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            function_name = tool_name
-            function = getattr(tool_instance, function_name)
-            available_functions[function_name] = function
-            
-        logger.debug(f"Retrieved {len(available_functions)} available functions")
-        return available_functions
+        return self._get_index()["functions"]
+
+    def get_execution_limits(self, function_name: str) -> Tuple[Optional[ToolLimits], Optional[str]]:
+        """Get the declared limits and the concurrency key of a function.
+
+        Returns:
+            (ToolLimits declared with @openapi_schema or None, Tool.concurrency_key)
+        """
+        return self._get_index()["limits"].get(function_name, (None, None))
+
+    def get_cache_policy(self, function_name: str) -> Optional[ToolCachePolicy]:
+        """Get the result cache policy declared with @cacheable, if any."""
+        return self._get_index()["cache_policies"].get(function_name)
+
+    def find_tool_tag(self, content: str, pos: int = 0) -> Optional[Tuple[int, str]]:
+        """Find the earliest legacy tool tag (`<function-name`) in content.
+
+        Args:
+            content: Text to search
+            pos: Position to start searching from
+
+        Returns:
+            (start position, tag name) or None if no tool tag occurs
+        """
+        tag_pattern: Optional[Pattern] = self._get_index()["tag_pattern"]
+        if tag_pattern is None:
+            return None
+        match = tag_pattern.search(content, pos)
+        return (match.start(), match.group(1)) if match else None
 
     def get_tool(self, tool_name: str) -> Dict[str, Any]:
         """Get a specific tool by name.
@@ -89,41 +191,45 @@ class ToolRegistry:
             logger.warning(f"Tool not found: {tool_name}")
         return tool
 
-    def get_openapi_schemas(self) -> List[Dict[str, Any]]:
+    def get_openapi_schemas(self) -> Tuple[Dict[str, Any], ...]:
         """Get OpenAPI schemas for function calling.
         
+        Schemas are ordered by function name so the tool block is identical
+        across runs regardless of registration order (keeps prompt caching effective).
+        The tuple is cached until the next registration; do not modify the schemas.
+
         Returns:
-            List of OpenAPI-compatible schema definitions
+            Tuple of OpenAPI-compatible schema definitions
         """
-        schemas = [
-            tool_info['schema'].schema 
-            for tool_info in self.tools.values()
-            if tool_info['schema'].schema_type == SchemaType.OPENAPI
+        return self._get_index()["schemas"]
+
+    def get_fingerprint(self) -> str:
+        """Get a stable fingerprint of the registered tool set.
+
+        Used as the cache key of the rendered tool block. It is recomputed only
+        when the set of registered function names changes (MCP tools are added
+        to `tools` directly, so this does not rely on register_tool).
+
+        Returns:
+            md5 hex digest over the tool classes and OpenAPI schemas
+        """
+        names = tuple(sorted(self.tools))
+        if self._fingerprint and self._fingerprint[0] == names:
+            return self._fingerprint[1]
+
+        entries = [
+            [name, type(self.tools[name]['instance']).__qualname__, self.tools[name]['schema'].schema]
+            for name in names
         ]
-        logger.debug(f"Retrieved {len(schemas)} OpenAPI schemas")
-        return schemas
+        fingerprint = hashlib.md5(json.dumps(entries, sort_keys=True, default=str).encode()).hexdigest()
+        self._fingerprint = (names, fingerprint)
+        return fingerprint
 
-    def get_usage_examples(self) -> Dict[str, str]:
+    def get_usage_examples(self) -> Mapping[str, str]:
         """Get usage examples for tools.
         
         Returns:
-            Dict mapping function names to their usage examples
+            Read-only mapping of function names to their usage examples
         """
-        examples = {}
-        
-        # Get all registered tools and their schemas
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            all_schemas = tool_instance.get_schemas()
-            
-            # Look for usage examples for this function
-            if tool_name in all_schemas:
-                for schema in all_schemas[tool_name]:
-                    if schema.schema_type == SchemaType.USAGE_EXAMPLE:
-                        examples[tool_name] = schema.schema.get('example', '')
-                        logger.debug(f"Found usage example for {tool_name}")
-                        break
-        
-        logger.debug(f"Retrieved {len(examples)} usage examples")
-        return examples
+        return self._get_index()["examples"]
 
@@ -0,0 +1,203 @@
+"""
+Bounded, timeout-aware tool execution for AgentPress.
+
+Tool calls used to be awaited directly (or fired all at once with asyncio.gather)
+without limits, so a run issuing many browser, shell or MCP calls could saturate
+its sandbox or an upstream provider, and a hung call blocked the run forever.
+Every tool call now goes through the worker-wide ToolScheduler:
+
+- Concurrency limits per function (ToolLimits.max_concurrency declared with
+  @openapi_schema, default TOOL_MAX_CONCURRENCY_PER_TOOL) and per shared
+  resource such as a sandbox (Tool.concurrency_key, TOOL_MAX_CONCURRENCY_PER_SANDBOX)
+- A timeout per function (ToolLimits.timeout, default TOOL_DEFAULT_TIMEOUT_SECONDS)
+- Cooperative cancellation: queued and running calls of a run are cancelled as
+  soon as the run's stop event is set (STOP signal)
+- Queue-wait and execution-time metrics per function
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from agentpress.tool import ToolLimits, ToolResult
+from utils.config import config
+from utils.logger import logger
+
+# Queue waits above this are logged, they indicate a saturated tool or sandbox
+SLOW_QUEUE_WAIT_SECONDS = 1.0
+
+
+class ToolExecutionStopped(Exception):
+    """Raised when a tool call is cancelled because its run was stopped."""
+
+
+class _KeyedLimiter:
+    """Semaphores created on demand per key and dropped once idle."""
+
+    def __init__(self):
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._users: Dict[str, int] = {}
+
+    def get(self, key: str, limit: int) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[key] = semaphore
+        self._users[key] = self._users.get(key, 0) + 1
+        return semaphore
+
+    def done(self, key: str):
+        self._users[key] -= 1
+        if not self._users[key]:
+            del self._users[key]
+            del self._semaphores[key]
+
+    def in_use(self) -> Dict[str, int]:
+        return dict(self._users)
+
+
+async def _until_done_or_stopped(awaitable: Awaitable, stop_event: Optional[asyncio.Event], timeout: Optional[float] = None):
+    """Await `awaitable`, cancelling it on timeout or when `stop_event` is set.
+
+    Raises:
+        asyncio.TimeoutError: The timeout expired first
+        ToolExecutionStopped: The stop event was set first
+    """
+    task = asyncio.ensure_future(awaitable)
+    waiters = {task}
+    stop_waiter = None
+    if stop_event is not None:
+        stop_waiter = asyncio.ensure_future(stop_event.wait())
+        waiters.add(stop_waiter)
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if stop_waiter is not None:
+            stop_waiter.cancel()
+
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    try:
+        # A call that finished while being cancelled keeps its result (e.g. an acquired slot)
+        return await task
+    except BaseException:
+        pass
+    if stop_waiter is not None and stop_waiter in done:
+        raise ToolExecutionStopped()
+    raise asyncio.TimeoutError()
+
+
+class ToolScheduler:
+    """Worker-wide scheduler enforcing tool concurrency limits and timeouts."""
+
+    def __init__(self):
+        self._per_function = _KeyedLimiter()
+        self._per_resource = _KeyedLimiter()
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def _function_stats(self, function_name: str) -> Dict[str, Any]:
+        stats = self.stats.get(function_name)
+        if stats is None:
+            stats = {
+                "calls": 0, "completed": 0, "timeouts": 0, "cancelled": 0, "errors": 0,
+                "queue_wait_ms": 0.0, "max_queue_wait_ms": 0.0,
+                "execution_ms": 0.0, "max_execution_ms": 0.0,
+            }
+            self.stats[function_name] = stats
+        return stats
+
+    async def run(
+        self,
+        function_name: str,
+        tool_fn: Callable[..., Awaitable[ToolResult]],
+        arguments: Dict[str, Any],
+        limits: Optional[ToolLimits] = None,
+        concurrency_key: Optional[str] = None,
+        stop_event: Optional[asyncio.Event] = None
+    ) -> ToolResult:
+        """Execute a tool call within its limits.
+
+        Args:
+            function_name: Registered function name (limit and metrics key)
+            tool_fn: The tool function
+            arguments: Keyword arguments for the call
+            limits: Limits declared for the function, if any
+            concurrency_key: Shared resource of the call (e.g. "sandbox:<project_id>")
+            stop_event: Set when the run is stopped
+
+        Returns:
+            The tool's result, or a failed ToolResult on timeout or cancellation.
+            Exceptions raised by the tool propagate to the caller.
+        """
+        limits = limits or ToolLimits()
+        timeout = limits.timeout or config.TOOL_DEFAULT_TIMEOUT_SECONDS
+        stats = self._function_stats(function_name)
+        stats["calls"] += 1
+
+        function_semaphore = self._per_function.get(function_name, limits.max_concurrency or config.TOOL_MAX_CONCURRENCY_PER_TOOL)
+        resource_semaphore = self._per_resource.get(concurrency_key, config.TOOL_MAX_CONCURRENCY_PER_SANDBOX) if concurrency_key else None
+        acquired = []
+        queued_at = time.monotonic()
+        try:
+            for semaphore in (function_semaphore, resource_semaphore):
+                if semaphore is None:
+                    continue
+                await _until_done_or_stopped(semaphore.acquire(), stop_event)
+                acquired.append(semaphore)
+
+            started_at = time.monotonic()
+            queue_wait = started_at - queued_at
+            stats["queue_wait_ms"] += queue_wait * 1000
+            stats["max_queue_wait_ms"] = max(stats["max_queue_wait_ms"], queue_wait * 1000)
+            if queue_wait > SLOW_QUEUE_WAIT_SECONDS:
+                logger.info(f"Tool {function_name} waited {queue_wait:.2f}s for a slot (resource: {concurrency_key})")
+
+            try:
+                result = await _until_done_or_stopped(tool_fn(**arguments), stop_event, timeout=timeout)
+                stats["completed"] += 1
+                return result
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                logger.warning(f"Tool {function_name} timed out after {timeout}s")
+                return ToolResult(success=False, output=f"Tool '{function_name}' timed out after {timeout} seconds")
+            except ToolExecutionStopped:
+                raise
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                execution_ms = (time.monotonic() - started_at) * 1000
+                stats["execution_ms"] += execution_ms
+                stats["max_execution_ms"] = max(stats["max_execution_ms"], execution_ms)
+        except ToolExecutionStopped:
+            stats["cancelled"] += 1
+            logger.info(f"Cancelled tool {function_name}: agent run was stopped")
+            return ToolResult(success=False, output=f"Tool '{function_name}' was cancelled because the agent run was stopped")
+        finally:
+            for semaphore in acquired:
+                semaphore.release()
+            self._per_function.done(function_name)
+            if concurrency_key:
+                self._per_resource.done(concurrency_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        per_function = {}
+        for function_name, stats in self.stats.items():
+            per_function[function_name] = dict(
+                stats,
+                avg_queue_wait_ms=round(stats["queue_wait_ms"] / stats["calls"], 2) if stats["calls"] else 0.0,
+                avg_execution_ms=round(stats["execution_ms"] / stats["calls"], 2) if stats["calls"] else 0.0,
+            )
+        return {
+            "functions": per_function,
+            "active_functions": self._per_function.in_use(),
+            "active_resources": self._per_resource.in_use(),
+        }
+
+
+tool_scheduler = ToolScheduler()
@@ -96,16 +96,43 @@ class XMLToolParser:
         full_block: str
     ) -> Optional[XMLToolCall]:
         """Parse a single invoke block into an XMLToolCall."""
+        # Extract all parameters
+        param_matches = self.PARAMETER_PATTERN.findall(invoke_content)
+        
+        # Extract the raw XML for this specific invoke
+        invoke_pattern = re.compile(
+            rf'<invoke\s+name=["\']{re.escape(function_name)}["\']>.*?</invoke>',
+            re.DOTALL | re.IGNORECASE
+        )
+        raw_xml_match = invoke_pattern.search(full_block)
+        raw_xml = raw_xml_match.group(0) if raw_xml_match else f"<invoke name=\"{function_name}\">...</invoke>"
+        
+        return self.build_tool_call(function_name, param_matches, raw_xml)
+    
+    def build_tool_call(
+        self,
+        function_name: str,
+        raw_parameters: List[Tuple[str, str]],
+        raw_xml: str
+    ) -> XMLToolCall:
+        """
+        Build an XMLToolCall from already tokenized parameters.
+        
+        Args:
+            function_name: Name from the invoke tag
+            raw_parameters: (name, raw value) pairs in document order
+            raw_xml: The complete invoke element
+            
+        Returns:
+            XMLToolCall with typed parameter values
+        """
         parameters = {}
         parsing_details = {
             "function_name": function_name,
             "raw_parameters": {}
         }
         
-        # Extract all parameters
-        param_matches = self.PARAMETER_PATTERN.findall(invoke_content)
-        
-        for param_name, param_value in param_matches:
+        for param_name, param_value in raw_parameters:
             # Clean up the parameter value
             param_value = param_value.strip()
             
@@ -115,14 +142,6 @@ class XMLToolParser:
             parameters[param_name] = parsed_value
             parsing_details["raw_parameters"][param_name] = param_value
         
-        # Extract the raw XML for this specific invoke
-        invoke_pattern = re.compile(
-            rf'<invoke\s+name=["\']{re.escape(function_name)}["\']>.*?</invoke>',
-            re.DOTALL | re.IGNORECASE
-        )
-        raw_xml_match = invoke_pattern.search(full_block)
-        raw_xml = raw_xml_match.group(0) if raw_xml_match else f"<invoke name=\"{function_name}\">...</invoke>"
-        
         return XMLToolCall(
             function_name=function_name,
             parameters=parameters,
@@ -221,6 +240,154 @@ class XMLToolParser:
         return True, None
 
 
+@dataclass
+class XMLToolCallBlock:
+    """A completed <function_calls> block emitted by StreamingXMLToolParser."""
+    raw_xml: str
+    tool_calls: List[XMLToolCall]
+
+
+class StreamingXMLToolParser:
+    """
+    Incremental tokenizer for <function_calls> blocks in streamed content.
+    
+    Re-extracting complete blocks from the whole accumulated response after every
+    delta is quadratic in the response length. This parser is a resumable state
+    machine (text -> function_calls -> invoke -> parameter) that only scans the
+    new delta plus the few characters of a tag that may have been split across
+    deltas, and emits each block once its closing tag arrives. Tag boundaries
+    follow the same first-closing-tag rules as XMLToolParser.parse_content.
+    """
+    
+    TEXT, BLOCK, INVOKE, PARAMETER = range(4)
+    
+    # Longest opening tag we wait for across deltas before treating a '<' as text
+    MAX_TAG_LENGTH = 256
+    
+    _NAME = r'\s+name=["\']([^"\']+)["\']>'
+    PATTERNS = {
+        TEXT: re.compile(r'(?P<block_open><function_calls>)'),
+        BLOCK: re.compile(rf'(?P<invoke_open>(?i:<invoke{_NAME}))|(?P<block_close></function_calls>)'),
+        INVOKE: re.compile(
+            rf'(?P<parameter_open>(?i:<parameter{_NAME}))|(?P<invoke_close>(?i:</invoke>))|(?P<block_close></function_calls>)'
+        ),
+        PARAMETER: re.compile(
+            r'(?P<parameter_close>(?i:</parameter>))|(?P<invoke_close>(?i:</invoke>))|(?P<block_close></function_calls>)'
+        ),
+    }
+    
+    def __init__(self, parser: Optional[XMLToolParser] = None):
+        """
+        Initialize the streaming parser.
+        
+        Args:
+            parser: Parser used to type parameter values
+        """
+        self.parser = parser or XMLToolParser()
+        self.state = self.TEXT
+        self._pending = ""          # Unscanned tail of the stream
+        self._offset = 0            # Stream position of the start of _pending
+        self._block_start = 0
+        self._block_parts: List[str] = []
+        self._tool_calls: List[XMLToolCall] = []
+        self._invoke: Optional[Dict[str, Any]] = None
+        self._parameter: Optional[Tuple[str, int]] = None
+    
+    def _consume(self, length: int):
+        """Move the first `length` pending characters into the current block (or drop them)."""
+        if length <= 0:
+            return
+        if self.state != self.TEXT:
+            self._block_parts.append(self._pending[:length])
+        self._pending = self._pending[length:]
+        self._offset += length
+    
+    def _block_text(self) -> str:
+        block = "".join(self._block_parts)
+        self._block_parts = [block]
+        return block
+    
+    def _close_invoke(self, end: int):
+        block = self._block_text()
+        start = self._invoke["start"] - self._block_start
+        raw_parameters = [
+            (name, block[value_start - self._block_start:value_end - self._block_start])
+            for name, value_start, value_end in self._invoke["parameters"]
+        ]
+        try:
+            self._tool_calls.append(self.parser.build_tool_call(
+                self._invoke["name"], raw_parameters, block[start:end - self._block_start]
+            ))
+        except Exception as e:
+            logger.error(f"Error parsing invoke block for {self._invoke['name']}: {e}")
+        self._invoke = None
+        self._parameter = None
+    
+    def _close_block(self) -> XMLToolCallBlock:
+        block = XMLToolCallBlock(raw_xml=self._block_text(), tool_calls=self._tool_calls)
+        self._block_parts = []
+        self._tool_calls = []
+        self._invoke = None
+        self._parameter = None
+        return block
+    
+    def feed(self, delta: str) -> List[XMLToolCallBlock]:
+        """
+        Consume the next piece of streamed content.
+        
+        Args:
+            delta: Newly streamed text
+            
+        Returns:
+            Blocks completed by this delta, in order
+        """
+        completed = []
+        self._pending += delta
+        while True:
+            match = self.PATTERNS[self.state].search(self._pending)
+            if not match:
+                # Keep a possibly split tag for the next delta, hand the rest to the block
+                resume = self._pending.rfind("<", max(0, len(self._pending) - self.MAX_TAG_LENGTH))
+                self._consume(len(self._pending) if resume == -1 else resume)
+                break
+            
+            kind = match.lastgroup
+            start = self._offset + match.start()
+            end = self._offset + match.end()
+            self._consume(match.start())
+            if kind == "block_open":
+                self.state = self.BLOCK
+                self._block_start = start
+                self._consume(match.end() - match.start())
+                continue
+            
+            self._consume(match.end() - match.start())
+            if kind == "invoke_open":
+                self._invoke = {"name": match.group(2), "start": start, "parameters": []}
+                self.state = self.INVOKE
+            elif kind == "parameter_open":
+                self._parameter = (match.group(2), end)
+                self.state = self.PARAMETER
+            elif kind == "parameter_close":
+                name, value_start = self._parameter
+                self._invoke["parameters"].append((name, value_start, start))
+                self._parameter = None
+                self.state = self.INVOKE
+            elif kind == "invoke_close":
+                # An unterminated parameter ends with its invoke, as with the regex parser
+                self._close_invoke(end)
+                self.state = self.BLOCK
+            elif kind == "block_close":
+                completed.append(self._close_block())
+                self.state = self.TEXT
+        return completed
+    
+    @property
+    def in_block(self) -> bool:
+        """Whether the stream is currently inside an unfinished <function_calls> block."""
+        return self.state != self.TEXT
+
+
 # Convenience function for quick parsing
 def parse_xml_tool_calls(content: str) -> List[XMLToolCall]:
     """
@@ -22,6 +22,7 @@ import uuid
 from agent import api as agent_api
 
 from sandbox import api as sandbox_api
+from sandbox.pool import sandbox_pool
 from services import billing as billing_api
 from flags import api as feature_flags_api
 from services import transcription as transcription_api
@@ -66,6 +67,9 @@ async def lifespan(app: FastAPI):
             logger.error(f"Failed to initialize Redis connection: {e}")
             # Continue without Redis - the application will handle Redis failures gracefully
         
+        # Keep pre-created sandboxes ready for new projects
+        sandbox_pool.start()
+        
         # Start background tasks
         # asyncio.create_task(agent_api.restore_running_agent_runs())
         
@@ -80,6 +84,7 @@ async def lifespan(app: FastAPI):
         # Clean up agent resources
         logger.info("Cleaning up agent resources")
         await agent_api.cleanup()
+        await sandbox_pool.stop()
         
         # Clean up Redis connection
         try:
@@ -15,9 +15,16 @@ import uuid
 from agentpress.thread_manager import ThreadManager
 from services.supabase import DBConnection
 from services import redis
+from dramatiq.asyncio import get_event_loop_thread
 from dramatiq.brokers.redis import RedisBroker
 import os
-from services.langfuse import langfuse
+from services.tracing import tracer
+from services.llm_http import llm_client_pool
+from agentpress.tool_scheduler import tool_scheduler
+from agent.tools.utils.browser_channel import browser_channels
+from services.run_control import run_control_plane
+from services.response_publisher import create_response_publisher, publish_control_signal, response_list_key, response_stream_key
+from services.transcript_archive import transcript_archiver
 from utils.retry import retry
 
 import sentry_sdk
@@ -25,7 +32,19 @@ from typing import Dict, Any
 
 redis_host = os.getenv('REDIS_HOST', 'redis')
 redis_port = int(os.getenv('REDIS_PORT', 6379))
-redis_broker = RedisBroker(host=redis_host, port=redis_port, middleware=[dramatiq.middleware.AsyncIO()])
+
+
+class WorkerShutdown(dramatiq.middleware.Middleware):
+    """Releases this worker's long-lived clients while its event loop is still running."""
+
+    def before_worker_shutdown(self, broker, worker):
+        try:
+            get_event_loop_thread().run_coroutine(asyncio.wait_for(shutdown(), timeout=10.0))
+        except Exception as e:
+            logger.warning(f"Error shutting down worker resources: {e}")
+
+
+redis_broker = RedisBroker(host=redis_host, port=redis_port, middleware=[dramatiq.middleware.AsyncIO(), WorkerShutdown()])
 
 dramatiq.set_broker(redis_broker)
 
@@ -42,10 +61,17 @@ async def initialize():
         instance_id = str(uuid.uuid4())[:8]
     await retry(lambda: redis.initialize_async())
     await db.initialize()
+    await llm_client_pool.warm_up()
 
     _initialized = True
     logger.info(f"Initialized agent API with instance ID: {instance_id}")
 
+async def shutdown():
+    """Log connection stats and close the pooled clients of this worker."""
+    logger.info(f"LLM connection pool at worker shutdown: {llm_client_pool.get_stats()}")
+    logger.info(f"Browser channels at worker shutdown: {browser_channels.get_stats()}")
+    await asyncio.gather(llm_client_pool.close(), browser_channels.close(), return_exceptions=True)
+
 @dramatiq.actor
 async def check_health(key: str):
     """Run the agent in the background using Redis for state."""
@@ -121,55 +147,24 @@ async def run_agent_background(
     client = await db.client
     start_time = datetime.now(timezone.utc)
     total_responses = 0
-    pubsub = None
-    stop_checker = None
-    stop_signal_received = False
+    control = None
+    publisher = create_response_publisher(agent_run_id)
 
     # Define Redis keys and channels
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
-    instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
     instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
-    async def check_for_stop_signal():
-        nonlocal stop_signal_received
-        if not pubsub: return
-        try:
-            while not stop_signal_received:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
-                if message and message.get("type") == "message":
-                    data = message.get("data")
-                    if isinstance(data, bytes): data = data.decode('utf-8')
-                    if data == "STOP":
-                        logger.info(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
-                        stop_signal_received = True
-                        break
-                # Periodically refresh the active run key TTL
-                if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
-                await asyncio.sleep(0.1) # Short sleep to prevent tight loop
-        except asyncio.CancelledError:
-            logger.info(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
-        except Exception as e:
-            logger.error(f"Error in stop signal checker for {agent_run_id}: {e}", exc_info=True)
-            stop_signal_received = True # Stop the run if the checker fails
-
-    trace = langfuse.trace(name="agent_run", id=agent_run_id, session_id=thread_id, metadata={"project_id": project_id, "instance_id": instance_id})
+    trace = tracer.trace(name="agent_run", id=agent_run_id, session_id=thread_id, metadata={"project_id": project_id, "instance_id": instance_id})
     try:
-        # Setup Pub/Sub listener for control signals
-        pubsub = await redis.create_pubsub()
+        # Receive control signals through the worker's shared subscription; its
+        # stop_event lets running tools be cancelled cooperatively as soon as STOP arrives
         try:
-            await retry(lambda: pubsub.subscribe(instance_control_channel, global_control_channel))
+            control = await retry(lambda: run_control_plane.register(agent_run_id, instance_id))
         except Exception as e:
             logger.error(f"Redis failed to subscribe to control channels: {e}", exc_info=True)
             raise e
 
-        logger.debug(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
-        stop_checker = asyncio.create_task(check_for_stop_signal())
-
-        # Ensure active run key exists and has TTL
+        # Ensure active run key exists and has TTL (refreshed by the control plane)
         await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
 
 
@@ -182,25 +177,25 @@ async def run_agent_background(
             agent_config=agent_config,
             trace=trace,
             is_agent_builder=is_agent_builder,
-            target_agent_id=target_agent_id
+            target_agent_id=target_agent_id,
+            stop_event=control.stop_event
         )
 
         final_status = "running"
         error_message = None
 
-        pending_redis_operations = []
+        publisher.start()
 
         async for response in agent_gen:
-            if stop_signal_received:
+            if control.stop_event.is_set():
+                run_control_plane.acknowledge_stop(control)
                 logger.info(f"Agent run {agent_run_id} stopped by signal.")
                 final_status = "stopped"
                 trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
                 break
 
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-            pending_redis_operations.append(asyncio.create_task(redis.publish(response_channel, "new")))
+            # Store response in Redis list and publish notification (batched)
+            await publisher.publish(json.dumps(response))
             total_responses += 1
 
             # Check for agent-signaled completion or error
@@ -220,12 +215,10 @@ async def run_agent_background(
              logger.info(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
              trace.span(name="agent_run_completed").end(status_message="agent_run_completed")
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
+             await publisher.publish(json.dumps(completion_message))
 
-        # Fetch final responses from Redis for DB update
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
+        # Make sure every response is in Redis before viewers are told the stream ended
+        await publisher.flush()
 
         # Update DB status
         await update_agent_run_status(client, agent_run_id, final_status, error=error_message)
@@ -233,7 +226,7 @@ async def run_agent_background(
         # Publish final control signal (END_STREAM or ERROR)
         control_signal = "END_STREAM" if final_status == "completed" else "ERROR" if final_status == "failed" else "STOP"
         try:
-            await redis.publish(global_control_channel, control_signal)
+            await publish_control_signal(agent_run_id, control_signal)
             # No need to publish to instance channel as the run is ending on this instance
             logger.debug(f"Published final control signal '{control_signal}' to {global_control_channel}")
         except Exception as e:
@@ -250,63 +243,52 @@ async def run_agent_background(
         # Push error message to Redis list
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(error_response))
-            await redis.publish(response_channel, "new")
+            await publisher.publish(json.dumps(error_response))
+            await publisher.flush()
         except Exception as redis_err:
              logger.error(f"Failed to push error response to Redis for {agent_run_id}: {redis_err}")
 
-        # Fetch final responses (including the error)
-        all_responses = []
-        try:
-             all_responses_json = await redis.lrange(response_list_key, 0, -1)
-             all_responses = [json.loads(r) for r in all_responses_json]
-        except Exception as fetch_err:
-             logger.error(f"Failed to fetch responses from Redis after error for {agent_run_id}: {fetch_err}")
-             all_responses = [error_response] # Use the error message we tried to push
-
         # Update DB status
         await update_agent_run_status(client, agent_run_id, "failed", error=f"{error_message}\n{traceback_str}")
 
         # Publish ERROR signal
         try:
-            await redis.publish(global_control_channel, "ERROR")
+            await publish_control_signal(agent_run_id, "ERROR")
             logger.debug(f"Published ERROR signal to {global_control_channel}")
         except Exception as e:
             logger.warning(f"Failed to publish ERROR signal: {str(e)}")
 
     finally:
-        # Cleanup stop checker task
-        if stop_checker and not stop_checker.done():
-            stop_checker.cancel()
-            try: await stop_checker
-            except asyncio.CancelledError: pass
-            except Exception as e: logger.warning(f"Error during stop_checker cancellation: {e}")
-
-        # Close pubsub connection
-        if pubsub:
-            try:
-                await pubsub.unsubscribe()
-                await pubsub.close()
-                logger.debug(f"Closed pubsub connection for {agent_run_id}")
-            except Exception as e:
-                logger.warning(f"Error closing pubsub for {agent_run_id}: {str(e)}")
+        # Stop receiving control signals for this run
+        if control:
+            await run_control_plane.unregister(control)
+
+        # Write out anything still buffered before the response list gets its TTL
+        try:
+            await asyncio.wait_for(publisher.close(), timeout=30.0)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout flushing buffered responses for {agent_run_id}")
+        except Exception as e:
+            logger.warning(f"Error closing response publisher for {agent_run_id}: {str(e)}")
+
+        # Worker-wide per-tool queue wait and execution time so far
+        logger.info(f"Tool scheduler after agent run {agent_run_id}: {tool_scheduler.get_stats()}")
+        logger.info(f"LLM connection pool after agent run {agent_run_id}: {llm_client_pool.get_stats()}")
+        logger.info(f"Browser channels after agent run {agent_run_id}: {browser_channels.get_stats()}")
 
         # Set TTL on the response list in Redis
         await _cleanup_redis_response_list(agent_run_id)
 
+        # Optionally move the transcript to storage and trim the Redis key right away
+        await transcript_archiver.archive(agent_run_id, expected_responses=publisher.stats["flushed"])
+
         # Remove the instance-specific active run key
         await _cleanup_redis_instance_key(agent_run_id)
 
         # Clean up the run lock
         await _cleanup_redis_run_lock(agent_run_id)
 
-        # Wait for all pending redis operations to complete, with timeout
-        try:
-            await asyncio.wait_for(asyncio.gather(*pending_redis_operations), timeout=30.0)
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
-
-        logger.info(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
+        logger.info(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status} ({total_responses} responses)")
 
 async def _cleanup_redis_instance_key(agent_run_id: str):
     """Clean up the instance-specific Redis key for an agent run."""
@@ -335,13 +317,13 @@ async def _cleanup_redis_run_lock(agent_run_id: str):
 REDIS_RESPONSE_LIST_TTL = 3600 * 24
 
 async def _cleanup_redis_response_list(agent_run_id: str):
-    """Set TTL on the Redis response list."""
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    try:
-        await redis.expire(response_list_key, REDIS_RESPONSE_LIST_TTL)
-        logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response list: {response_list_key}")
-    except Exception as e:
-        logger.warning(f"Failed to set TTL on response list {response_list_key}: {str(e)}")
+    """Set TTL on the Redis response list (or stream)."""
+    for key in (response_list_key(agent_run_id), response_stream_key(agent_run_id)):
+        try:
+            await redis.expire(key, REDIS_RESPONSE_LIST_TTL)
+            logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response key: {key}")
+        except Exception as e:
+            logger.warning(f"Failed to set TTL on response key {key}: {str(e)}")
 
 async def update_agent_run_status(
     client,
@@ -370,14 +352,9 @@ async def update_agent_run_status(
                 update_result = await client.table('agent_runs').update(update_data).eq("id", agent_run_id).execute()
 
                 if hasattr(update_result, 'data') and update_result.data:
-                    logger.info(f"Successfully updated agent run {agent_run_id} status to '{status}' (retry {retry})")
-
-                    # Verify the update
-                    verify_result = await client.table('agent_runs').select('status', 'completed_at').eq("id", agent_run_id).execute()
-                    if verify_result.data:
-                        actual_status = verify_result.data[0].get('status')
-                        completed_at = verify_result.data[0].get('completed_at')
-                        logger.info(f"Verified agent run update: status={actual_status}, completed_at={completed_at}")
+                    # The update returns the updated row, no need to select it again
+                    updated = update_result.data[0]
+                    logger.info(f"Successfully updated agent run {agent_run_id} status to '{updated.get('status')}' at {updated.get('completed_at')} (retry {retry})")
                     return True
                 else:
                     logger.warning(f"Database update returned no data for agent run {agent_run_id} on retry {retry}: {update_result}")
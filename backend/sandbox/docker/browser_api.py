@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Body, Request, Response
+from fastapi.routing import APIRoute
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
@@ -15,6 +16,8 @@ import traceback
 import pytesseract
 from PIL import Image
 import io
+import struct
+import time
 
 #######################################################
 # Action model definitions
@@ -274,13 +277,41 @@ class BrowserActionResult(BaseModel):
     class Config:
         arbitrary_types_allowed = True
 
+# Result format for clients that accept it: 4-byte big-endian length of the JSON
+# result, the JSON result without screenshot_base64, then the raw JPEG screenshot
+FRAMED_RESULT_MEDIA_TYPE = "application/x-browser-action-result"
+
+class BrowserActionRoute(APIRoute):
+    """Reports the action's duration and sends screenshots as raw bytes when the client accepts it"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            start = time.monotonic()
+            response = await handler(request)
+            duration_ms = (time.monotonic() - start) * 1000
+            if FRAMED_RESULT_MEDIA_TYPE in request.headers.get("accept", "") and response.media_type == "application/json":
+                result = json.loads(response.body)
+                screenshot = base64.b64decode(result.pop("screenshot_base64", None) or "")
+                header = json.dumps(result).encode("utf-8")
+                response = Response(
+                    content=struct.pack(">I", len(header)) + header + screenshot,
+                    status_code=response.status_code,
+                    media_type=FRAMED_RESULT_MEDIA_TYPE,
+                )
+            response.headers["Server-Timing"] = f"action;dur={duration_ms:.1f}"
+            return response
+
+        return timed_handler
+
 #######################################################
 # Browser Automation Implementation 
 #######################################################
 
 class BrowserAutomation:
     def __init__(self):
-        self.router = APIRouter()
+        self.router = APIRouter(route_class=BrowserActionRoute)
         self.browser: Browser = None
         self.browser_context: BrowserContext = None
         self.pages: List[Page] = []
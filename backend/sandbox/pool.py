@@ -0,0 +1,286 @@
+"""
+Pool of pre-created sandboxes for new projects.
+
+Creating a project used to create its sandbox on the request path, and the
+sandbox creation plus supervisord start-up dominated the time to the first
+token of a new thread. With SANDBOX_POOL_ENABLED:
+
+- The API processes keep SANDBOX_POOL_SIZE started sandboxes per provider and
+  snapshot in a Redis list; one process at a time refills it, in the
+  background (Redis lock)
+- A new project claims the oldest ready sandbox with LPOP, so no two projects
+  get the same one, checks that it is still started and relabels it with the
+  project id. An empty pool falls back to creating a sandbox as before
+- Sandboxes idle for longer than SANDBOX_POOL_MAX_IDLE_SECONDS are deleted and
+  replaced; keep it below the provider's auto-stop interval (15 minutes on
+  Daytona) so claimed sandboxes never need a start
+- Metrics: claims, cold creates, expired/unhealthy entries, claim and cold
+  create latency
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sandbox.providers import SandboxProvider, get_sandbox_provider
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+KEY_PREFIX = "sandbox_pool"
+# Ready entries tried per claim before creating a sandbox instead
+CLAIM_ATTEMPTS = 3
+REFILL_CONCURRENCY = 2
+REFILL_LOCK_SECONDS = 600
+POOL_LABELS = {"pool": "ready"}
+
+# Deletes the refill lock only if this process still holds it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SandboxPool:
+    """Ready sandboxes in Redis, claimed atomically and refilled in the background."""
+
+    def __init__(self, provider: Optional[SandboxProvider] = None):
+        self.enabled = config.SANDBOX_POOL_ENABLED
+        self.size = config.SANDBOX_POOL_SIZE
+        self.max_idle = config.SANDBOX_POOL_MAX_IDLE_SECONDS
+        self.refill_interval = config.SANDBOX_POOL_REFILL_INTERVAL_SECONDS
+        self.snapshot = config.SANDBOX_SNAPSHOT_NAME
+        self._provider = provider
+        self._refill_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running = False
+        self._deletions: Set[asyncio.Task] = set()
+        self.stats = {
+            "claimed": 0,
+            "cold_created": 0,
+            "empty": 0,
+            "expired": 0,
+            "unhealthy": 0,
+            "created": 0,
+            "create_errors": 0,
+            "recycled": 0,
+            "redis_errors": 0,
+            "claim_ms": 0.0,
+            "cold_create_ms": 0.0,
+        }
+
+    @property
+    def provider(self) -> SandboxProvider:
+        if self._provider is None:
+            self._provider = get_sandbox_provider()
+        return self._provider
+
+    @property
+    def ready_key(self) -> str:
+        return f"{KEY_PREFIX}:{self.provider.name}:{self.snapshot}:ready"
+
+    @property
+    def lock_key(self) -> str:
+        return f"{KEY_PREFIX}:{self.provider.name}:{self.snapshot}:refill_lock"
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.max_idle
+
+    def _discard(self, sandbox_id: str):
+        """Delete a sandbox that left the pool without being handed out."""
+        async def delete():
+            try:
+                await self.provider.delete(sandbox_id)
+            except Exception as e:
+                logger.warning(f"Failed to delete pooled sandbox {sandbox_id}: {e}")
+
+        task = asyncio.create_task(delete())
+        self._deletions.add(task)
+        task.add_done_callback(self._deletions.discard)
+
+    def _request_refill(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def claim(self, project_id: str) -> Optional[Tuple[Any, str]]:
+        """Take a ready sandbox from the pool for a project.
+
+        Returns:
+            The sandbox and its VNC password, or None if the pool had none
+        """
+        if not self.enabled:
+            return None
+        start = time.monotonic()
+        try:
+            for _ in range(CLAIM_ATTEMPTS):
+                try:
+                    redis_client = await redis.get_client()
+                    raw = await redis_client.lpop(self.ready_key)
+                except Exception as e:
+                    self.stats["redis_errors"] += 1
+                    logger.warning(f"Sandbox pool unavailable, creating a sandbox instead: {e}")
+                    return None
+                if raw is None:
+                    self.stats["empty"] += 1
+                    logger.info(f"Sandbox pool {self.ready_key} is empty")
+                    return None
+
+                entry = json.loads(raw)
+                if self._expired(entry):
+                    self.stats["expired"] += 1
+                    self._discard(entry["id"])
+                    continue
+                try:
+                    sandbox = await self.provider.get(entry["id"])
+                    if not await self.provider.is_healthy(sandbox):
+                        raise Exception("sandbox is not started")
+                    await self.provider.set_labels(sandbox, {"id": project_id})
+                except Exception as e:
+                    self.stats["unhealthy"] += 1
+                    logger.warning(f"Discarding pooled sandbox {entry['id']}: {e}")
+                    self._discard(entry["id"])
+                    continue
+
+                elapsed_ms = (time.monotonic() - start) * 1000
+                self.stats["claimed"] += 1
+                self.stats["claim_ms"] += elapsed_ms
+                logger.info(f"Claimed pooled sandbox {sandbox.id} for project {project_id} in {elapsed_ms:.0f}ms")
+                return sandbox, entry["password"]
+            return None
+        finally:
+            self._request_refill()
+
+    async def acquire(self, project_id: str) -> Tuple[Any, str]:
+        """A started sandbox for a new project, from the pool or freshly created.
+
+        Returns:
+            The sandbox and its VNC password
+        """
+        claimed = await self.claim(project_id)
+        if claimed is not None:
+            return claimed
+
+        start = time.monotonic()
+        password = str(uuid.uuid4())
+        sandbox = await self.provider.create(password, {"id": project_id})
+        elapsed_ms = (time.monotonic() - start) * 1000
+        self.stats["cold_created"] += 1
+        self.stats["cold_create_ms"] += elapsed_ms
+        logger.info(f"Created sandbox {sandbox.id} for project {project_id} in {elapsed_ms:.0f}ms")
+        return sandbox, password
+
+    async def _add(self, redis_client, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            password = str(uuid.uuid4())
+            try:
+                sandbox = await self.provider.create(password, POOL_LABELS)
+            except Exception as e:
+                self.stats["create_errors"] += 1
+                logger.warning(f"Failed to create a pooled sandbox: {e}")
+                return False
+            entry = {"id": sandbox.id, "password": password, "created_at": time.time()}
+            try:
+                await redis_client.rpush(self.ready_key, json.dumps(entry))
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Failed to add sandbox {sandbox.id} to the pool: {e}")
+                self._discard(sandbox.id)
+                return False
+            self.stats["created"] += 1
+            return True
+
+    async def _recycle_idle(self, redis_client):
+        for raw in await redis_client.lrange(self.ready_key, 0, -1):
+            entry = json.loads(raw)
+            # Only the process that removes the entry deletes the sandbox; a claim may have taken it
+            if self._expired(entry) and await redis_client.lrem(self.ready_key, 1, raw):
+                self.stats["recycled"] += 1
+                self._discard(entry["id"])
+
+    async def refill(self) -> int:
+        """Replace idle sandboxes and top the pool up to its size.
+
+        Does nothing while another process refills.
+
+        Returns:
+            Sandboxes added to the pool
+        """
+        redis_client = await redis.get_client()
+        token = uuid.uuid4().hex
+        if not await redis_client.set(self.lock_key, token, nx=True, ex=REFILL_LOCK_SECONDS):
+            return 0
+        try:
+            await self._recycle_idle(redis_client)
+            missing = self.size - await redis_client.llen(self.ready_key)
+            if missing <= 0:
+                return 0
+            semaphore = asyncio.Semaphore(REFILL_CONCURRENCY)
+            added = sum(await asyncio.gather(*(self._add(redis_client, semaphore) for _ in range(missing))))
+            logger.info(f"Added {added} sandboxes to {self.ready_key}")
+            return added
+        finally:
+            try:
+                await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, self.lock_key, token)
+            except Exception as e:
+                logger.warning(f"Failed to release sandbox pool refill lock: {e}")
+
+    async def _refill_loop(self):
+        # Checked as well as cancelled: wait_for can swallow a cancellation racing the wake-up
+        while self._running:
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Sandbox pool refill failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        """Start refilling the pool in the background (no-op when disabled)."""
+        if not self.enabled or (self._refill_task is not None and not self._refill_task.done()):
+            return
+        self._wake = asyncio.Event()
+        self._running = True
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        logger.info(f"Sandbox pool started: {self.size} x {self.snapshot} ({self.provider.name})")
+
+    async def stop(self):
+        """Stop refilling; ready sandboxes stay in the pool for the other processes."""
+        self._running = False
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        if self._deletions:
+            await asyncio.gather(*self._deletions, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        claimed = self.stats["claimed"]
+        cold = self.stats["cold_created"]
+        return dict(
+            self.stats,
+            size=self.size,
+            hit_rate=round(claimed / (claimed + cold), 3) if claimed + cold else 0.0,
+            avg_claim_ms=round(self.stats["claim_ms"] / claimed, 2) if claimed else 0.0,
+            avg_cold_create_ms=round(self.stats["cold_create_ms"] / cold, 2) if cold else 0.0,
+        )
+
+
+sandbox_pool = SandboxPool()
+
+
+async def acquire_sandbox(project_id: str) -> Tuple[Any, str]:
+    """A started sandbox and its VNC password for a new project."""
+    return await sandbox_pool.acquire(project_id)
@@ -0,0 +1,226 @@
+"""
+Sandbox providers used by the sandbox pool.
+
+The pool only needs to create, look up, label, health-check and delete
+sandboxes, so it talks to them through SandboxProvider:
+
+- DaytonaSandboxProvider wraps sandbox.sandbox (the production sandboxes)
+- LocalSandboxProvider runs each sandbox as a local process with its own
+  workspace directory, so the pool can be exercised without Daytona. Its
+  sandboxes only serve preview links; they have no fs/process API.
+
+SANDBOX_PROVIDER selects the provider ("daytona" or "local").
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from utils.config import config
+from utils.logger import logger
+
+LOCAL_START_TIMEOUT_SECONDS = 10.0
+
+
+class SandboxProvider(ABC):
+
+    name: str
+
+    @abstractmethod
+    async def create(self, password: str, labels: Dict[str, str]) -> Any:
+        """Create a started sandbox whose VNC password is `password`."""
+        pass
+
+    @abstractmethod
+    async def get(self, sandbox_id: str) -> Any:
+        pass
+
+    @abstractmethod
+    async def is_healthy(self, sandbox: Any) -> bool:
+        """Whether the sandbox can be handed out without starting it first."""
+        pass
+
+    @abstractmethod
+    async def set_labels(self, sandbox: Any, labels: Dict[str, str]) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, sandbox_id: str) -> None:
+        pass
+
+
+class DaytonaSandboxProvider(SandboxProvider):
+
+    name = "daytona"
+
+    async def create(self, password: str, labels: Dict[str, str]) -> Any:
+        from sandbox.sandbox import create_sandbox
+        return await create_sandbox(password, labels=labels)
+
+    async def get(self, sandbox_id: str) -> Any:
+        from sandbox.sandbox import daytona
+        return await daytona.get(sandbox_id)
+
+    async def is_healthy(self, sandbox: Any) -> bool:
+        from daytona_sdk import SandboxState
+        return sandbox.state == SandboxState.STARTED
+
+    async def set_labels(self, sandbox: Any, labels: Dict[str, str]) -> None:
+        await sandbox.set_labels(labels)
+
+    async def delete(self, sandbox_id: str) -> None:
+        from sandbox.sandbox import delete_sandbox
+        await delete_sandbox(sandbox_id)
+
+
+class LocalPreviewLink:
+    def __init__(self, url: str, token: Optional[str] = None):
+        self.url = url
+        self.token = token
+
+
+class LocalSandbox:
+    """A local stand-in sandbox: an HTTP server process serving its workspace."""
+
+    def __init__(self, metadata: Dict[str, Any], root: str):
+        self.id = metadata["id"]
+        self.labels = metadata.get("labels", {})
+        self.pid = metadata["pid"]
+        self.port = metadata["port"]
+        self.created_at = metadata["created_at"]
+        self.workspace_path = os.path.join(root, self.id, "workspace")
+
+    async def get_preview_link(self, port: int) -> LocalPreviewLink:
+        # All preview ports map to the one local server
+        return LocalPreviewLink(url=f"http://127.0.0.1:{self.port}")
+
+
+class LocalSandboxProvider(SandboxProvider):
+    """Process-based sandboxes; metadata lives on disk so every process on the host sees them."""
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or config.SANDBOX_LOCAL_ROOT or os.path.join(tempfile.gettempdir(), "suna-sandboxes")
+        os.makedirs(self.root, exist_ok=True)
+        # Processes started here, so they can be reaped when deleted
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+
+    def _metadata_path(self, sandbox_id: str) -> str:
+        return os.path.join(self.root, sandbox_id, "metadata.json")
+
+    def _write_metadata(self, metadata: Dict[str, Any]):
+        path = self._metadata_path(metadata["id"])
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(metadata, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _read_metadata(self, sandbox_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._metadata_path(sandbox_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"Local sandbox {sandbox_id} not found")
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    @staticmethod
+    async def _wait_until_serving(process: asyncio.subprocess.Process, port: int):
+        deadline = time.monotonic() + LOCAL_START_TIMEOUT_SECONDS
+        while True:
+            if process.returncode is not None:
+                raise RuntimeError(f"Local sandbox process exited with {process.returncode}")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Local sandbox did not listen on port {port} in time")
+                await asyncio.sleep(0.05)
+
+    async def create(self, password: str, labels: Dict[str, str]) -> LocalSandbox:
+        sandbox_id = f"local-{uuid.uuid4().hex[:12]}"
+        workspace = os.path.join(self.root, sandbox_id, "workspace")
+        os.makedirs(workspace)
+        port = self._free_port()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1", "--directory", workspace,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            env={**os.environ, "VNC_PASSWORD": password},
+            start_new_session=True,
+        )
+        self._processes[sandbox_id] = process
+        try:
+            await self._wait_until_serving(process, port)
+        except Exception:
+            await self.delete(sandbox_id)
+            raise
+        metadata = {"id": sandbox_id, "labels": dict(labels), "pid": process.pid, "port": port, "created_at": time.time()}
+        self._write_metadata(metadata)
+        logger.debug(f"Started local sandbox {sandbox_id} (pid {process.pid}, port {port})")
+        return LocalSandbox(metadata, self.root)
+
+    async def get(self, sandbox_id: str) -> LocalSandbox:
+        return LocalSandbox(self._read_metadata(sandbox_id), self.root)
+
+    async def is_healthy(self, sandbox: LocalSandbox) -> bool:
+        process = self._processes.get(sandbox.id)
+        if process is not None:
+            return process.returncode is None
+        try:
+            os.kill(sandbox.pid, 0)
+            return True
+        except OSError:
+            return False
+
+    async def set_labels(self, sandbox: LocalSandbox, labels: Dict[str, str]) -> None:
+        metadata = self._read_metadata(sandbox.id)
+        metadata["labels"] = dict(labels)
+        self._write_metadata(metadata)
+        sandbox.labels = dict(labels)
+
+    async def delete(self, sandbox_id: str) -> None:
+        try:
+            pid = self._read_metadata(sandbox_id)["pid"]
+        except ValueError:
+            pid = None
+        process = self._processes.pop(sandbox_id, None)
+        if process is not None:
+            if process.returncode is None:
+                process.terminate()
+            await process.wait()
+        elif pid is not None:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        shutil.rmtree(os.path.join(self.root, sandbox_id), ignore_errors=True)
+        logger.debug(f"Deleted local sandbox {sandbox_id}")
+
+
+_provider: Optional[SandboxProvider] = None
+
+
+def get_sandbox_provider() -> SandboxProvider:
+    global _provider
+    if _provider is None:
+        if config.SANDBOX_PROVIDER == "local":
+            _provider = LocalSandboxProvider()
+        else:
+            _provider = DaytonaSandboxProvider()
+    return _provider
@@ -0,0 +1,166 @@
+"""
+Sandbox lookups shared by the sandbox tools of a run.
+
+Every sandbox tool used to read the project row and call get_or_start_sandbox
+on its first call, so a run touching files, shell and browser repeated the
+same lookups once per tool. Now:
+
+- All sandbox tools of a run share one SandboxResolver (one per ThreadManager
+  and project); concurrent first calls wait for a single lookup
+- The run setup seeds the resolver with the project's sandbox info it has
+  already read, so tools never select the project row again
+- The started sandbox is trusted for the rest of the run, and for
+  SANDBOX_HANDLE_CACHE_TTL_SECONDS by later runs of the project in this
+  process, which then skip get_or_start_sandbox entirely
+- A failed lookup is not cached; the next tool call tries again
+"""
+
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sandbox.sandbox import get_or_start_sandbox
+from services.supabase import DBConnection
+from utils.config import config
+from utils.logger import logger
+
+MAX_CACHED_HANDLES = 256
+
+
+class SandboxHandle:
+    """A started sandbox of a project and its credentials."""
+
+    def __init__(self, sandbox: Any, sandbox_id: str, sandbox_pass: Optional[str]):
+        self.sandbox = sandbox
+        self.sandbox_id = sandbox_id
+        self.sandbox_pass = sandbox_pass
+        # When the sandbox was last known to be started
+        self.checked_at = time.monotonic()
+
+
+class SandboxHandleCache:
+    """Recently started sandboxes by project, shared by the runs of this process."""
+
+    def __init__(self):
+        self.ttl = config.SANDBOX_HANDLE_CACHE_TTL_SECONDS
+        self._handles: "OrderedDict[str, SandboxHandle]" = OrderedDict()
+        self.stats = {
+            "resolves": 0,
+            "run_hits": 0,
+            "cache_hits": 0,
+            "project_reads": 0,
+            "sandbox_starts": 0,
+            "errors": 0,
+            "start_ms": 0.0,
+        }
+
+    def get(self, project_id: str) -> Optional[SandboxHandle]:
+        handle = self._handles.get(project_id)
+        if handle is None:
+            return None
+        if time.monotonic() - handle.checked_at > self.ttl:
+            del self._handles[project_id]
+            return None
+        self._handles.move_to_end(project_id)
+        return handle
+
+    def put(self, project_id: str, handle: SandboxHandle):
+        if self.ttl <= 0:
+            return
+        self._handles[project_id] = handle
+        self._handles.move_to_end(project_id)
+        while len(self._handles) > MAX_CACHED_HANDLES:
+            self._handles.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        starts = self.stats["sandbox_starts"]
+        return dict(
+            self.stats,
+            cached_projects=len(self._handles),
+            avg_start_ms=round(self.stats["start_ms"] / starts, 2) if starts else 0.0,
+        )
+
+
+sandbox_handle_cache = SandboxHandleCache()
+
+
+class SandboxResolver:
+    """Resolves the sandbox of a project once for all sandbox tools of a run."""
+
+    def __init__(self, project_id: str, db: Optional[DBConnection] = None):
+        self.project_id = project_id
+        self.db = db or DBConnection()
+        self._sandbox_info: Optional[Dict[str, Any]] = None
+        self._handle: Optional[SandboxHandle] = None
+        self._pending: Optional[asyncio.Future] = None
+
+    def seed(self, sandbox_info: Dict[str, Any]):
+        """Use sandbox info the caller already read from the project row."""
+        self._sandbox_info = sandbox_info
+
+    async def _load_sandbox_info(self) -> Dict[str, Any]:
+        sandbox_handle_cache.stats["project_reads"] += 1
+        client = await self.db.client
+        project = await client.table('projects').select('sandbox').eq('project_id', self.project_id).execute()
+        if not project.data or len(project.data) == 0:
+            raise ValueError(f"Project {self.project_id} not found")
+        return project.data[0].get('sandbox') or {}
+
+    async def _resolve(self) -> SandboxHandle:
+        handle = sandbox_handle_cache.get(self.project_id)
+        if handle is not None:
+            sandbox_handle_cache.stats["cache_hits"] += 1
+            return handle
+
+        sandbox_info = self._sandbox_info or await self._load_sandbox_info()
+        if not sandbox_info.get('id'):
+            raise ValueError(f"No sandbox found for project {self.project_id}")
+
+        start = time.monotonic()
+        sandbox = await get_or_start_sandbox(sandbox_info['id'])
+        elapsed_ms = (time.monotonic() - start) * 1000
+        sandbox_handle_cache.stats["sandbox_starts"] += 1
+        sandbox_handle_cache.stats["start_ms"] += elapsed_ms
+        logger.debug(f"Resolved sandbox {sandbox_info['id']} of project {self.project_id} in {elapsed_ms:.0f}ms")
+
+        handle = SandboxHandle(sandbox, sandbox_info['id'], sandbox_info.get('pass'))
+        sandbox_handle_cache.put(self.project_id, handle)
+        return handle
+
+    async def resolve(self) -> SandboxHandle:
+        """The project's started sandbox, looked up at most once at a time."""
+        sandbox_handle_cache.stats["resolves"] += 1
+        if self._handle is not None:
+            sandbox_handle_cache.stats["run_hits"] += 1
+            return self._handle
+
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._resolve())
+        pending = self._pending
+        try:
+            # Shielded: a cancelled tool call must not cancel the lookup other tools wait for
+            self._handle = await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._pending is pending:
+                self._pending = None
+                sandbox_handle_cache.stats["errors"] += 1
+            raise
+        return self._handle
+
+
+# One resolver per run (ThreadManager) and project; dropped with the run
+_run_resolvers: "weakref.WeakKeyDictionary[Any, Dict[str, SandboxResolver]]" = weakref.WeakKeyDictionary()
+
+
+def get_sandbox_resolver(thread_manager: Optional[Any], project_id: str) -> SandboxResolver:
+    """The resolver shared by the sandbox tools of a run."""
+    if thread_manager is None:
+        return SandboxResolver(project_id)
+    resolvers = _run_resolvers.setdefault(thread_manager, {})
+    if project_id not in resolvers:
+        resolvers[project_id] = SandboxResolver(project_id, thread_manager.db)
+    return resolvers[project_id]
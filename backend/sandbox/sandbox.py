@@ -78,16 +78,16 @@ async def start_supervisord_session(sandbox: AsyncSandbox):
         logger.error(f"Error starting supervisord session: {str(e)}")
         raise e
 
-async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
+async def create_sandbox(password: str, project_id: str = None, labels: dict = None) -> AsyncSandbox:
     """Create a new sandbox with all required services configured and running."""
     
     logger.debug("Creating new Daytona sandbox environment")
     logger.debug("Configuring sandbox with snapshot and environment variables")
     
-    labels = None
+    labels = dict(labels) if labels else None
     if project_id:
         logger.debug(f"Using sandbox_id as label: {project_id}")
-        labels = {'id': project_id}
+        labels = {**(labels or {}), 'id': project_id}
         
     params = CreateSandboxFromSnapshotParams(
         snapshot=Configuration.SANDBOX_SNAPSHOT_NAME,
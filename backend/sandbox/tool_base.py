@@ -3,7 +3,7 @@ from typing import Optional
 from agentpress.thread_manager import ThreadManager
 from agentpress.tool import Tool
 from daytona_sdk import AsyncSandbox
-from sandbox.sandbox import get_or_start_sandbox
+from sandbox.resolver import get_sandbox_resolver
 from utils.logger import logger
 from utils.files_utils import clean_path
 
@@ -21,31 +21,25 @@ class SandboxToolsBase(Tool):
         self._sandbox = None
         self._sandbox_id = None
         self._sandbox_pass = None
+        # Shared with the other sandbox tools of the run
+        self._sandbox_resolver = get_sandbox_resolver(thread_manager, project_id)
+
+    @property
+    def concurrency_key(self) -> str:
+        """Calls of all sandbox tools of a project share the project's sandbox limit."""
+        return f"sandbox:{self.project_id}"
 
     async def _ensure_sandbox(self) -> AsyncSandbox:
         """Ensure we have a valid sandbox instance, retrieving it from the project if needed."""
         if self._sandbox is None:
             try:
-                # Get database client
-                client = await self.thread_manager.db.client
-                
-                # Get project data
-                project = await client.table('projects').select('*').eq('project_id', self.project_id).execute()
-                if not project.data or len(project.data) == 0:
-                    raise ValueError(f"Project {self.project_id} not found")
-                
-                project_data = project.data[0]
-                sandbox_info = project_data.get('sandbox', {})
-                
-                if not sandbox_info.get('id'):
-                    raise ValueError(f"No sandbox found for project {self.project_id}")
+                # Looked up once per run for all sandbox tools
+                handle = await self._sandbox_resolver.resolve()
                 
                 # Store sandbox info
-                self._sandbox_id = sandbox_info['id']
-                self._sandbox_pass = sandbox_info.get('pass')
-                
-                # Get or start the sandbox
-                self._sandbox = await get_or_start_sandbox(self._sandbox_id)
+                self._sandbox_id = handle.sandbox_id
+                self._sandbox_pass = handle.sandbox_pass
+                self._sandbox = handle.sandbox
                 
                 # # Log URLs if not already printed
                 # if not SandboxToolsBase._urls_printed:
@@ -15,7 +15,8 @@ from utils.config import config, EnvMode
 from services.supabase import DBConnection
 from utils.auth_utils import get_current_user_id_from_jwt
 from pydantic import BaseModel
-from utils.constants import MODEL_ACCESS_TIERS, MODEL_NAME_ALIASES, HARDCODED_MODEL_PRICES
+from utils.constants import MODEL_ACCESS_TIERS, MODEL_NAME_ALIASES
+from utils.model_registry import get_pricing
 from litellm.cost_calculator import cost_per_token
 import time
 
@@ -104,8 +105,8 @@ def get_model_pricing(model: str) -> tuple[float, float] | None:
     Returns:
         Tuple of (input_cost_per_million_tokens, output_cost_per_million_tokens) or None if not found
     """
-    if model in HARDCODED_MODEL_PRICES:
-        pricing = HARDCODED_MODEL_PRICES[model]
+    pricing = get_pricing(model)
+    if pricing:
         return pricing["input_cost_per_million_tokens"], pricing["output_cost_per_million_tokens"]
     return None
 
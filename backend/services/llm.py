@@ -5,20 +5,27 @@ This module provides a unified interface for making API calls to different LLM p
 (OpenAI, Anthropic, Groq, xAI, etc.) using LiteLLM. It includes support for:
 - Streaming responses
 - Tool calls and function calling
-- Retry logic with exponential backoff
+- Retry logic with exponential backoff, honoring Retry-After on rate limits
+- Request rate limits shared by all workers (services.llm_rate_limiter)
+- Optional hedging: the OpenRouter fallback is started when the first token is slow
 - Model-specific configurations
 - Comprehensive error handling and logging
 """
 
-from typing import Union, Dict, Any, Optional, AsyncGenerator, List
+from typing import Union, Dict, Any, Optional, AsyncGenerator, List, Callable, Tuple
 import os
 import json
 import asyncio
+import inspect
+import random
 from openai import OpenAIError
 import litellm
 from litellm.files.main import ModelResponse
 from utils.logger import logger
 from utils.config import config
+from utils.model_registry import get_model_capabilities
+from services.llm_http import llm_client_pool
+from services.llm_rate_limiter import llm_rate_limiter, get_retry_after
 
 # litellm.set_verbose=True
 # Let LiteLLM auto-adjust params and drop unsupported ones (e.g., GPT-5 temperature!=1)
@@ -27,9 +34,12 @@ litellm.drop_params = True
 
 # Constants
 MAX_RETRIES = 2
-RATE_LIMIT_DELAY = 30
+RATE_LIMIT_DELAY = 30  # Upper bound of the rate limit backoff without Retry-After
+RATE_LIMIT_BASE_DELAY = 2
 RETRY_DELAY = 0.1
 
+hedge_stats = {"hedged": 0, "primary_won": 0, "fallback_won": 0, "failed": 0}
+
 class LLMError(Exception):
     """Base exception for LLM-related errors."""
     pass
@@ -98,13 +108,143 @@ def get_openrouter_fallback(model_name: str) -> Optional[str]:
     
     return None
 
-async def handle_error(error: Exception, attempt: int, max_attempts: int) -> None:
-    """Handle API errors with appropriate delays and logging."""
-    delay = RATE_LIMIT_DELAY if isinstance(error, litellm.exceptions.RateLimitError) else RETRY_DELAY
+async def handle_error(error: Exception, attempt: int, max_attempts: int, model_name: Optional[str] = None) -> None:
+    """Handle API errors with appropriate delays and logging.
+
+    Rate limit errors wait for the provider's Retry-After (and pause the model's
+    shared bucket for the other workers), or back off exponentially with jitter.
+    """
+    delay = RETRY_DELAY
+    if isinstance(error, litellm.exceptions.RateLimitError):
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = min(retry_after, config.LLM_RATE_LIMIT_MAX_WAIT_SECONDS)
+            if model_name:
+                await llm_rate_limiter.pause(model_name, delay)
+        else:
+            delay = min(RATE_LIMIT_DELAY, RATE_LIMIT_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
     logger.warning(f"Error on attempt {attempt + 1}/{max_attempts}: {str(error)}")
-    logger.debug(f"Waiting {delay} seconds before retry...")
+    logger.debug(f"Waiting {delay:.2f} seconds before retry...")
     await asyncio.sleep(delay)
 
+async def _close_stream(stream: Any) -> None:
+    """Best-effort close of a litellm stream that is no longer read."""
+    completion_stream = getattr(stream, "completion_stream", None)
+    close = getattr(completion_stream, "aclose", None) or getattr(completion_stream, "close", None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.debug(f"Error closing abandoned LLM stream: {e}")
+
+async def _open_stream(params: Dict[str, Any]) -> Tuple[Any, Any]:
+    """Start a streaming call and wait for its first chunk."""
+    stream = await litellm.acompletion(**params)
+    try:
+        first_chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        first_chunk = None
+    return stream, first_chunk
+
+async def _stream_from(stream: Any, first_chunk: Any) -> AsyncGenerator:
+    if first_chunk is not None:
+        yield first_chunk
+    async for chunk in stream:
+        yield chunk
+
+async def _hedged_acompletion(
+    params: Dict[str, Any],
+    prepare_fallback: Callable[[], Dict[str, Any]],
+    ttft_seconds: float
+) -> AsyncGenerator:
+    """Stream from the primary model, racing the fallback if the first token is slow.
+
+    The fallback is only started once the primary has not produced a chunk
+    within `ttft_seconds`; the first call to produce a chunk wins and the
+    other one is cancelled. Errors of the primary before that point propagate
+    as usual, so the caller's retries still apply.
+    """
+    primary = asyncio.create_task(_open_stream(params))
+    tasks = [primary]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=ttft_seconds)
+        if done:
+            winner = primary
+            return _stream_from(*primary.result())
+
+        fallback_params = prepare_fallback()
+        hedge_stats["hedged"] += 1
+        logger.warning(f"No first token from {params['model']} after {ttft_seconds}s, hedging with {fallback_params['model']}")
+        await llm_rate_limiter.acquire(fallback_params["model"])
+        tasks.append(asyncio.create_task(_open_stream(fallback_params)))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    break
+                logger.warning(f"Hedged LLM call failed: {task.exception()}")
+            if winner:
+                break
+
+        if winner is None:
+            hedge_stats["failed"] += 1
+            raise primary.exception()
+        hedge_stats["primary_won" if winner is primary else "fallback_won"] += 1
+        logger.info(f"Hedged LLM call won by {params['model'] if winner is primary else fallback_params['model']} ({hedge_stats})")
+        return _stream_from(*winner.result())
+    finally:
+        for task in tasks:
+            if task is winner:
+                continue
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None:
+                await _close_stream(task.result()[0])
+
+def apply_prompt_cache_breakpoints(messages: List[Dict[str, Any]]) -> int:
+    """Place prompt cache breakpoints on the stable prefix of a prompt.
+
+    Anthropic caches tools -> system -> messages as one prefix, so breakpoints go on:
+    1. The first text block of the system prompt (also covers the tool schemas);
+       trailing system blocks such as the current time stay outside the cache
+    2. The last persisted history message (one with a message_id); temporary
+       messages appended after it change every call
+
+    Returns:
+        Number of breakpoints placed
+    """
+    targets = []
+    if messages and isinstance(messages[0], dict) and messages[0].get("role") == "system":
+        targets.append((messages[0], True))
+    for message in reversed(messages[1:]):
+        if isinstance(message, dict) and message.get("message_id") and message.get("content"):
+            targets.append((message, False))
+            break
+
+    placed = 0
+    for message, use_first_block in targets:
+        content = message["content"]
+        if isinstance(content, str):
+            message["content"] = [
+                {"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}
+            ]
+            placed += 1
+        elif isinstance(content, list):
+            text_blocks = [item for item in content if isinstance(item, dict) and item.get("type") == "text"]
+            if text_blocks:
+                block = text_blocks[0] if use_first_block else text_blocks[-1]
+                block["cache_control"] = {"type": "ephemeral"}
+                placed += 1
+    return placed
+
+
 def prepare_params(
     messages: List[Dict[str, Any]],
     model_name: str,
@@ -122,6 +262,7 @@ def prepare_params(
     reasoning_effort: Optional[str] = 'low'
 ) -> Dict[str, Any]:
     """Prepare parameters for the API call."""
+    capabilities = get_model_capabilities(model_name)
     params = {
         "model": model_name,
         "messages": messages,
@@ -146,6 +287,9 @@ def prepare_params(
             logger.debug(f"Skipping max_tokens for Claude 3.7 model: {model_name}")
             # Do not add any max_tokens parameter for Claude 3.7
         else:
+            if capabilities.max_output_tokens and max_tokens > capabilities.max_output_tokens:
+                logger.debug(f"Clamping max_tokens {max_tokens} to {capabilities.max_output_tokens} for {model_name}")
+                max_tokens = capabilities.max_output_tokens
             is_openai_o_series = 'o1' in model_name
             is_openai_gpt5 = 'gpt-5' in model_name
             param_name = "max_completion_tokens" if (is_openai_o_series or is_openai_gpt5) else "max_tokens"
@@ -200,42 +344,22 @@ def prepare_params(
         }]
         logger.debug(f"Added OpenRouter fallback for model: {model_name} to {fallback_model}")
 
-    # Apply Anthropic prompt caching (minimal implementation)
+    # Apply prompt caching
     # Check model name *after* potential modifications (like adding bedrock/ prefix)
     effective_model_name = params.get("model", model_name) # Use model from params if set, else original
 
     # OpenAI GPT-5: drop unsupported temperature param (only default 1 allowed)
     if "gpt-5" in effective_model_name and "temperature" in params and params["temperature"] != 1:
         params.pop("temperature", None)
-    if "claude" in effective_model_name.lower() or "anthropic" in effective_model_name.lower():
+    if get_model_capabilities(effective_model_name).supports_prompt_caching:
         messages = params["messages"] # Direct reference, modification affects params
 
         # Ensure messages is a list
         if not isinstance(messages, list):
             return params # Return early if messages format is unexpected
 
-        # Apply cache control to the first 4 text blocks across all messages
-        cache_control_count = 0
-        max_cache_control_blocks = 3
-
-        for message in messages:
-            if cache_control_count >= max_cache_control_blocks:
-                break
-                
-            content = message.get("content")
-            
-            if isinstance(content, str):
-                message["content"] = [
-                    {"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}
-                ]
-                cache_control_count += 1
-            elif isinstance(content, list):
-                for item in content:
-                    if cache_control_count >= max_cache_control_blocks:
-                        break
-                    if isinstance(item, dict) and item.get("type") == "text" and "cache_control" not in item:
-                        item["cache_control"] = {"type": "ephemeral"}
-                        cache_control_count += 1
+        breakpoints = apply_prompt_cache_breakpoints(messages)
+        logger.debug(f"Placed {breakpoints} prompt cache breakpoints")
 
     # Add reasoning_effort for Anthropic models if enabled
     use_thinking = enable_thinking if enable_thinking is not None else False
@@ -328,26 +452,76 @@ async def make_llm_api_call(
         enable_thinking=enable_thinking,
         reasoning_effort=reasoning_effort
     )
+    # Reuse the worker's pooled connections to the provider
+    http_client = llm_client_pool.get_litellm_client(model_name)
+    if http_client:
+        params["client"] = http_client
+        for fallback in params.get("fallbacks", []):
+            # The fallback may be served by another provider
+            fallback["client"] = llm_client_pool.get_litellm_client(fallback["model"])
+
+    fallback_model = get_openrouter_fallback(model_name)
+    hedge = stream and config.LLM_HEDGE_ENABLED and fallback_model and config.OPENROUTER_API_KEY
+
+    def prepare_fallback() -> Dict[str, Any]:
+        fallback_params = prepare_params(
+            messages=messages,
+            model_name=fallback_model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format,
+            tools=tools,
+            tool_choice=tool_choice,
+            stream=stream,
+            top_p=top_p,
+            enable_thinking=enable_thinking,
+            reasoning_effort=reasoning_effort
+        )
+        fallback_client = llm_client_pool.get_litellm_client(fallback_model)
+        if fallback_client:
+            fallback_params["client"] = fallback_client
+        return fallback_params
+
+    # Rate limit errors get their own, longer retry budget; each budget ends the loop
+    # on its own, so the loop allows for both being used up to their last attempt
+    max_attempts = MAX_RETRIES + config.LLM_RATE_LIMIT_MAX_RETRIES - 1
     last_error = None
-    for attempt in range(MAX_RETRIES):
+    errors = 0
+    rate_limit_errors = 0
+    attempt = 0
+    for attempt in range(max_attempts):
         try:
-            logger.debug(f"Attempt {attempt + 1}/{MAX_RETRIES}")
+            logger.debug(f"Attempt {attempt + 1}/{max_attempts}")
             # logger.debug(f"API request parameters: {json.dumps(params, indent=2)}")
 
-            response = await litellm.acompletion(**params)
+            await llm_rate_limiter.acquire(model_name)
+            if hedge:
+                response = await _hedged_acompletion(params, prepare_fallback, config.LLM_HEDGE_TTFT_SECONDS)
+            else:
+                response = await litellm.acompletion(**params)
             logger.debug(f"Successfully received API response from {model_name}")
             # logger.debug(f"Response: {response}")
             return response
 
-        except (litellm.exceptions.RateLimitError, OpenAIError, json.JSONDecodeError) as e:
+        except litellm.exceptions.RateLimitError as e:
             last_error = e
-            await handle_error(e, attempt, MAX_RETRIES)
+            rate_limit_errors += 1
+            if rate_limit_errors >= config.LLM_RATE_LIMIT_MAX_RETRIES:
+                break
+            await handle_error(e, rate_limit_errors - 1, config.LLM_RATE_LIMIT_MAX_RETRIES, model_name)
+
+        except (OpenAIError, json.JSONDecodeError) as e:
+            last_error = e
+            errors += 1
+            if errors >= MAX_RETRIES:
+                break
+            await handle_error(e, attempt, MAX_RETRIES, model_name)
 
         except Exception as e:
             logger.error(f"Unexpected error during API call: {str(e)}", exc_info=True)
             raise LLMError(f"API call failed: {str(e)}")
 
-    error_msg = f"Failed to make API call after {MAX_RETRIES} attempts"
+    error_msg = f"Failed to make API call after {attempt + 1} attempts"
     if last_error:
         error_msg += f". Last error: {str(last_error)}"
     logger.error(error_msg, exc_info=True)
@@ -0,0 +1,268 @@
+"""
+Shared HTTP connection pools for LLM provider calls.
+
+litellm.acompletion created (or looked up) its HTTP clients per call without
+explicit limits, so TLS handshakes and connection setup to the providers were
+repeated across runs of a worker. This module keeps long-lived httpx clients:
+
+- One client per provider that litellm drives through its own HTTP handler
+  (Anthropic, Bedrock, Gemini), passed to litellm as `client`
+- One shared client for OpenAI-compatible providers (OpenAI, OpenRouter, xAI,
+  Groq, ...), installed as `litellm.aclient_session`
+- Keep-alive with configurable limits, HTTP/2 when the `h2` package is installed
+- Connect, TLS and time-to-first-byte timings per host
+- `warm_up()` opens connections to the configured providers at worker start
+- Streams closed before their end (litellm stops reading at the final chunk)
+  are drained so their connection goes back to the pool instead of being dropped
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional, Set
+
+import httpx
+import litellm
+from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+from utils.config import config
+from utils.logger import logger
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Providers litellm calls through AsyncHTTPHandler; they accept it as `client`
+HANDLER_PROVIDERS = ("anthropic", "bedrock", "gemini")
+
+OPENAI_COMPATIBLE = "openai_compatible"
+
+# Unread tail of a closed stream that is read to keep its connection
+DRAIN_MAX_BYTES = 64 * 1024
+DRAIN_TIMEOUT_SECONDS = 1.0
+
+
+def get_provider(model_name: str) -> str:
+    """Map a litellm model name to the pool serving it."""
+    prefix = model_name.split("/", 1)[0].lower() if "/" in model_name else ""
+    if prefix in HANDLER_PROVIDERS:
+        return prefix
+    if not prefix and "claude" in model_name.lower():
+        return "anthropic"
+    return OPENAI_COMPATIBLE
+
+
+def _warm_up_urls() -> Dict[str, list]:
+    """Origins to connect to at startup, for the providers that are configured."""
+    urls = {"anthropic": [], "bedrock": [], "gemini": [], OPENAI_COMPATIBLE: []}
+    if config.ANTHROPIC_API_KEY:
+        urls["anthropic"].append("https://api.anthropic.com")
+    if config.AWS_ACCESS_KEY_ID and config.AWS_REGION_NAME:
+        urls["bedrock"].append(f"https://bedrock-runtime.{config.AWS_REGION_NAME}.amazonaws.com")
+    if config.GEMINI_API_KEY:
+        urls["gemini"].append("https://generativelanguage.googleapis.com")
+    if config.OPENAI_API_KEY:
+        urls[OPENAI_COMPATIBLE].append("https://api.openai.com")
+    if config.OPENROUTER_API_KEY:
+        urls[OPENAI_COMPATIBLE].append(config.OPENROUTER_API_BASE or "https://openrouter.ai/api/v1")
+    if config.XAI_API_KEY:
+        urls[OPENAI_COMPATIBLE].append("https://api.x.ai")
+    if config.GROQ_API_KEY:
+        urls[OPENAI_COMPATIBLE].append("https://api.groq.com")
+    return urls
+
+
+class _DrainingStream(httpx.AsyncByteStream):
+    """Reads what is left of a response body on close so the connection can be reused."""
+
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+        self._consumed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+        self._consumed = True
+
+    async def aclose(self):
+        if self._consumed:
+            await self._stream.aclose()
+            return
+        try:
+            drained = 0
+            async with asyncio.timeout(DRAIN_TIMEOUT_SECONDS):
+                async for chunk in self._stream:
+                    drained += len(chunk)
+                    if drained > DRAIN_MAX_BYTES:
+                        break
+        except Exception:
+            # The connection is discarded by aclose, as it would have been without draining
+            pass
+        await self._stream.aclose()
+
+
+class _DrainingTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await super().handle_async_request(request)
+        response.stream = _DrainingStream(response.stream)
+        return response
+
+
+class LLMClientPool:
+    """Long-lived, instrumented HTTP clients for LLM providers."""
+
+    def __init__(self):
+        self.enabled = config.LLM_HTTP_POOL_ENABLED
+        self.http2 = config.LLM_HTTP2_ENABLED and HTTP2_AVAILABLE
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._handlers: Dict[str, AsyncHTTPHandler] = {}
+        # Closes of clients replaced by pooled ones; referenced until they finish
+        self._closing: Set[asyncio.Task] = set()
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def _host_stats(self, host: str) -> Dict[str, Any]:
+        stats = self.stats.get(host)
+        if stats is None:
+            stats = {
+                "requests": 0, "new_connections": 0, "errors": 0,
+                "connect_ms": 0.0, "max_connect_ms": 0.0,
+                "tls_ms": 0.0, "max_tls_ms": 0.0,
+                "ttfb_ms": 0.0, "max_ttfb_ms": 0.0,
+            }
+            self.stats[host] = stats
+        return stats
+
+    def _record(self, stats: Dict[str, Any], name: str, ms: float):
+        stats[f"{name}_ms"] += ms
+        stats[f"max_{name}_ms"] = max(stats[f"max_{name}_ms"], ms)
+
+    async def _on_request(self, request: httpx.Request):
+        stats = self._host_stats(request.url.host)
+        stats["requests"] += 1
+        started = {}
+        request.extensions["llm_pool_sent_at"] = time.monotonic()
+
+        # httpcore reports connection setup through the request's trace extension
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name.endswith((".connect_tcp.started", ".start_tls.started")):
+                started[event_name.rsplit(".", 1)[0]] = time.monotonic()
+            elif event_name.endswith(".connect_tcp.complete"):
+                stats["new_connections"] += 1
+                self._record(stats, "connect", (time.monotonic() - started.pop(event_name.rsplit(".", 1)[0], time.monotonic())) * 1000)
+            elif event_name.endswith(".start_tls.complete"):
+                self._record(stats, "tls", (time.monotonic() - started.pop(event_name.rsplit(".", 1)[0], time.monotonic())) * 1000)
+
+        request.extensions["trace"] = trace
+
+    async def _on_response(self, response: httpx.Response):
+        # Response hooks run once the headers arrived, before the body is streamed
+        sent_at = response.request.extensions.get("llm_pool_sent_at")
+        stats = self._host_stats(response.request.url.host)
+        if sent_at is not None:
+            self._record(stats, "ttfb", (time.monotonic() - sent_at) * 1000)
+        if response.status_code >= 500:
+            stats["errors"] += 1
+
+    def _create_client(self) -> httpx.AsyncClient:
+        transport = _DrainingTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(
+                config.LLM_HTTP_READ_TIMEOUT_SECONDS,
+                connect=config.LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+            ),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+
+    def get_http_client(self, provider: str) -> httpx.AsyncClient:
+        """Get the shared httpx client of a provider pool."""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create_client()
+            self._clients[provider] = client
+            self._handlers.pop(provider, None)
+            if provider == OPENAI_COMPATIBLE:
+                # litellm passes this session to the OpenAI SDK clients it creates
+                litellm.aclient_session = client
+            logger.debug(f"Created LLM HTTP pool for {provider} (http2: {self.http2})")
+        return client
+
+    def get_litellm_client(self, model_name: str) -> Optional[AsyncHTTPHandler]:
+        """Get the client to pass to litellm.acompletion for a model.
+
+        Returns None for OpenAI-compatible providers; they use the shared
+        `litellm.aclient_session` instead.
+        """
+        if not self.enabled:
+            return None
+        provider = get_provider(model_name)
+        client = self.get_http_client(provider)
+        if provider == OPENAI_COMPATIBLE:
+            return None
+        handler = self._handlers.get(provider)
+        if handler is None:
+            handler = AsyncHTTPHandler(timeout=client.timeout)
+            # Close the handler's own (unused) client and use the pooled one
+            self._close_later(handler.client)
+            handler.client = client
+            self._handlers[provider] = handler
+        return handler
+
+    def _close_later(self, client: httpx.AsyncClient):
+        task = asyncio.get_running_loop().create_task(client.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def warm_up(self, timeout: float = 5.0):
+        """Open a connection to every configured provider."""
+        if not self.enabled:
+            return
+
+        async def connect(provider: str, url: str):
+            try:
+                # Any response will do, the point is the TCP/TLS handshake
+                await self.get_http_client(provider).head(url, timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Failed to warm up LLM connection to {url}: {e}")
+
+        tasks = [connect(provider, url) for provider, urls in _warm_up_urls().items() for url in urls]
+        if not tasks:
+            return
+        start = time.monotonic()
+        await asyncio.gather(*tasks)
+        logger.info(f"Warmed up {len(tasks)} LLM provider connections in {(time.monotonic() - start) * 1000:.0f}ms (http2: {self.http2})")
+
+    async def close(self):
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        for client in self._clients.values():
+            await client.aclose()
+        if litellm.aclient_session is self._clients.get(OPENAI_COMPATIBLE):
+            litellm.aclient_session = None
+            # litellm caches the OpenAI SDK clients built around the closed session
+            litellm.in_memory_llm_clients_cache.flush_cache()
+        self._clients.clear()
+        self._handlers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        per_host = {}
+        for host, stats in self.stats.items():
+            new_connections = stats["new_connections"]
+            per_host[host] = dict(
+                stats,
+                reused_connections=max(stats["requests"] - new_connections, 0),
+                avg_connect_ms=round(stats["connect_ms"] / new_connections, 2) if new_connections else 0.0,
+                avg_ttfb_ms=round(stats["ttfb_ms"] / stats["requests"], 2) if stats["requests"] else 0.0,
+            )
+        return {"http2": self.http2, "pools": sorted(self._clients), "hosts": per_host}
+
+
+llm_client_pool = LLMClientPool()
@@ -0,0 +1,201 @@
+"""
+Rate limiting of LLM requests shared by all workers.
+
+A RateLimitError used to cost every run a flat 30 second sleep, and the other
+workers kept sending requests into the same provider limit. This module keeps
+one token bucket per provider and model in Redis:
+
+- Limits in requests per minute from LLM_RATE_LIMITS, e.g.
+  "anthropic=50,anthropic/claude-sonnet-4-20250514=40,openrouter=200"
+  (a model entry takes precedence over its provider entry)
+- Buckets refill continuously and allow bursts of LLM_RATE_LIMIT_BURST requests
+- A Retry-After header on a 429 pauses the bucket for every worker
+- Redis failures never block a call; the limiter lets it through
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+KEY_PREFIX = "llm_rate"
+
+# Takes a token from the bucket, or returns how long to wait for one.
+# KEYS[1] bucket hash, KEYS[2] pause key (Retry-After)
+# ARGV[1] tokens per second (0 = unlimited), ARGV[2] capacity
+_ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local paused_ms = redis.call('PTTL', KEYS[2])
+if paused_ms > 0 then
+    return tostring(paused_ms / 1000)
+end
+local rate = tonumber(ARGV[1])
+if rate <= 0 then
+    return '0'
+end
+local capacity = tonumber(ARGV[2])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+
+def get_rate_limit_key(model_name: str) -> Tuple[str, str]:
+    """Provider and model keys of a litellm model name."""
+    model = model_name.lower()
+    if "/" in model:
+        provider = model.split("/", 1)[0]
+    elif "claude" in model:
+        provider = "anthropic"
+    else:
+        provider = "openai"
+    return provider, model
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait according to the Retry-After headers of a failed call."""
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            retry_date = email.utils.parsedate_to_datetime(retry_after)
+            return max(retry_date.timestamp() - time.time(), 0.0)
+    except Exception:
+        return None
+
+
+def _parse_limits(value: str) -> Dict[str, float]:
+    limits = {}
+    for item in value.split(","):
+        key, _, per_minute = item.partition("=")
+        try:
+            limits[key.strip().lower()] = float(per_minute)
+        except ValueError:
+            if item.strip():
+                logger.warning(f"Ignoring invalid LLM_RATE_LIMITS entry: {item}")
+    return limits
+
+
+class LLMRateLimiter:
+    """Redis token buckets per provider/model, paused by Retry-After responses."""
+
+    def __init__(self):
+        self.enabled = config.LLM_RATE_LIMIT_ENABLED
+        self.limits = _parse_limits(config.LLM_RATE_LIMITS or "")
+        self.burst = max(config.LLM_RATE_LIMIT_BURST, 1)
+        self.max_wait = config.LLM_RATE_LIMIT_MAX_WAIT_SECONDS
+        self._script = None
+        self.stats = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_seconds": 0.0,
+            "wait_exceeded": 0,
+            "paused": 0,
+            "redis_errors": 0,
+        }
+
+    def _bucket(self, model_name: str) -> Tuple[str, float]:
+        """Bucket key and requests per second; the model limit wins over the provider's."""
+        provider, model = get_rate_limit_key(model_name)
+        if model in self.limits:
+            return model, self.limits[model] / 60
+        return provider, self.limits.get(provider, 0.0) / 60
+
+    async def _try_acquire(self, bucket: str, rate: float) -> float:
+        if self._script is None:
+            redis_client = await redis.get_client()
+            self._script = redis_client.register_script(_ACQUIRE_SCRIPT)
+        wait = await self._script(
+            keys=[f"{KEY_PREFIX}:{bucket}", f"{KEY_PREFIX}:paused:{bucket}"],
+            args=[rate, self.burst],
+        )
+        return float(wait)
+
+    async def acquire(self, model_name: str) -> float:
+        """Wait for a request slot of a model.
+
+        Gives up waiting after LLM_RATE_LIMIT_MAX_WAIT_SECONDS and lets the call
+        through; the provider's 429 handling takes over from there.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if not self.enabled:
+            return 0.0
+        bucket, rate = self._bucket(model_name)
+        start = time.monotonic()
+        slept = False
+        while True:
+            try:
+                wait = await self._try_acquire(bucket, rate)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                self._script = None
+                logger.warning(f"LLM rate limiter unavailable for {bucket}, not limiting: {e}")
+                return time.monotonic() - start if slept else 0.0
+
+            waited = time.monotonic() - start if slept else 0.0
+            if wait <= 0:
+                self.stats["acquired"] += 1
+                if slept:
+                    self.stats["waited"] += 1
+                    self.stats["wait_seconds"] += waited
+                    logger.info(f"Waited {waited:.2f}s for an LLM request slot of {bucket}")
+                return waited
+            if waited + wait > self.max_wait:
+                self.stats["wait_exceeded"] += 1
+                logger.warning(f"LLM rate limit of {bucket} needs {wait:.2f}s more after {waited:.2f}s, sending anyway")
+                return waited
+            # Jitter so the workers that waited do not retry together
+            await asyncio.sleep(wait + random.uniform(0, min(wait, 1.0) * 0.1))
+            slept = True
+
+    async def pause(self, model_name: str, seconds: float):
+        """Hold back all requests to a model's bucket, e.g. for a Retry-After header."""
+        if not self.enabled or seconds <= 0:
+            return
+        bucket, _ = self._bucket(model_name)
+        try:
+            redis_client = await redis.get_client()
+            key = f"{KEY_PREFIX}:paused:{bucket}"
+            # Extends an existing pause, never shortens it
+            if await redis_client.pttl(key) < seconds * 1000:
+                await redis_client.set(key, "1", px=int(seconds * 1000))
+            self.stats["paused"] += 1
+            logger.info(f"Paused LLM requests to {bucket} for {seconds:.1f}s")
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.warning(f"Failed to pause LLM requests to {bucket}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, limits=self.limits, burst=self.burst)
+
+
+llm_rate_limiter = LLMRateLimiter()
@@ -121,6 +121,18 @@ async def get_client():
     return client
 
 
+def get_pool_stats() -> dict:
+    """Connection pool usage of this process."""
+    if pool is None:
+        return {"initialized": False}
+    return {
+        "initialized": True,
+        "max_connections": pool.max_connections,
+        "in_use": len(getattr(pool, "_in_use_connections", ())),
+        "available": len(getattr(pool, "_available_connections", ())),
+    }
+
+
 # Basic Redis operations
 async def set(key: str, value: str, ex: int = None, nx: bool = False):
     """Set a Redis key."""
@@ -0,0 +1,269 @@
+"""
+Batched publisher and transports for agent run responses.
+
+Agent runs stream responses to viewers through one of two transports
+(AGENT_RUN_TRANSPORT):
+
+- "list": a Redis list (`agent_run:{id}:responses`) plus a notification channel
+  (`agent_run:{id}:new_response`); viewers re-read the list on each notification
+- "stream": a single Redis Stream (`agent_run:{id}:stream`) trimmed to
+  RESPONSE_STREAM_MAXLEN; viewers block on XREAD from their last entry ID, so
+  reconnecting clients resume with SSE `Last-Event-ID`. Control signals
+  (END_STREAM, STOP, ERROR) are written into the stream as well.
+
+Writing each chunk separately costs round trips per token chunk; the publishers
+buffer responses and write them as one pipeline per flush.
+
+- A flush happens every `flush_interval_ms` or as soon as `max_batch_size`
+  responses are buffered, whichever comes first
+- A single flusher and a lock keep responses in the order they were published
+- When more than `max_pending` responses are waiting, `publish` blocks until
+  the buffer has been written (backpressure on the agent loop)
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+CONTROL_SIGNALS = ("STOP", "END_STREAM", "ERROR")
+
+
+def response_list_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:responses"
+
+
+def response_channel(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:new_response"
+
+
+def response_stream_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:stream"
+
+
+def uses_stream_transport() -> bool:
+    return config.AGENT_RUN_TRANSPORT == "stream"
+
+
+class ResponsePublisher:
+    """Coalesces agent run responses into pipelined Redis writes."""
+
+    def __init__(
+        self,
+        list_key: str,
+        channel: str,
+        flush_interval_ms: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ):
+        """Initialize the publisher.
+
+        Args:
+            list_key: Redis list the responses are appended to
+            channel: Channel notified once per flush
+            flush_interval_ms: Maximum time a response waits in the buffer
+            max_batch_size: Buffered responses that trigger an immediate flush
+            max_pending: Buffered responses at which publish starts blocking
+        """
+        self.list_key = list_key
+        self.channel = channel
+        self.flush_interval = (flush_interval_ms or config.RESPONSE_FLUSH_INTERVAL_MS) / 1000
+        self.max_batch_size = max_batch_size or config.RESPONSE_FLUSH_MAX_ITEMS
+        self.max_pending = max_pending or config.RESPONSE_MAX_PENDING_ITEMS
+
+        self._buffer: List[str] = []
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.stats = {
+            "published": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "dropped": 0,
+            "max_batch": 0,
+            "max_pending": 0,
+            "backpressure_waits": 0,
+            "backpressure_wait_ms": 0.0,
+            "total_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the background flusher."""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def publish(self, response_json: str):
+        """Queue a serialized response for the next flush."""
+        if self._closed:
+            raise RuntimeError(f"Publisher for {self.list_key} is closed")
+
+        self._buffer.append(response_json)
+        self.stats["published"] += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], len(self._buffer))
+
+        if len(self._buffer) >= self.max_pending:
+            # Redis is not keeping up; write synchronously instead of growing the buffer
+            wait_start = time.monotonic()
+            await self.flush()
+            self.stats["backpressure_waits"] += 1
+            self.stats["backpressure_wait_ms"] += (time.monotonic() - wait_start) * 1000
+        elif len(self._buffer) >= self.max_batch_size:
+            self._wake.set()
+
+    async def flush(self):
+        """Write all buffered responses with a single pipeline."""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+
+            flush_start = time.monotonic()
+            for attempt in range(2):
+                try:
+                    redis_client = await redis.get_client()
+                    pipe = redis_client.pipeline(transaction=True)
+                    self._queue_writes(pipe, batch)
+                    await pipe.execute()
+                    break
+                except Exception as e:
+                    if attempt == 0:
+                        logger.warning(f"Failed to flush {len(batch)} responses to {self.list_key}, retrying: {e}")
+                        continue
+                    logger.error(f"Dropping {len(batch)} responses for {self.list_key} after failed flush: {e}")
+                    self.stats["failed_flushes"] += 1
+                    self.stats["dropped"] += len(batch)
+                    return
+
+            flush_ms = (time.monotonic() - flush_start) * 1000
+            self.stats["flushes"] += 1
+            self.stats["flushed"] += len(batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            self.stats["total_flush_ms"] += flush_ms
+            self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], flush_ms)
+
+    def _queue_writes(self, pipe, batch: List[str]):
+        """Add the writes for a batch to a pipeline."""
+        pipe.rpush(self.list_key, *batch)
+        pipe.publish(self.channel, "new")
+
+    async def _flush_loop(self):
+        try:
+            while not self._closed:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Response flusher for {self.list_key} failed: {e}", exc_info=True)
+
+    async def close(self):
+        """Stop the flusher and write whatever is still buffered."""
+        self._closed = True
+        # Wake the flusher instead of cancelling it so an in-flight pipeline is not lost
+        self._wake.set()
+        if self._flusher and not self._flusher.done():
+            await self._flusher
+        await self.flush()
+        logger.info(f"Response publisher for {self.list_key}: {self.get_stats()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["pending"] = len(self._buffer)
+        stats["avg_flush_ms"] = round(stats["total_flush_ms"] / stats["flushes"], 2) if stats["flushes"] else 0.0
+        stats["avg_batch"] = round(stats["flushed"] / stats["flushes"], 2) if stats["flushes"] else 0.0
+        return stats
+
+
+class StreamResponsePublisher(ResponsePublisher):
+    """ResponsePublisher writing to a Redis Stream instead of a list + channel."""
+
+    def __init__(self, stream_key: str, maxlen: Optional[int] = None, **kwargs):
+        """Initialize the publisher.
+
+        Args:
+            stream_key: Redis Stream the responses are appended to
+            maxlen: Approximate number of entries kept in the stream
+            **kwargs: Batching options, see ResponsePublisher
+        """
+        super().__init__(stream_key, channel="", **kwargs)
+        self.maxlen = maxlen or config.RESPONSE_STREAM_MAXLEN
+
+    def _queue_writes(self, pipe, batch: List[str]):
+        for response_json in batch:
+            pipe.xadd(self.list_key, {"data": response_json}, maxlen=self.maxlen, approximate=True)
+
+
+def create_response_publisher(agent_run_id: str) -> ResponsePublisher:
+    """Create the publisher for the configured transport."""
+    if uses_stream_transport():
+        return StreamResponsePublisher(response_stream_key(agent_run_id))
+    return ResponsePublisher(response_list_key(agent_run_id), response_channel(agent_run_id))
+
+
+async def publish_control_signal(agent_run_id: str, signal: str):
+    """Send a control signal to viewers of an agent run.
+
+    On the stream transport viewers only read the stream, so the signal is
+    appended there in addition to the global control channel the workers use.
+    """
+    await redis.publish(f"agent_run:{agent_run_id}:control", signal)
+    if uses_stream_transport():
+        redis_client = await redis.get_client()
+        await redis_client.xadd(
+            response_stream_key(agent_run_id), {"control": signal},
+            maxlen=config.RESPONSE_STREAM_MAXLEN, approximate=True
+        )
+
+
+async def read_response_stream(
+    agent_run_id: str,
+    last_event_id: Optional[str] = None,
+    block_ms: int = 5000,
+    count: int = 500
+) -> AsyncGenerator[Tuple[Optional[str], Optional[Dict[str, Any]], Optional[str]], None]:
+    """Follow the response stream of an agent run from a cursor.
+
+    Args:
+        agent_run_id: The agent run to follow
+        last_event_id: Stream entry ID the client has already seen ("0-0" = from the start)
+        block_ms: How long each XREAD blocks before yielding a heartbeat; kept
+            well under the shared client's socket timeout (15s)
+        count: Maximum entries per read
+
+    Yields:
+        (entry_id, response, control_signal) tuples. A heartbeat (no new entries
+        within block_ms, or a read that hit the socket timeout) is yielded as
+        (None, None, None).
+    """
+    stream_key = response_stream_key(agent_run_id)
+    cursor = last_event_id or "0-0"
+    redis_client = await redis.get_client()
+    while True:
+        try:
+            result = await redis_client.xread({stream_key: cursor}, count=count, block=block_ms)
+        except RedisTimeoutError:
+            result = None
+        if not result:
+            yield None, None, None
+            continue
+        for _, entries in result:
+            for entry_id, fields in entries:
+                cursor = entry_id
+                if "control" in fields:
+                    yield entry_id, None, fields["control"]
+                elif "data" in fields:
+                    yield entry_id, json.loads(fields["data"]), None
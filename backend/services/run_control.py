@@ -0,0 +1,253 @@
+"""
+Per-process control plane for the agent runs hosted by a worker.
+
+Every background run used to open its own pub/sub connection to its control
+channels and poll it from a loop waking up every ~0.6s, so a worker with N
+concurrent runs held N pub/sub connections and N polling tasks. The control
+plane keeps a single subscription for the whole process:
+
+- Runs register their global and instance control channels on one shared
+  pub/sub connection and get a RunControl with asyncio Events
+- One reader task blocks on the connection and dispatches STOP, END_STREAM
+  and ERROR to the run's events as they arrive; nothing polls
+- Registration waits for Redis to confirm the subscription, so a signal
+  published after register() returns is never missed
+- The reader refreshes the TTL of the registered runs' active keys and
+  resubscribes everything after a connection error
+- Metrics: signals received and routed, stop reaction latency (signal received
+  until the run acted on it), subscribe latency, connections and channels
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from services import redis
+from services.response_publisher import CONTROL_SIGNALS
+from utils.logger import logger
+
+# Longest blocking read; idle wake-ups only serve TTL refreshes and health checks
+READ_TIMEOUT_SECONDS = 10.0
+SUBSCRIBE_TIMEOUT_SECONDS = 5.0
+ACTIVE_KEY_REFRESH_SECONDS = 300
+MAX_RECONNECT_DELAY_SECONDS = 10.0
+
+
+def control_channels(agent_run_id: str, instance_id: str) -> List[str]:
+    return [f"agent_run:{agent_run_id}:control:{instance_id}", f"agent_run:{agent_run_id}:control"]
+
+
+class RunControl:
+    """Control signals of one agent run hosted by this worker."""
+
+    def __init__(self, agent_run_id: str, instance_id: str):
+        self.agent_run_id = agent_run_id
+        self.channels = control_channels(agent_run_id, instance_id)
+        self.active_key = f"active_run:{instance_id}:{agent_run_id}"
+        # Set on STOP; also handed to running tools so they can cancel cooperatively
+        self.stop_event = asyncio.Event()
+        # Set on any control signal
+        self.signal_event = asyncio.Event()
+        self.signal: Optional[str] = None
+        self.stop_received_at: Optional[float] = None
+        self.stop_acknowledged = False
+
+
+class RunControlPlane:
+    """One pub/sub subscription serving the control channels of all runs in the process."""
+
+    def __init__(self):
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._runs: Dict[str, RunControl] = {}
+        self._channels: Dict[str, RunControl] = {}
+        self._confirmations: Dict[str, asyncio.Future] = {}
+        self._last_refresh = time.monotonic()
+        self.stats = {
+            "runs_registered": 0,
+            "signals_received": 0,
+            "signals_routed": 0,
+            "signals_unrouted": 0,
+            "stops_acknowledged": 0,
+            "stop_reaction_ms": 0.0,
+            "max_stop_reaction_ms": 0.0,
+            "subscribe_ms": 0.0,
+            "max_subscribe_ms": 0.0,
+            "pubsub_connections_opened": 0,
+            "reconnects": 0,
+        }
+
+    async def _open_pubsub(self):
+        self._pubsub = await redis.create_pubsub()
+        self.stats["pubsub_connections_opened"] += 1
+        if self._channels:
+            await self._pubsub.subscribe(*self._channels)
+
+    async def register(self, agent_run_id: str, instance_id: str) -> RunControl:
+        """Subscribe to the control channels of a run.
+
+        Returns once Redis confirmed the subscriptions.
+
+        Raises:
+            asyncio.TimeoutError: If the subscriptions were not confirmed in time
+        """
+        control = RunControl(agent_run_id, instance_id)
+        loop = asyncio.get_running_loop()
+        confirmations = []
+        for channel in control.channels:
+            self._channels[channel] = control
+            confirmation = loop.create_future()
+            self._confirmations[channel] = confirmation
+            confirmations.append(confirmation)
+        self._runs[agent_run_id] = control
+
+        start = time.monotonic()
+        try:
+            async with self._lock:
+                if self._pubsub is None:
+                    # Subscribes to every registered channel, this run's included
+                    await self._open_pubsub()
+                else:
+                    await self._pubsub.subscribe(*control.channels)
+                if self._reader is None or self._reader.done():
+                    self._reader = asyncio.create_task(self._read_loop())
+            await asyncio.wait_for(asyncio.gather(*confirmations), timeout=SUBSCRIBE_TIMEOUT_SECONDS)
+        except BaseException:
+            await self.unregister(control)
+            raise
+        finally:
+            for channel in control.channels:
+                self._confirmations.pop(channel, None)
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        self.stats["runs_registered"] += 1
+        self.stats["subscribe_ms"] += elapsed_ms
+        self.stats["max_subscribe_ms"] = max(self.stats["max_subscribe_ms"], elapsed_ms)
+        logger.debug(f"Subscribed to control channels of {agent_run_id} in {elapsed_ms:.1f}ms ({len(self._runs)} runs on this worker)")
+        return control
+
+    async def unregister(self, control: RunControl):
+        """Stop receiving the control signals of a run."""
+        if self._runs.get(control.agent_run_id) is control:
+            del self._runs[control.agent_run_id]
+        channels = [channel for channel in control.channels if self._channels.get(channel) is control]
+        for channel in channels:
+            del self._channels[channel]
+        if not channels or self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(*channels)
+        except Exception as e:
+            logger.warning(f"Failed to unsubscribe control channels of {control.agent_run_id}: {e}")
+
+    def acknowledge_stop(self, control: RunControl):
+        """Record that a run acted on its STOP signal."""
+        if control.stop_acknowledged or control.stop_received_at is None:
+            return
+        control.stop_acknowledged = True
+        reaction_ms = (time.monotonic() - control.stop_received_at) * 1000
+        self.stats["stops_acknowledged"] += 1
+        self.stats["stop_reaction_ms"] += reaction_ms
+        self.stats["max_stop_reaction_ms"] = max(self.stats["max_stop_reaction_ms"], reaction_ms)
+        logger.info(f"Agent run {control.agent_run_id} acted on STOP {reaction_ms:.0f}ms after it arrived")
+
+    def _dispatch(self, message: Dict[str, Any]):
+        message_type = message.get("type")
+        channel = message.get("channel")
+        if isinstance(channel, bytes):
+            channel = channel.decode("utf-8")
+
+        if message_type == "subscribe":
+            confirmation = self._confirmations.get(channel)
+            if confirmation and not confirmation.done():
+                confirmation.set_result(None)
+            return
+        if message_type != "message":
+            return
+
+        data = message.get("data")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        self.stats["signals_received"] += 1
+        control = self._channels.get(channel)
+        if control is None or data not in CONTROL_SIGNALS:
+            # Arrived after the run unregistered, or not a control signal
+            self.stats["signals_unrouted"] += 1
+            return
+
+        self.stats["signals_routed"] += 1
+        control.signal = data
+        control.signal_event.set()
+        if data == "STOP" and not control.stop_event.is_set():
+            control.stop_received_at = time.monotonic()
+            logger.info(f"Received STOP signal for agent run {control.agent_run_id}")
+            control.stop_event.set()
+
+    async def _refresh_active_keys(self):
+        if time.monotonic() - self._last_refresh < ACTIVE_KEY_REFRESH_SECONDS:
+            return
+        self._last_refresh = time.monotonic()
+        if not self._runs:
+            return
+        try:
+            redis_client = await redis.get_client()
+            pipe = redis_client.pipeline()
+            for control in self._runs.values():
+                pipe.expire(control.active_key, redis.REDIS_KEY_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to refresh active run keys: {e}")
+        logger.debug(f"Run control plane: {self.get_stats()}")
+
+    async def _close_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    async def _reconnect(self):
+        async with self._lock:
+            if self._pubsub is None:
+                await self._open_pubsub()
+        self.stats["reconnects"] += 1
+        logger.info(f"Run control plane reconnected, resubscribed {len(self._channels)} channels")
+
+    async def _read_loop(self):
+        delay = 0.5
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._reconnect()
+                message = await self._pubsub.get_message(timeout=READ_TIMEOUT_SECONDS)
+                delay = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Signals published while disconnected are lost, as with per-run subscriptions
+                logger.warning(f"Run control plane connection failed, reconnecting in {delay}s: {e}")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+                continue
+
+            if message:
+                self._dispatch(message)
+            await self._refresh_active_keys()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stops = self.stats["stops_acknowledged"]
+        registered = self.stats["runs_registered"]
+        return dict(
+            self.stats,
+            active_runs=len(self._runs),
+            subscribed_channels=len(self._channels),
+            pubsub_connections=0 if self._pubsub is None else 1,
+            avg_stop_reaction_ms=round(self.stats["stop_reaction_ms"] / stops, 2) if stops else 0.0,
+            avg_subscribe_ms=round(self.stats["subscribe_ms"] / registered, 2) if registered else 0.0,
+        )
+
+
+run_control_plane = RunControlPlane()
@@ -0,0 +1,256 @@
+"""
+Per-process fan-out hub for viewers of agent runs (list transport).
+
+Every SSE viewer of an agent run used to open two pub/sub connections and
+re-read the Redis list on every notification, so N viewers of one run cost 2N
+connections and N LRANGEs per flush. The hub keeps one subscription per active
+run per API process:
+
+- A reader task subscribes to the run's response and control channels and does
+  one LRANGE from the last seen index per notification
+- New responses go into an in-memory ring buffer (STREAM_HUB_BUFFER_SIZE) and
+  are pushed to each viewer's bounded queue
+- A new viewer is served from the ring buffer; only entries older than the
+  buffer are read from Redis
+- A viewer that falls too far behind is dropped from the fan-out and catches up
+  from the buffer / Redis on its own, so one slow client never blocks the others
+- The subscription is closed when the last viewer leaves or a control signal
+  (STOP, END_STREAM, ERROR) arrives
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Set, Tuple
+
+from services import redis
+from services.response_publisher import CONTROL_SIGNALS, response_channel, response_list_key
+from utils.config import config
+from utils.logger import logger
+
+SUBSCRIBER_QUEUE_SIZE = 5000
+
+_CLOSED = object()
+
+
+class _Subscriber:
+    """A single viewer attached to a run channel."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.last_index = -1
+        self.lagging = False
+
+
+class _RunChannel:
+    """Shared subscription and ring buffer of a single agent run."""
+
+    def __init__(self, agent_run_id: str, buffer_size: int):
+        self.agent_run_id = agent_run_id
+        self.list_key = response_list_key(agent_run_id)
+        self.response_channel = response_channel(agent_run_id)
+        self.control_channel = f"agent_run:{agent_run_id}:control"
+        self.buffer: Deque[Tuple[int, str]] = deque(maxlen=buffer_size)
+        self.next_index = 0
+        self.subscribers: Set[_Subscriber] = set()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.control_signal: Optional[str] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class RunFanoutHub:
+    """Serves all viewers of a run in this process from one subscription."""
+
+    def __init__(self, buffer_size: Optional[int] = None):
+        """Initialize the hub.
+
+        Args:
+            buffer_size: Responses kept in memory per run
+        """
+        self.buffer_size = buffer_size or config.STREAM_HUB_BUFFER_SIZE
+        self._channels: Dict[str, _RunChannel] = {}
+        self.stats = {
+            "channels_opened": 0,
+            "subscribers_served": 0,
+            "list_reads": 0,
+            "backfill_reads": 0,
+            "responses_read": 0,
+            "responses_delivered": 0,
+            "lagging_subscribers": 0,
+        }
+
+    def _get_channel(self, agent_run_id: str) -> _RunChannel:
+        channel = self._channels.get(agent_run_id)
+        if channel is None or channel.closed:
+            channel = _RunChannel(agent_run_id, self.buffer_size)
+            self._channels[agent_run_id] = channel
+            channel.task = asyncio.create_task(self._run_channel(channel))
+            self.stats["channels_opened"] += 1
+            logger.debug(f"Opened fan-out channel for agent run {agent_run_id}")
+        return channel
+
+    async def _read_new(self, channel: _RunChannel):
+        """Read responses appended since the last read and fan them out."""
+        responses = await redis.lrange(channel.list_key, channel.next_index, -1)
+        self.stats["list_reads"] += 1
+        if not responses:
+            return
+        self.stats["responses_read"] += len(responses)
+        for response_json in responses:
+            item = (channel.next_index, response_json)
+            channel.next_index += 1
+            channel.buffer.append(item)
+            for subscriber in list(channel.subscribers):
+                if subscriber.lagging:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    # Stop pushing to this viewer; it catches up from the buffer once drained
+                    subscriber.lagging = True
+                    channel.subscribers.discard(subscriber)
+                    self.stats["lagging_subscribers"] += 1
+                    logger.warning(f"Viewer of agent run {channel.agent_run_id} fell behind, switching to catch-up reads")
+
+    async def _run_channel(self, channel: _RunChannel):
+        pubsub = None
+        try:
+            pubsub = await redis.create_pubsub()
+            await pubsub.subscribe(channel.response_channel, channel.control_channel)
+            # Subscribe before the first read so no notification is missed in between
+            await self._read_new(channel)
+            channel.ready.set()
+
+            async for message in pubsub.listen():
+                if not message or message.get("type") != "message":
+                    continue
+                data = message.get("data")
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                if message.get("channel") == channel.response_channel:
+                    await self._read_new(channel)
+                elif data in CONTROL_SIGNALS:
+                    logger.info(f"Received control signal '{data}' for {channel.agent_run_id}")
+                    # Pick up the final flush that preceded the signal
+                    await self._read_new(channel)
+                    channel.control_signal = data
+                    break
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Fan-out channel for agent run {channel.agent_run_id} failed: {e}", exc_info=True)
+            channel.error = str(e)
+        finally:
+            channel.closed = True
+            channel.ready.set()
+            for subscriber in list(channel.subscribers):
+                try:
+                    subscriber.queue.put_nowait(_CLOSED)
+                except asyncio.QueueFull:
+                    # Checked by the viewer once its queue is drained
+                    pass
+            if pubsub:
+                try:
+                    await pubsub.unsubscribe(channel.response_channel, channel.control_channel)
+                    await pubsub.close()
+                except Exception as e:
+                    logger.debug(f"Error closing fan-out pubsub for {channel.agent_run_id}: {e}")
+            if self._channels.get(channel.agent_run_id) is channel:
+                del self._channels[channel.agent_run_id]
+            logger.debug(f"Closed fan-out channel for agent run {channel.agent_run_id}")
+
+    async def _attach(self, channel: _RunChannel, subscriber: _Subscriber) -> List[Tuple[int, str]]:
+        """Register a viewer and return the responses it has not seen yet.
+
+        The buffer snapshot and the registration happen without an await in
+        between, so every later response is either in the snapshot or the queue.
+        """
+        from_index = subscriber.last_index + 1
+        snapshot = [item for item in channel.buffer if item[0] >= from_index]
+        first_buffered = snapshot[0][0] if snapshot else channel.next_index
+        subscriber.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber.lagging = False
+        if not channel.closed:
+            channel.subscribers.add(subscriber)
+
+        if first_buffered > from_index:
+            older = await redis.lrange(channel.list_key, from_index, first_buffered - 1)
+            self.stats["backfill_reads"] += 1
+            return list(enumerate(older, start=from_index)) + snapshot
+        return snapshot
+
+    def _detach(self, channel: _RunChannel, subscriber: _Subscriber):
+        channel.subscribers.discard(subscriber)
+        if not channel.subscribers and not channel.closed and channel.task:
+            # Unregister right away so a viewer arriving during teardown opens a fresh channel
+            if self._channels.get(channel.agent_run_id) is channel:
+                del self._channels[channel.agent_run_id]
+            channel.task.cancel()
+
+    async def subscribe(self, agent_run_id: str) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Follow the responses of an agent run.
+
+        Yields:
+            ("response", response_json) for every stored response in order,
+            ("replayed", None) once the responses stored so far were yielded,
+            then a final ("control", signal) or ("error", message)
+        """
+        channel = self._get_channel(agent_run_id)
+        subscriber = _Subscriber()
+        self.stats["subscribers_served"] += 1
+        try:
+            await channel.ready.wait()
+            if channel.error and channel.next_index == 0:
+                yield "error", channel.error
+                return
+
+            for index, response_json in await self._attach(channel, subscriber):
+                subscriber.last_index = index
+                yield "response", response_json
+            yield "replayed", None
+
+            while True:
+                if subscriber.queue.empty():
+                    if subscriber.lagging:
+                        for index, response_json in await self._attach(channel, subscriber):
+                            subscriber.last_index = index
+                            yield "response", response_json
+                        continue
+                    if channel.closed:
+                        break
+                item = await subscriber.queue.get()
+                if item is _CLOSED:
+                    break
+                index, response_json = item
+                if index <= subscriber.last_index:
+                    continue
+                subscriber.last_index = index
+                self.stats["responses_delivered"] += 1
+                yield "response", response_json
+
+            # Responses that arrived between the last fan-out and the close
+            for index, response_json in await self._attach(channel, subscriber):
+                subscriber.last_index = index
+                yield "response", response_json
+            if channel.control_signal:
+                yield "control", channel.control_signal
+            else:
+                yield "error", channel.error or "Stream subscription closed"
+        finally:
+            self._detach(channel, subscriber)
+
+    def get_stats(self) -> Dict[str, Any]:
+        subscribers_per_run = {run_id: len(channel.subscribers) for run_id, channel in self._channels.items()}
+        return dict(
+            self.stats,
+            active_runs=len(self._channels),
+            pubsub_connections=sum(1 for channel in self._channels.values() if not channel.closed),
+            subscribers=sum(subscribers_per_run.values()),
+            subscribers_per_run=subscribers_per_run,
+            buffered_responses=sum(len(channel.buffer) for channel in self._channels.values()),
+            redis_pool=redis.get_pool_stats(),
+        )
+
+
+run_hub = RunFanoutHub()
@@ -0,0 +1,246 @@
+"""
+Sampled, size-capped tracing on top of the Langfuse client.
+
+The agent loop used to call the Langfuse SDK directly: every tool emitted several
+events carrying full arguments and results, every LLM call sent the whole prompt
+to `generation.update`, and all of it was serialized on the event loop. This
+facade keeps the same calls (trace / span / generation / event / update / end)
+but:
+
+- Samples at the head: a trace is recorded with probability TRACING_SAMPLE_RATE,
+  unsampled traces (and a disabled Langfuse client) return a no-op handle
+- Caps payloads: long strings are truncated and tagged with a hash of the full
+  value, large lists and dicts are cut, deep nesting is flattened
+- Exports in the background: SDK calls run on one exporter thread fed by a
+  bounded queue; when the queue is full, calls are dropped and counted
+- Drops per-event tracing (`event`) unless TRACING_EVENTS_ENABLED, except for
+  WARNING/ERROR events; spans and generations keep their timing
+"""
+
+import atexit
+import dataclasses
+import hashlib
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from services.langfuse import enabled as langfuse_enabled, langfuse
+from utils.config import config
+from utils.logger import logger
+
+# Levels of events that are always recorded for sampled traces
+ALWAYS_RECORDED_LEVELS = ("WARNING", "ERROR")
+MAX_DEPTH = 6
+
+_STOP = object()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class TraceHandle:
+    """A trace, span or generation as seen by the caller.
+
+    The SDK object is created by the exporter thread. Operations on a handle are
+    exported in the order they were made, so the SDK object exists by the time
+    the handle's later operations run.
+    """
+
+    def __init__(self, tracer: "Tracer", sampled: bool = True):
+        self._tracer = tracer
+        self.sampled = sampled
+        self._client = None
+
+    def _bind(self, client):
+        self._client = client
+
+    def _child(self, factory: str, kwargs: Dict[str, Any]) -> "TraceHandle":
+        if not self.sampled:
+            return self
+        child = TraceHandle(self._tracer)
+        kwargs = self._tracer.sanitize_fields(kwargs)
+        kwargs.setdefault("start_time", _now())
+        self._tracer.submit(lambda: self._client and child._bind(getattr(self._client, factory)(**kwargs)))
+        return child
+
+    def span(self, **kwargs) -> "TraceHandle":
+        """Start a span (see StatefulClient.span); end it with `end`."""
+        return self._child("span", kwargs)
+
+    def generation(self, **kwargs) -> "TraceHandle":
+        """Start a generation (see StatefulClient.generation); end it with `end`."""
+        return self._child("generation", kwargs)
+
+    def event(self, **kwargs):
+        """Record an event, unless per-event tracing is switched off."""
+        if not self.sampled:
+            return
+        if not config.TRACING_EVENTS_ENABLED and kwargs.get("level") not in ALWAYS_RECORDED_LEVELS:
+            self._tracer.stats["events_suppressed"] += 1
+            return
+        kwargs = self._tracer.sanitize_fields(kwargs)
+        kwargs.setdefault("start_time", _now())
+        self._tracer.submit(lambda: self._client and self._client.event(**kwargs))
+
+    def update(self, **kwargs):
+        if not self.sampled:
+            return
+        kwargs = self._tracer.sanitize_fields(kwargs)
+        self._tracer.submit(lambda: self._client and self._client.update(**kwargs))
+
+    def end(self, **kwargs):
+        if not self.sampled:
+            return
+        kwargs = self._tracer.sanitize_fields(kwargs)
+        kwargs.setdefault("end_time", _now())
+        self._tracer.submit(lambda: self._client and self._client.end(**kwargs))
+
+
+class Tracer:
+    """Creates sampled traces and exports them from a background thread."""
+
+    # Keyword arguments that carry payloads and are size-capped
+    PAYLOAD_FIELDS = ("input", "output", "metadata", "status_message", "model_parameters")
+
+    def __init__(
+        self,
+        sample_rate: Optional[float] = None,
+        max_field_chars: Optional[int] = None,
+        max_items: Optional[int] = None,
+        queue_size: Optional[int] = None
+    ):
+        """Initialize the tracer.
+
+        Args:
+            sample_rate: Fraction of traces that are recorded (0.0 - 1.0)
+            max_field_chars: Strings longer than this are truncated
+            max_items: Items kept per list or dict
+            queue_size: Maximum SDK calls waiting for the exporter thread
+        """
+        self.enabled = langfuse_enabled
+        self.sample_rate = config.TRACING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_field_chars = max_field_chars or config.TRACING_MAX_FIELD_CHARS
+        self.max_items = max_items or config.TRACING_MAX_ITEMS
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size or config.TRACING_EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._noop = TraceHandle(self, sampled=False)
+        self.stats = {
+            "traces_sampled": 0,
+            "traces_unsampled": 0,
+            "events_suppressed": 0,
+            "fields_truncated": 0,
+            "exported": 0,
+            "dropped": 0,
+            "export_errors": 0,
+        }
+
+    def trace(self, **kwargs) -> TraceHandle:
+        """Start a trace (see Langfuse.trace), subject to head sampling."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            self.stats["traces_unsampled"] += 1
+            return self._noop
+        self.stats["traces_sampled"] += 1
+        handle = TraceHandle(self)
+        kwargs = self.sanitize_fields(kwargs)
+        self.submit(lambda: handle._bind(langfuse.trace(**kwargs)))
+        return handle
+
+    def sanitize_fields(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Cap the payload fields of SDK call arguments."""
+        return {
+            key: self.sanitize(value) if key in self.PAYLOAD_FIELDS else value
+            for key, value in kwargs.items()
+        }
+
+    def sanitize(self, value: Any, depth: int = 0) -> Any:
+        """Return a size-capped copy of a payload.
+
+        The copy shares no mutable containers with the original, so it can be
+        exported later even if the caller keeps modifying its objects.
+        """
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if isinstance(value, str):
+            if len(value) <= self.max_field_chars:
+                return value
+            self.stats["fields_truncated"] += 1
+            digest = hashlib.sha256(value.encode("utf-8", "replace")).hexdigest()[:16]
+            return f"{value[:self.max_field_chars]}... [truncated {len(value)} chars, sha256:{digest}]"
+        if depth >= MAX_DEPTH:
+            self.stats["fields_truncated"] += 1
+            return "[truncated: nested too deep]"
+        if isinstance(value, dict):
+            items = list(value.items())
+            capped = {str(key): self.sanitize(item, depth + 1) for key, item in items[:self.max_items]}
+            if len(items) > self.max_items:
+                self.stats["fields_truncated"] += 1
+                capped["..."] = f"[{len(items) - self.max_items} more keys]"
+            return capped
+        if isinstance(value, (list, tuple)):
+            capped = [self.sanitize(item, depth + 1) for item in value[:self.max_items]]
+            if len(value) > self.max_items:
+                self.stats["fields_truncated"] += 1
+                capped.append(f"[{len(value) - self.max_items} more items]")
+            return capped
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return self.sanitize(dataclasses.asdict(value), depth)
+        if hasattr(value, "model_dump"):
+            return self.sanitize(value.model_dump(), depth)
+        return self.sanitize(str(value), depth)
+
+    def submit(self, operation: Callable[[], Any]):
+        """Queue an SDK call for the exporter thread, dropping it if the queue is full."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(operation)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"Tracing export queue is full, dropped {self.stats['dropped']} calls so far")
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._export_loop, name="tracing-exporter", daemon=True)
+                self._thread.start()
+
+    def _export_loop(self):
+        while True:
+            operation = self._queue.get()
+            if operation is _STOP:
+                return
+            try:
+                operation()
+                self.stats["exported"] += 1
+            except Exception as e:
+                self.stats["export_errors"] += 1
+                logger.debug(f"Tracing export call failed: {e}")
+
+    def flush(self):
+        """Ask the exporter to flush the Langfuse client without blocking the caller."""
+        if self.enabled:
+            self.submit(langfuse.flush)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Export the queued calls and flush the Langfuse client."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            self._thread.join(timeout)
+            langfuse.flush()
+        except Exception as e:
+            logger.warning(f"Failed to shut down tracing exporter: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, queued=self._queue.qsize(), sample_rate=self.sample_rate)
+
+
+tracer = Tracer()
+atexit.register(tracer.shutdown)
@@ -0,0 +1,146 @@
+"""
+Compressed archive of agent run transcripts.
+
+The responses of a finished run stayed in Redis for 24 hours after the run,
+although the messages are persisted in the database and viewers only follow
+live runs. With TRANSCRIPT_ARCHIVE_ENABLED the worker instead:
+
+- Reads the run's response list (or stream) in pages, without decoding the
+  responses, and writes them as JSON lines into a zstd (when the `zstandard`
+  package is installed) or gzip compressed object
+- Uploads the object to Supabase storage (TRANSCRIPT_ARCHIVE_BUCKET) as
+  `{agent_run_id}.jsonl.zst` / `.jsonl.gz`
+- Shortens the Redis key's TTL to TRANSCRIPT_ARCHIVE_REDIS_GRACE_SECONDS once
+  the upload succeeded (0 deletes it), so late viewers can still finish reading
+
+A failed archive leaves the key with its regular TTL.
+"""
+
+import asyncio
+import gzip
+import time
+from typing import Any, Dict, List, Tuple
+
+from services import redis
+from services.response_publisher import response_list_key, response_stream_key, uses_stream_transport
+from services.supabase import DBConnection
+from utils.config import config
+from utils.logger import logger
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+PAGE_SIZE = 1000
+
+
+def _compress(lines: List[str], compression: str) -> bytes:
+    data = ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=config.TRANSCRIPT_ARCHIVE_COMPRESSION_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=min(config.TRANSCRIPT_ARCHIVE_COMPRESSION_LEVEL, 9))
+
+
+class TranscriptArchiver:
+    """Moves the responses of finished runs from Redis to compressed objects in storage."""
+
+    def __init__(self):
+        self.enabled = config.TRANSCRIPT_ARCHIVE_ENABLED
+        self.bucket = config.TRANSCRIPT_ARCHIVE_BUCKET
+        self.compression = "zstd" if ZSTD_AVAILABLE and config.TRANSCRIPT_ARCHIVE_COMPRESSION == "zstd" else "gzip"
+        self.grace_seconds = config.TRANSCRIPT_ARCHIVE_REDIS_GRACE_SECONDS
+        self.stats = {
+            "archived": 0,
+            "failed": 0,
+            "responses": 0,
+            "raw_bytes": 0,
+            "compressed_bytes": 0,
+            "total_ms": 0.0,
+        }
+
+    def object_path(self, agent_run_id: str) -> str:
+        return f"{agent_run_id}.jsonl.{'zst' if self.compression == 'zstd' else 'gz'}"
+
+    async def _read_responses(self, agent_run_id: str) -> Tuple[str, List[str]]:
+        """Read the stored responses page by page, still serialized."""
+        redis_client = await redis.get_client()
+        lines: List[str] = []
+        if uses_stream_transport():
+            key = response_stream_key(agent_run_id)
+            start = "-"
+            while True:
+                entries = await redis_client.xrange(key, min=start, count=PAGE_SIZE)
+                # Control entries have no data; the run status lives in the database
+                lines.extend(fields["data"] for _, fields in entries if "data" in fields)
+                if len(entries) < PAGE_SIZE:
+                    return key, lines
+                start = f"({entries[-1][0]}"
+
+        key = response_list_key(agent_run_id)
+        while True:
+            page = await redis_client.lrange(key, len(lines), len(lines) + PAGE_SIZE - 1)
+            lines.extend(page)
+            if len(page) < PAGE_SIZE:
+                return key, lines
+
+    async def archive(self, agent_run_id: str, expected_responses: int) -> bool:
+        """Archive the responses of a finished run and trim its Redis key.
+
+        Args:
+            agent_run_id: The finished run
+            expected_responses: Responses the run published; nothing is read when 0
+
+        Returns:
+            True if the transcript was uploaded
+        """
+        if not self.enabled or expected_responses <= 0:
+            return False
+        start = time.monotonic()
+        try:
+            key, lines = await self._read_responses(agent_run_id)
+            if len(lines) < expected_responses:
+                logger.warning(f"Archiving {len(lines)} of {expected_responses} responses of {agent_run_id}; the rest were not stored")
+            raw_bytes = sum(len(line) for line in lines)
+            compressed = await asyncio.to_thread(_compress, lines, self.compression)
+
+            client = await DBConnection().client
+            content_type = "application/zstd" if self.compression == "zstd" else "application/gzip"
+            await client.storage.from_(self.bucket).upload(
+                self.object_path(agent_run_id),
+                compressed,
+                {"content-type": content_type, "upsert": "true"}
+            )
+
+            if self.grace_seconds > 0:
+                await redis.expire(key, self.grace_seconds)
+            else:
+                await redis.delete(key)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"Failed to archive transcript of {agent_run_id}, keeping it in Redis: {e}")
+            return False
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        self.stats["archived"] += 1
+        self.stats["responses"] += len(lines)
+        self.stats["raw_bytes"] += raw_bytes
+        self.stats["compressed_bytes"] += len(compressed)
+        self.stats["total_ms"] += elapsed_ms
+        logger.info(
+            f"Archived {len(lines)} responses of {agent_run_id} to {self.bucket}/{self.object_path(agent_run_id)}: "
+            f"{raw_bytes} -> {len(compressed)} bytes ({self.compression}) in {elapsed_ms:.0f}ms"
+        )
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        raw_bytes = self.stats["raw_bytes"]
+        return dict(
+            self.stats,
+            compression=self.compression,
+            ratio=round(self.stats["compressed_bytes"] / raw_bytes, 3) if raw_bytes else 0.0,
+        )
+
+
+transcript_archiver = TranscriptArchiver()
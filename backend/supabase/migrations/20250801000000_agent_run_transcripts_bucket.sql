@@ -0,0 +1,5 @@
+-- Private bucket for compressed agent run transcripts (TRANSCRIPT_ARCHIVE_ENABLED).
+-- Written by the worker with the service role; no client access policies.
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('agent-run-transcripts', 'agent-run-transcripts', false)
+ON CONFLICT (id) DO NOTHING;
@@ -129,10 +129,10 @@ class SessionManager:
         client = await self._db.client
         
         try:
-            from sandbox.sandbox import create_sandbox, delete_sandbox
+            from sandbox.pool import acquire_sandbox
+            from sandbox.sandbox import delete_sandbox
             
-            sandbox_pass = str(uuid.uuid4())
-            sandbox = await create_sandbox(sandbox_pass, project_id)
+            sandbox, sandbox_pass = await acquire_sandbox(project_id)
             sandbox_id = sandbox.id
             
             vnc_link = await sandbox.get_preview_link(6080)
@@ -267,6 +267,86 @@ class Configuration:
     # API Keys system configuration
     API_KEY_SECRET: str = "default-secret-key-change-in-production"
     API_KEY_LAST_USED_THROTTLE_SECONDS: int = 900
+
+    # Mirror per-thread LLM message cache into Redis so new workers skip the full reload
+    THREAD_MESSAGE_CACHE_REDIS: bool = False
+    # Incremental fetches re-read this far below the high-water mark; covers rows whose
+    # created_at (worker clock or DB now()) lands behind rows that were already read
+    THREAD_MESSAGE_CACHE_SKEW_SECONDS: int = 60
+
+    # Agent run response publishing: coalesce streamed responses into one Redis pipeline per flush
+    RESPONSE_FLUSH_INTERVAL_MS: int = 50
+    RESPONSE_FLUSH_MAX_ITEMS: int = 100
+    RESPONSE_MAX_PENDING_ITEMS: int = 2000
+    # "list" (Redis list + pub/sub notifications) or "stream" (Redis Streams with resumable cursors)
+    AGENT_RUN_TRANSPORT: str = "list"
+    RESPONSE_STREAM_MAXLEN: int = 20000
+    # Serve all viewers of a run in an API process from one subscription (list transport)
+    STREAM_HUB_ENABLED: bool = True
+    STREAM_HUB_BUFFER_SIZE: int = 2000
+    # Write-behind persistence of run messages: client-side IDs, bulk inserts per flush
+    MESSAGE_WRITE_BEHIND: bool = True
+    MESSAGE_FLUSH_INTERVAL_MS: int = 100
+    MESSAGE_FLUSH_MAX_ITEMS: int = 50
+    # Tool execution limits (per worker); tools can override them in @openapi_schema
+    TOOL_DEFAULT_TIMEOUT_SECONDS: int = 900
+    TOOL_MAX_CONCURRENCY_PER_TOOL: int = 16
+    TOOL_MAX_CONCURRENCY_PER_SANDBOX: int = 4
+    # Result cache of tools marked @cacheable (per account)
+    TOOL_RESULT_CACHE_ENABLED: bool = True
+    TOOL_RESULT_CACHE_MAX_ENTRIES: int = 1024
+    TOOL_RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TOOL_RESULT_CACHE_MAX_RESULT_BYTES: int = 1024 * 1024
+    TOOL_RESULT_CACHE_MCP_TTL_SECONDS: int = 300
+    # Langfuse tracing: head sampling, payload caps and per-event tracing on hot paths
+    TRACING_SAMPLE_RATE: float = 1.0
+    TRACING_EVENTS_ENABLED: bool = False
+    TRACING_MAX_FIELD_CHARS: int = 2000
+    TRACING_MAX_ITEMS: int = 50
+    TRACING_EXPORT_QUEUE_SIZE: int = 10000
+    # Coalescing of streamed assistant content (window 0 = one chunk per delta)
+    STREAM_COALESCE_WINDOW_MS: int = 50
+    STREAM_COALESCE_MAX_CHARS: int = 2048
+    # Pooled HTTP connections to LLM providers (HTTP/2 needs the h2 package)
+    LLM_HTTP_POOL_ENABLED: bool = True
+    LLM_HTTP2_ENABLED: bool = True
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS: int = 120
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: int = 10
+    LLM_HTTP_READ_TIMEOUT_SECONDS: int = 600
+
+    # Archive finished run transcripts to storage (zstd needs the zstandard package, else gzip) and trim Redis
+    TRANSCRIPT_ARCHIVE_ENABLED: bool = False
+    TRANSCRIPT_ARCHIVE_BUCKET: str = "agent-run-transcripts"
+    TRANSCRIPT_ARCHIVE_COMPRESSION: str = "zstd"
+    TRANSCRIPT_ARCHIVE_COMPRESSION_LEVEL: int = 6
+    TRANSCRIPT_ARCHIVE_REDIS_GRACE_SECONDS: int = 300
+
+    # LLM request limits shared by the workers, e.g. LLM_RATE_LIMITS="anthropic=50,openrouter=200" (requests/minute)
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_RATE_LIMITS: Optional[str] = None
+    LLM_RATE_LIMIT_BURST: int = 5
+    LLM_RATE_LIMIT_MAX_WAIT_SECONDS: float = 60.0
+    LLM_RATE_LIMIT_MAX_RETRIES: int = 4
+
+    # Start the OpenRouter fallback when the first streamed token takes longer than this
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_TTFT_SECONDS: float = 10.0
+
+    # Sandboxes: "daytona" or "local" (process stand-in for tests); pre-created sandboxes for new projects
+    SANDBOX_PROVIDER: str = "daytona"
+    SANDBOX_LOCAL_ROOT: Optional[str] = None
+    SANDBOX_POOL_ENABLED: bool = False
+    SANDBOX_POOL_SIZE: int = 3
+    # Below Daytona's 15 minute auto-stop, so pooled sandboxes are still running when claimed
+    SANDBOX_POOL_MAX_IDLE_SECONDS: int = 600
+    SANDBOX_POOL_REFILL_INTERVAL_SECONDS: int = 30
+    # Reuse a started sandbox across runs of a project in the same process for this long
+    SANDBOX_HANDLE_CACHE_TTL_SECONDS: int = 60
+    # Call the sandbox browser API over HTTP instead of curl over exec; BROWSER_API_URL overrides the preview URL
+    BROWSER_CHANNEL_ENABLED: bool = True
+    BROWSER_API_URL: Optional[str] = None
     
     # Agent execution limits (can be overridden via environment variable)
     _MAX_PARALLEL_AGENT_RUNS_ENV: Optional[str] = None
@@ -338,6 +418,12 @@ class Configuration:
                         setattr(self, key, int(env_val))
                     except ValueError:
                         logger.warning(f"Invalid value for {key}: {env_val}, using default")
+                elif expected_type == float:
+                    # Handle float conversion
+                    try:
+                        setattr(self, key, float(env_val))
+                    except ValueError:
+                        logger.warning(f"Invalid value for {key}: {env_val}, using default")
                 elif expected_type == EnvMode:
                     # Already handled for ENV_MODE
                     pass
@@ -8,6 +8,13 @@ MODELS = {
             "input_cost_per_million_tokens": 3.00,
             "output_cost_per_million_tokens": 15.00
         },
+        "capabilities": {
+            "context_window": 200_000,
+            "max_output_tokens": 64_000,
+            "default_max_tokens": 8_192,
+            "supports_prompt_caching": True,
+            "tokenizer": "claude"
+        },
         "tier_availability": ["free", "paid"]
     },
     # "openrouter/deepseek/deepseek-chat": {
@@ -48,6 +55,13 @@ MODELS = {
             "input_cost_per_million_tokens": 1.00,
             "output_cost_per_million_tokens": 3.00
         },
+        "capabilities": {
+            "context_window": 131_072,
+            "max_output_tokens": 16_384,
+            "default_max_tokens": 8_192,
+            "supports_prompt_caching": False,
+            "tokenizer": "kimi"
+        },
         "tier_availability": ["free", "paid"]
     },
     "xai/grok-4": {
@@ -56,6 +70,13 @@ MODELS = {
             "input_cost_per_million_tokens": 5.00,
             "output_cost_per_million_tokens": 15.00
         },
+        "capabilities": {
+            "context_window": 256_000,
+            "max_output_tokens": 64_000,
+            "default_max_tokens": None,
+            "supports_prompt_caching": False,
+            "tokenizer": "grok"
+        },
         "tier_availability": ["paid"]
     },
     
@@ -66,6 +87,13 @@ MODELS = {
             "input_cost_per_million_tokens": 1.25,
             "output_cost_per_million_tokens": 10.00
         },
+        "capabilities": {
+            "context_window": 1_048_576,
+            "max_output_tokens": 65_536,
+            "default_max_tokens": 64_000,
+            "supports_prompt_caching": False,
+            "tokenizer": "gemini"
+        },
         "tier_availability": ["paid"]
     },
     "openai/gpt-4o": {
@@ -74,6 +102,13 @@ MODELS = {
             "input_cost_per_million_tokens": 2.50,
             "output_cost_per_million_tokens": 10.00
         },
+        "capabilities": {
+            "context_window": 128_000,
+            "max_output_tokens": 16_384,
+            "default_max_tokens": 4_096,
+            "supports_prompt_caching": False,
+            "tokenizer": "o200k"
+        },
         "tier_availability": ["paid"]
     },
     "openai/gpt-4.1": {
@@ -82,6 +117,13 @@ MODELS = {
             "input_cost_per_million_tokens": 15.00,
             "output_cost_per_million_tokens": 60.00
         },
+        "capabilities": {
+            "context_window": 1_047_576,
+            "max_output_tokens": 32_768,
+            "default_max_tokens": 4_096,
+            "supports_prompt_caching": False,
+            "tokenizer": "o200k"
+        },
         "tier_availability": ["paid"]
     },
     "openai/gpt-5": {
@@ -90,6 +132,13 @@ MODELS = {
             "input_cost_per_million_tokens": 1.25,
             "output_cost_per_million_tokens": 10.00
         },
+        "capabilities": {
+            "context_window": 400_000,
+            "max_output_tokens": 128_000,
+            "default_max_tokens": None,
+            "supports_prompt_caching": False,
+            "tokenizer": "o200k"
+        },
         "tier_availability": ["paid"]
     },
     "openai/gpt-5-mini": {
@@ -98,6 +147,13 @@ MODELS = {
             "input_cost_per_million_tokens": 0.25,
             "output_cost_per_million_tokens": 2.00
         },
+        "capabilities": {
+            "context_window": 400_000,
+            "max_output_tokens": 128_000,
+            "default_max_tokens": None,
+            "supports_prompt_caching": False,
+            "tokenizer": "o200k"
+        },
         "tier_availability": ["paid"]
     },
     "openai/gpt-4.1-mini": {
@@ -106,6 +162,13 @@ MODELS = {
             "input_cost_per_million_tokens": 1.50,
             "output_cost_per_million_tokens": 6.00
         },
+        "capabilities": {
+            "context_window": 1_047_576,
+            "max_output_tokens": 32_768,
+            "default_max_tokens": 4_096,
+            "supports_prompt_caching": False,
+            "tokenizer": "o200k"
+        },
         "tier_availability": ["paid"]
     },
     "anthropic/claude-3-7-sonnet-latest": {
@@ -114,6 +177,13 @@ MODELS = {
             "input_cost_per_million_tokens": 3.00,
             "output_cost_per_million_tokens": 15.00
         },
+        "capabilities": {
+            "context_window": 200_000,
+            "max_output_tokens": 64_000,
+            "default_max_tokens": 8_192,
+            "supports_prompt_caching": True,
+            "tokenizer": "claude"
+        },
         "tier_availability": ["paid"]
     },
     "anthropic/claude-3-5-sonnet-latest": {
@@ -122,6 +192,13 @@ MODELS = {
             "input_cost_per_million_tokens": 3.00,
             "output_cost_per_million_tokens": 15.00
         },
+        "capabilities": {
+            "context_window": 200_000,
+            "max_output_tokens": 8_192,
+            "default_max_tokens": 8_192,
+            "supports_prompt_caching": True,
+            "tokenizer": "claude"
+        },
         "tier_availability": ["paid"]
     },   
 }
@@ -140,6 +217,9 @@ def _generate_model_structures():
     # Generate pricing
     pricing = {}
     
+    # Generate capabilities
+    capabilities = {}
+    
     for model_name, config in MODELS.items():
         # Add to tier lists
         if "free" in config["tier_availability"]:
@@ -154,6 +234,10 @@ def _generate_model_structures():
         # Add pricing
         pricing[model_name] = config["pricing"]
         
+        # Add capabilities
+        if "capabilities" in config:
+            capabilities[model_name] = config["capabilities"]
+        
         # Also add pricing for legacy model name variations
         if model_name.startswith("openrouter/deepseek/"):
             legacy_name = model_name.replace("openrouter/", "")
@@ -173,10 +257,10 @@ def _generate_model_structures():
             openrouter_name = model_name.replace("xai/", "openrouter/x-ai/")
             pricing[openrouter_name] = config["pricing"]
     
-    return free_models, paid_models, aliases, pricing
+    return free_models, paid_models, aliases, pricing, capabilities
 
 # Generate all structures
-FREE_TIER_MODELS, PAID_TIER_MODELS, MODEL_NAME_ALIASES, HARDCODED_MODEL_PRICES = _generate_model_structures()
+FREE_TIER_MODELS, PAID_TIER_MODELS, MODEL_NAME_ALIASES, HARDCODED_MODEL_PRICES, MODEL_CAPABILITIES = _generate_model_structures()
 
 MODEL_ACCESS_TIERS = {
     "free": FREE_TIER_MODELS,
@@ -1,40 +1,279 @@
 import structlog, logging, os
+import atexit
+import json
+import queue
+import random
+import sys
+import threading
+import time
 
 ENV_MODE = os.getenv("ENV_MODE", "LOCAL")
 
-# Set default logging level based on environment
-if ENV_MODE.upper() == "PRODUCTION":
-    default_level = "DEBUG"
-else:
-    default_level = "INFO"
+# INFO in every environment (production used to default to DEBUG); set
+# LOGGING_LEVEL or LOGGING_MODULE_LEVELS to debug
+default_level = "INFO"
 
 LOGGING_LEVEL = logging.getLevelNamesMapping().get(
-    os.getenv("LOGGING_LEVEL", default_level).upper(), 
-    logging.DEBUG if ENV_MODE.upper() == "PRODUCTION" else logging.INFO
+    os.getenv("LOGGING_LEVEL", default_level).upper(),
+    logging.INFO
 )
 
-renderer = [structlog.processors.JSONRenderer()]
-# if ENV_MODE.lower() == "local".lower() or ENV_MODE.lower() == "staging".lower():
-#     renderer = [structlog.dev.ConsoleRenderer()]
+# "async" renders and writes logs on a background thread, "sync" renders them in
+# the calling thread with callsite parameters on every event (previous behaviour)
+LOGGING_MODE = os.getenv("LOGGING_MODE", "async").lower()
 
-structlog.configure(
-    processors=[
-        structlog.stdlib.add_log_level,
+# Per-module levels, e.g. "agentpress.response_processor=WARNING,services.redis=DEBUG"
+LOGGING_MODULE_LEVELS = {
+    module.strip(): logging.getLevelNamesMapping().get(level.strip().upper(), LOGGING_LEVEL)
+    for module, _, level in (
+        item.partition("=") for item in os.getenv("LOGGING_MODULE_LEVELS", "").split(",") if "=" in item
+    )
+}
+
+# Debug logs: fraction kept, and maximum per second (0 = unlimited)
+LOGGING_DEBUG_SAMPLE_RATE = float(os.getenv("LOGGING_DEBUG_SAMPLE_RATE", "1.0"))
+LOGGING_DEBUG_RATE_LIMIT = int(os.getenv("LOGGING_DEBUG_RATE_LIMIT", "0"))
+
+# String values longer than this are truncated before rendering (0 = never)
+LOGGING_MAX_VALUE_CHARS = int(os.getenv("LOGGING_MAX_VALUE_CHARS", "4000"))
+
+LOGGING_QUEUE_SIZE = 10000
+
+_callsite_adder = structlog.processors.CallsiteParameterAdder(
+    {
+        structlog.processors.CallsiteParameter.FILENAME,
+        structlog.processors.CallsiteParameter.FUNC_NAME,
+        structlog.processors.CallsiteParameter.LINENO,
+    },
+    additional_ignores=[__name__],
+)
+
+
+def _add_callsite_for_warnings(logger, method_name, event_dict):
+    """Inspect the calling frame only for WARNING and above."""
+    if method_name in ("warning", "warn", "error", "exception", "critical", "fatal"):
+        return _callsite_adder(logger, method_name, event_dict)
+    return event_dict
+
+
+_module_levels = {}  # module name -> effective level
+
+
+def _module_level(module: str) -> int:
+    level = _module_levels.get(module)
+    if level is None:
+        level = LOGGING_LEVEL
+        matched = ""
+        for prefix, prefix_level in LOGGING_MODULE_LEVELS.items():
+            if (module == prefix or module.startswith(prefix + ".")) and len(prefix) > len(matched):
+                matched, level = prefix, prefix_level
+        _module_levels[module] = level
+    return level
+
+
+def _filter_by_module(logger, method_name, event_dict):
+    """Apply LOGGING_MODULE_LEVELS to the module that made the call."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith("structlog") and module != __name__:
+            break
+        frame = frame.f_back
+    level = logging.ERROR if method_name == "exception" else logging.getLevelNamesMapping().get(method_name.upper(), logging.INFO)
+    if frame is not None and level < _module_level(module):
+        raise structlog.DropEvent
+    return event_dict
+
+
+class _DebugLimiter:
+    """Samples and rate-limits debug events; the next kept one reports the suppressed count."""
+
+    def __init__(self, sample_rate: float, per_second: int):
+        self.sample_rate = sample_rate
+        self.per_second = per_second
+        self.window_start = 0.0
+        self.window_count = 0
+        self.suppressed = 0
+
+    def __call__(self, logger, method_name, event_dict):
+        if method_name != "debug":
+            return event_dict
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.suppressed += 1
+            raise structlog.DropEvent
+        if self.per_second:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            self.window_count += 1
+            if self.window_count > self.per_second:
+                self.suppressed += 1
+                raise structlog.DropEvent
+        if self.suppressed:
+            event_dict["suppressed_debug_logs"] = self.suppressed
+            self.suppressed = 0
+        return event_dict
+
+
+def _truncate_values(logger, method_name, event_dict):
+    for key, value in event_dict.items():
+        if isinstance(value, (dict, list)):
+            # Containers (e.g. tool arguments) are only serialized here, never in the caller
+            value = json.dumps(value, default=str)
+            if len(value) <= LOGGING_MAX_VALUE_CHARS:
+                continue
+        if isinstance(value, str) and len(value) > LOGGING_MAX_VALUE_CHARS:
+            event_dict[key] = f"{value[:LOGGING_MAX_VALUE_CHARS]}... [truncated {len(value)} chars]"
+    return event_dict
+
+
+class _QueueWriter:
+    """Renders queued events and writes them to a stream on a background thread."""
+
+    def __init__(self, render_processors, file=None, maxsize: int = LOGGING_QUEUE_SIZE):
+        self.render_processors = render_processors
+        self.file = file
+        self.maxsize = maxsize
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # A forked child has the queue but not the thread; start over
+        self.queue = queue.Queue(maxsize=self.maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, event_dict):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self.thread.start()
+        # Blocks when the writer falls behind instead of dropping logs
+        self.queue.put(event_dict)
+
+    def _render(self, event_dict) -> str:
+        method_name = event_dict.get("level", "info")
+        try:
+            for processor in self.render_processors:
+                event_dict = processor(None, method_name, event_dict)
+            return event_dict
+        except Exception as e:
+            return repr({"event": str(event_dict.get("event")), "level": method_name, "render_error": str(e)})
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Write everything that queued up meanwhile in one call
+            while len(batch) < 500:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [self._render(event_dict) for event_dict in batch if event_dict is not None]
+            if lines:
+                try:
+                    file = self.file or sys.stdout
+                    file.write("\n".join(lines) + "\n")
+                    file.flush()
+                except Exception:
+                    pass
+            if stop:
+                return
+
+    def close(self, timeout: float = 5.0):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+
+class _QueueLogger:
+    """structlog logger that hands the processed event to the writer thread."""
+
+    def __init__(self, writer: _QueueWriter):
+        self._writer = writer
+
+    def msg(self, event_dict):
+        self._writer.put(event_dict)
+
+    debug = info = warning = warn = error = critical = exception = fatal = log = msg
+
+
+def _enqueue(logger, method_name, event_dict):
+    # Passed unrendered to _QueueLogger.msg
+    return (event_dict,), {}
+
+
+def configure_logging(mode: str = LOGGING_MODE, file=None):
+    """Configure structlog for the "sync" or "async" logging mode.
+
+    Args:
+        mode: "async" renders and writes on a background thread, "sync" in the caller
+        file: Output stream (default stdout)
+    """
+    renderer = [structlog.processors.JSONRenderer()]
+    # if ENV_MODE.lower() == "local".lower() or ENV_MODE.lower() == "staging".lower():
+    #     renderer = [structlog.dev.ConsoleRenderer()]
+
+    min_level = min([LOGGING_LEVEL, *LOGGING_MODULE_LEVELS.values()])
+    wrapper_class = structlog.make_filtering_bound_logger(min_level)
+
+    if mode != "async":
+        # The wrapper level is the lowest module level, so the module filter is needed here too
+        module_filter = [_filter_by_module] if LOGGING_MODULE_LEVELS else []
+        truncate = [_truncate_values] if LOGGING_MAX_VALUE_CHARS else []
+        structlog.configure(
+            processors=[
+                structlog.stdlib.add_log_level,
+                *module_filter,
+                structlog.stdlib.PositionalArgumentsFormatter(),
+                structlog.processors.dict_tracebacks,
+                structlog.processors.CallsiteParameterAdder(
+                    {
+                        structlog.processors.CallsiteParameter.FILENAME,
+                        structlog.processors.CallsiteParameter.FUNC_NAME,
+                        structlog.processors.CallsiteParameter.LINENO,
+                    }
+                ),
+                structlog.processors.TimeStamper(fmt="iso"),
+                structlog.contextvars.merge_contextvars,
+                *truncate,
+                *renderer,
+            ],
+            logger_factory=structlog.PrintLoggerFactory(file),
+            cache_logger_on_first_use=True,
+            wrapper_class=wrapper_class,
+        )
+        return
+
+    # Everything that needs the caller's context (level filters, context vars,
+    # exception info, callsite) runs in the caller; rendering runs on the writer
+    processors = [structlog.stdlib.add_log_level]
+    if LOGGING_MODULE_LEVELS:
+        processors.append(_filter_by_module)
+    if LOGGING_DEBUG_SAMPLE_RATE < 1.0 or LOGGING_DEBUG_RATE_LIMIT:
+        processors.append(_DebugLimiter(LOGGING_DEBUG_SAMPLE_RATE, LOGGING_DEBUG_RATE_LIMIT))
+    processors += [
         structlog.stdlib.PositionalArgumentsFormatter(),
         structlog.processors.dict_tracebacks,
-        structlog.processors.CallsiteParameterAdder(
-            {
-                structlog.processors.CallsiteParameter.FILENAME,
-                structlog.processors.CallsiteParameter.FUNC_NAME,
-                structlog.processors.CallsiteParameter.LINENO,
-            }
-        ),
+        _add_callsite_for_warnings,
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.contextvars.merge_contextvars,
-        *renderer,
-    ],
-    cache_logger_on_first_use=True,
-    wrapper_class=structlog.make_filtering_bound_logger(LOGGING_LEVEL),
-)
+        _enqueue,
+    ]
+    render_processors = [_truncate_values, *renderer] if LOGGING_MAX_VALUE_CHARS else renderer
+    writer = _QueueWriter(render_processors, file)
+    atexit.register(writer.close)
+
+    structlog.configure(
+        processors=processors,
+        logger_factory=lambda *args: _QueueLogger(writer),
+        cache_logger_on_first_use=True,
+        wrapper_class=wrapper_class,
+    )
+
+
+configure_logging()
 
 logger: structlog.stdlib.BoundLogger = structlog.get_logger()
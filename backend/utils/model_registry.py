@@ -0,0 +1,180 @@
+"""
+Model capability registry.
+
+Resolves any model name used in the backend (canonical names, aliases, OpenRouter
+and Bedrock variants) to the capabilities declared in `utils.constants.MODELS`:
+context window, maximum output tokens, prompt caching support and tokenizer
+family. Models that are not declared fall back to litellm's model map and
+finally to conservative per-family defaults.
+
+Consumers:
+- ContextManager derives its compression budget from the context window
+- services.llm.prepare_params clamps max_tokens and decides on prompt caching
+- services.billing.get_model_pricing resolves pricing through the same lookup
+- TokenCountCache shares per-message counts across models with the same tokenizer
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import litellm
+from utils.constants import HARDCODED_MODEL_PRICES, MODEL_CAPABILITIES, MODEL_NAME_ALIASES
+from utils.logger import logger
+
+# Share of the context window kept free for tool schemas and token count drift
+CONTEXT_SAFETY_MARGIN = 0.1
+
+# Output reservation used when neither the caller nor the registry sets max_tokens
+DEFAULT_OUTPUT_RESERVATION = 8192
+
+# (substring, context_window, max_output_tokens, default_max_tokens, supports_prompt_caching, tokenizer)
+# Checked in order against models that are not declared in MODELS.
+_FAMILY_DEFAULTS = [
+    ("claude", 200_000, 8192, 8192, True, "claude"),
+    ("anthropic", 200_000, 8192, 8192, True, "claude"),
+    ("gemini", 1_048_576, 65_536, None, False, "gemini"),
+    ("gpt-5", 400_000, 128_000, None, False, "o200k"),
+    ("gpt-4.1", 1_047_576, 32_768, 4096, False, "o200k"),
+    ("gpt-4", 128_000, 16_384, 4096, False, "o200k"),
+    ("gpt", 128_000, 16_384, None, False, "o200k"),
+    ("grok", 256_000, 64_000, None, False, "grok"),
+    ("kimi", 131_072, 16_384, 8192, False, "kimi"),
+    ("deepseek", 128_000, 8192, None, False, "deepseek"),
+    ("qwen", 131_072, 8192, None, False, "qwen"),
+]
+
+_UNKNOWN_MODEL = (32_768, 4096, None, False, "default")
+
+_PROVIDER_PREFIXES = ("openrouter/", "bedrock/", "anthropic/", "openai/", "gemini/", "xai/", "x-ai/", "google/", "moonshotai/")
+
+
+@dataclass(frozen=True)
+class ModelCapabilities:
+    """Capabilities of a single model."""
+    model: str
+    context_window: int
+    max_output_tokens: Optional[int]
+    default_max_tokens: Optional[int]
+    supports_prompt_caching: bool
+    tokenizer: str
+    source: str  # "registry", "litellm" or "default"
+
+    def input_budget(self, max_tokens: Optional[int] = None) -> int:
+        """Tokens available for the prompt after reserving room for the response.
+
+        Args:
+            max_tokens: Configured llm_max_tokens for the call, if any
+        """
+        output_reservation = max_tokens or self.default_max_tokens or min(
+            self.max_output_tokens or DEFAULT_OUTPUT_RESERVATION, DEFAULT_OUTPUT_RESERVATION
+        )
+        if self.max_output_tokens:
+            output_reservation = min(output_reservation, self.max_output_tokens)
+        margin = int(self.context_window * CONTEXT_SAFETY_MARGIN)
+        return max(self.context_window - output_reservation - margin, self.context_window // 4)
+
+
+def _name_variants(model_name: str):
+    """Yield the name itself, its alias target and names with provider prefixes stripped."""
+    yield model_name
+    if model_name in MODEL_NAME_ALIASES:
+        yield MODEL_NAME_ALIASES[model_name]
+    stripped = model_name
+    while stripped.startswith(_PROVIDER_PREFIXES):
+        stripped = stripped.split("/", 1)[1]
+        yield stripped
+        if stripped in MODEL_NAME_ALIASES:
+            yield MODEL_NAME_ALIASES[stripped]
+
+
+def resolve_model_name(model_name: str) -> Optional[str]:
+    """Resolve a model name to its canonical entry in MODELS, if declared."""
+    for name in _name_variants(model_name):
+        if name in MODEL_CAPABILITIES:
+            return name
+    return None
+
+
+def _from_litellm(model_name: str) -> Optional[Tuple[int, Optional[int], bool]]:
+    try:
+        info = litellm.get_model_info(model_name)
+    except Exception:
+        return None
+    context_window = info.get("max_input_tokens") or info.get("max_tokens")
+    if not context_window:
+        return None
+    return context_window, info.get("max_output_tokens"), bool(info.get("supports_prompt_caching"))
+
+
+def _family_defaults(model_name: str) -> Tuple[int, int, Optional[int], bool, str]:
+    lowered = model_name.lower()
+    for substring, *defaults in _FAMILY_DEFAULTS:
+        if substring in lowered:
+            return tuple(defaults)
+    return _UNKNOWN_MODEL
+
+
+@lru_cache(maxsize=512)
+def get_model_capabilities(model_name: str) -> ModelCapabilities:
+    """Look up the capabilities of a model.
+
+    Args:
+        model_name: Any model name accepted by the backend
+
+    Returns:
+        ModelCapabilities from the registry, litellm's model map or family defaults
+    """
+    canonical = resolve_model_name(model_name)
+    if canonical:
+        caps = MODEL_CAPABILITIES[canonical]
+        return ModelCapabilities(
+            model=canonical,
+            context_window=caps["context_window"],
+            max_output_tokens=caps.get("max_output_tokens"),
+            default_max_tokens=caps.get("default_max_tokens"),
+            supports_prompt_caching=caps.get("supports_prompt_caching", False),
+            tokenizer=caps.get("tokenizer", "default"),
+            source="registry",
+        )
+
+    family_window, family_output, family_max_tokens, family_caching, tokenizer = _family_defaults(model_name)
+    from_litellm = _from_litellm(model_name)
+    if from_litellm:
+        context_window, max_output, caching = from_litellm
+        return ModelCapabilities(
+            model=model_name,
+            context_window=context_window,
+            max_output_tokens=max_output,
+            default_max_tokens=family_max_tokens,
+            supports_prompt_caching=caching or family_caching,
+            tokenizer=tokenizer,
+            source="litellm",
+        )
+
+    logger.debug(f"Model {model_name} not in registry, using family defaults ({family_window} token window)")
+    return ModelCapabilities(
+        model=model_name,
+        context_window=family_window,
+        max_output_tokens=family_output,
+        default_max_tokens=family_max_tokens,
+        supports_prompt_caching=family_caching,
+        tokenizer=tokenizer,
+        source="default",
+    )
+
+
+def get_input_budget(model_name: str, max_tokens: Optional[int] = None) -> int:
+    """Prompt token budget for a model and configured llm_max_tokens."""
+    return get_model_capabilities(model_name).input_budget(max_tokens)
+
+
+def get_pricing(model_name: str) -> Optional[Dict[str, float]]:
+    """Pricing entry for a model, resolving aliases and provider variants."""
+    for name in _name_variants(model_name):
+        if name in HARDCODED_MODEL_PRICES:
+            return HARDCODED_MODEL_PRICES[name]
+    canonical = resolve_model_name(model_name)
+    if canonical:
+        return HARDCODED_MODEL_PRICES.get(canonical)
+    return None
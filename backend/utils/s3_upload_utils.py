@@ -25,11 +25,30 @@ async def upload_base64_image(base64_data: str, bucket_name: str = "browser-scre
         
         # Decode base64 data
         image_data = base64.b64decode(base64_data)
+    except Exception as e:
+        logger.error(f"Error uploading base64 image: {e}")
+        raise RuntimeError(f"Failed to upload image: {str(e)}")
+
+    return await upload_image_bytes(image_data, bucket_name)
+
+async def upload_image_bytes(image_data: bytes, bucket_name: str = "browser-screenshots",
+                             content_type: str = "image/png", extension: str = "png") -> str:
+    """Upload raw image bytes to Supabase storage and return the URL.
+    
+    Args:
+        image_data (bytes): The image
+        bucket_name (str): Name of the storage bucket to upload to
+        content_type (str): MIME type of the image
+        extension (str): File extension of the stored object
         
+    Returns:
+        str: Public URL of the uploaded image
+    """
+    try:
         # Generate unique filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         unique_id = str(uuid.uuid4())[:8]
-        filename = f"image_{timestamp}_{unique_id}.png"
+        filename = f"image_{timestamp}_{unique_id}.{extension}"
         
         # Upload to Supabase storage
         db = DBConnection()
@@ -37,7 +56,7 @@ async def upload_base64_image(base64_data: str, bucket_name: str = "browser-scre
         storage_response = await client.storage.from_(bucket_name).upload(
             filename,
             image_data,
-            {"content-type": "image/png"}
+            {"content-type": content_type}
         )
         
         # Get public URL
@@ -47,5 +66,5 @@ async def upload_base64_image(base64_data: str, bucket_name: str = "browser-scre
         return public_url
         
     except Exception as e:
-        logger.error(f"Error uploading base64 image: {e}")
+        logger.error(f"Error uploading image: {e}")
         raise RuntimeError(f"Failed to upload image: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Streamed content coalescing benchmark
+
+Replays a synthetic LLM stream (deltas of a few characters arriving at a fixed
+rate) through the ChunkCoalescer, builds the content chunk messages the
+response processor yields and serializes them the way the worker does before
+publishing. Reports yielded events/sec, serialization time and the Redis
+writes per run (list entries and flush pipelines of the response publisher),
+with coalescing off and on.
+
+Usage:
+    python benchmark_chunk_coalescing.py
+    python benchmark_chunk_coalescing.py --deltas 2000 --delta-interval-ms 2 --windows 0 25 50 100
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the backend directory to the path so we can import modules
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from agentpress.chunk_coalescer import FLUSH_DUE, ChunkCoalescer, with_flush_deadlines
+from utils.json_helpers import to_json_string
+
+
+async def fake_stream(deltas: int, delta_chars: int, interval: float):
+    """Yield `deltas` content deltas, one every `interval` seconds."""
+    text = "lorem ipsum dolor sit amet "
+    for i in range(deltas):
+        await asyncio.sleep(interval)
+        start = (i * delta_chars) % len(text)
+        yield (text * 2)[start:start + delta_chars]
+
+
+def build_chunk(sequence: int, content: str) -> dict:
+    now_chunk = datetime.now(timezone.utc).isoformat()
+    return {
+        "sequence": sequence,
+        "message_id": None, "thread_id": "thread", "type": "assistant",
+        "is_llm_message": True,
+        "content": to_json_string({"role": "assistant", "content": content}),
+        "metadata": to_json_string({"stream_status": "chunk", "thread_run_id": "run"}),
+        "created_at": now_chunk, "updated_at": now_chunk
+    }
+
+
+async def run(deltas: int, delta_chars: int, interval: float, window_ms: int, max_chars: int, flush_interval_ms: int):
+    coalescer = ChunkCoalescer(window_ms=window_ms, max_chars=max_chars)
+    published = []  # publish times of the serialized events
+    serialize_seconds = 0.0
+    sequence = 0
+    content = ""
+
+    def emit(merged: str):
+        nonlocal sequence, serialize_seconds, content
+        start = time.perf_counter()
+        json.dumps(build_chunk(sequence, merged))
+        serialize_seconds += time.perf_counter() - start
+        published.append(time.monotonic())
+        sequence += 1
+        content += merged
+
+    started = time.monotonic()
+    async for delta in with_flush_deadlines(fake_stream(deltas, delta_chars, interval), coalescer):
+        if delta is FLUSH_DUE:
+            merged = coalescer.take()
+        else:
+            merged = coalescer.add(delta)
+        if merged:
+            emit(merged)
+    merged = coalescer.take()
+    if merged:
+        emit(merged)
+    elapsed = time.monotonic() - started
+
+    # The response publisher writes everything buffered once per flush interval
+    flush_windows = {int((t - started) * 1000 // flush_interval_ms) for t in published}
+    return {
+        "events": len(published),
+        "events_per_sec": len(published) / elapsed,
+        "serialize_ms": serialize_seconds * 1000,
+        "list_entries": len(published),
+        "pipelines": len(flush_windows),
+        "chars": len(content),
+        "elapsed_s": elapsed,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark streamed content coalescing")
+    arg_parser.add_argument("--deltas", type=int, default=1000, help="Deltas in the simulated response")
+    arg_parser.add_argument("--delta-chars", type=int, default=4, help="Characters per delta")
+    arg_parser.add_argument("--delta-interval-ms", type=float, default=3.0, help="Time between deltas")
+    arg_parser.add_argument("--windows", type=int, nargs="+", default=[0, 25, 50, 100], help="Coalescing windows in ms (0 = off)")
+    arg_parser.add_argument("--max-chars", type=int, default=2048, help="Buffered characters that release a chunk")
+    arg_parser.add_argument("--flush-interval-ms", type=int, default=50, help="Response publisher flush interval")
+    args = arg_parser.parse_args()
+
+    for window_ms in args.windows:
+        result = asyncio.run(run(
+            args.deltas, args.delta_chars, args.delta_interval_ms / 1000,
+            window_ms, args.max_chars, args.flush_interval_ms
+        ))
+        label = "off" if window_ms == 0 else f"{window_ms}ms"
+        print(
+            f"coalescing {label:>6} | {result['events']:>5} events ({result['events_per_sec']:8.1f}/s) | "
+            f"serialize {result['serialize_ms']:7.2f} ms | redis: {result['list_entries']:>5} list entries, "
+            f"{result['pipelines']:>4} pipelines | {result['chars']} chars in {result['elapsed_s']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+LLM connection pooling check against a local mock OpenAI-compatible server
+
+Starts an aiohttp server implementing /v1/chat/completions (JSON and SSE
+streaming), then sends sequential calls through services.llm.make_llm_api_call
+with the shared LLM HTTP pool enabled and disabled. Reports the connections the
+server accepted, the average latency per call and the pool's connect/TTFB stats.
+
+Usage:
+    python benchmark_llm_connections.py
+    python benchmark_llm_connections.py --calls 50 --stream --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to the path so we can import modules
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import litellm
+from aiohttp import web
+
+from services.llm import make_llm_api_call
+from services.llm_http import llm_client_pool
+
+
+def create_mock_app(latency: float, connections: set) -> web.Application:
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        connections.add(id(request.transport))
+        body = await request.json()
+        await asyncio.sleep(latency)
+        created = int(time.time())
+        if not body.get("stream"):
+            return web.json_response({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for content, finish_reason in (("po", None), ("ng", None), (None, "stop")):
+            delta = {"content": content} if content else {}
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+async def run_calls(api_base: str, calls: int, stream: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        response = await make_llm_api_call(
+            [{"role": "user", "content": "ping"}], "openai/mock-model",
+            api_key="mock-key", api_base=api_base, stream=stream
+        )
+        if stream:
+            async for _ in response:
+                pass
+    return (time.perf_counter() - start) / calls * 1000
+
+
+async def main_async(args):
+    connections: set = set()
+    runner = web.AppRunner(create_mock_app(args.latency_ms / 1000, connections))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    api_base = f"http://127.0.0.1:{args.port}/v1"
+
+    try:
+        for pooled in (False, True):
+            connections.clear()
+            llm_client_pool.enabled = pooled
+            await llm_client_pool.close()
+            # Start each configuration without the OpenAI SDK clients litellm cached
+            litellm.in_memory_llm_clients_cache.flush_cache()
+            llm_client_pool.stats.clear()
+            avg_ms = await run_calls(api_base, args.calls, args.stream)
+            print(f"pool {'on ' if pooled else 'off'} | {args.calls} calls | {len(connections)} connections accepted | {avg_ms:.2f} ms/call")
+            if pooled:
+                print(json.dumps(llm_client_pool.get_stats(), indent=2))
+    finally:
+        await llm_client_pool.close()
+        await runner.cleanup()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Check LLM connection pooling against a mock server")
+    arg_parser.add_argument("--calls", type=int, default=20, help="Sequential calls per configuration")
+    arg_parser.add_argument("--port", type=int, default=8765, help="Port of the mock server")
+    arg_parser.add_argument("--latency-ms", type=float, default=5.0, help="Server-side latency per call")
+    arg_parser.add_argument("--stream", action="store_true", help="Use streaming responses")
+    asyncio.run(main_async(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
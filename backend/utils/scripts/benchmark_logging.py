@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Logging pipeline micro-benchmark
+
+Measures the cost of one log call in the calling thread for the "sync"
+pipeline (callsite inspection and JSON rendering on every call) and the
+"async" pipeline (rendering and writing on a background thread), for an
+INFO log, a filtered DEBUG log, a WARNING (callsite added) and an INFO log
+carrying a large value. Output goes to /dev/null.
+
+Usage:
+    python benchmark_logging.py
+    python benchmark_logging.py --calls 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to the path so we can import modules
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import structlog
+from utils import logger as logger_module
+
+LARGE_VALUE = "x" * 100_000
+
+
+def measure(log_call, calls: int) -> float:
+    """Microseconds per call spent in the caller."""
+    start = time.perf_counter()
+    for i in range(calls):
+        log_call(i)
+    return (time.perf_counter() - start) / calls * 1_000_000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the cost of log calls")
+    arg_parser.add_argument("--calls", type=int, default=20000, help="Log calls per case")
+    args = arg_parser.parse_args()
+
+    cases = {
+        "info": lambda log, i: log.info(f"Tool execution complete: web_search {i}"),
+        "debug (filtered)": lambda log, i: log.debug(f"Found tool function {i}"),
+        "warning": lambda log, i: log.warning(f"Slow flush {i}"),
+        "info, 100KB value": lambda log, i: log.info("Tool result", output=LARGE_VALUE),
+    }
+
+    devnull = open(os.devnull, "w")
+    results = {}
+    for mode in ("sync", "async"):
+        logger_module.configure_logging(mode, file=devnull)
+        log = structlog.get_logger()
+        for name, case in cases.items():
+            results[(mode, name)] = measure(lambda i: case(log, i), args.calls)
+
+    for name in cases:
+        sync_us, async_us = results[("sync", name)], results[("async", name)]
+        print(f"{name:>18} | sync {sync_us:8.2f} us/call | async {async_us:8.2f} us/call | {sync_us / async_us:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Token counting benchmark
+
+Builds synthetic threads (user, assistant and tool result messages of mixed
+length) and measures the cost of counting their tokens the way ContextManager
+does on every turn: litellm's token_counter over the whole list (no cache), a
+cold TokenCountCache (every message tokenized once), a warm cache (the same
+thread counted again) and a warm cache after one new message was appended
+(the typical next turn).
+
+Usage:
+    python benchmark_token_counting.py
+    python benchmark_token_counting.py --sizes 100 1000 5000 --model anthropic/claude-sonnet-4-20250514
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the backend directory to the path so we can import modules
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from litellm.utils import token_counter
+from agentpress.token_cache import TokenCountCache
+
+SENTENCE = "The agent inspected the workspace, ran the tests and summarized the failures. "
+
+
+def build_message(i: int) -> dict:
+    role = ("user", "assistant", "user")[i % 3]
+    content = SENTENCE * (1 + (i * 7) % 40)
+    if i % 3 == 2:
+        content = f"<tool_result> {content} </tool_result>"
+    return {"role": role, "content": content, "message_id": str(uuid.uuid4())}
+
+
+def timed(fn) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(model: str, size: int) -> dict:
+    messages = [build_message(i) for i in range(size)]
+    cache = TokenCountCache()
+
+    uncached, uncached_ms = timed(lambda: token_counter(model=model, messages=messages))
+    cold, cold_ms = timed(lambda: cache.count_messages(model, messages))
+    warm, warm_ms = timed(lambda: cache.count_messages(model, messages))
+    messages.append(build_message(size))
+    appended, appended_ms = timed(lambda: cache.count_messages(model, messages))
+
+    return {
+        "uncached_tokens": uncached, "uncached_ms": uncached_ms,
+        "cached_tokens": cold, "cold_ms": cold_ms,
+        "warm_ms": warm_ms, "appended_ms": appended_ms,
+        "consistent": cold == warm and appended >= warm,
+        "hit_rate": cache.get_stats()["hit_rate"],
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark cached token counting")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Thread sizes in messages")
+    arg_parser.add_argument("--model", default="anthropic/claude-sonnet-4-20250514", help="Model whose tokenizer is used")
+    args = arg_parser.parse_args()
+
+    for size in args.sizes:
+        result = run(args.model, size)
+        print(
+            f"{size:>5} messages | uncached {result['uncached_ms']:9.1f} ms ({result['uncached_tokens']} tokens) | "
+            f"cold cache {result['cold_ms']:9.1f} ms ({result['cached_tokens']} tokens) | "
+            f"warm {result['warm_ms']:7.2f} ms | +1 message {result['appended_ms']:7.2f} ms | "
+            f"hit rate {result['hit_rate']:.0%}{'' if result['consistent'] else ' | INCONSISTENT TOTALS'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Streaming XML tool-call parser micro-benchmark
+
+Compares the incremental StreamingXMLToolParser with the previous approach of
+re-extracting <function_calls> blocks from the whole accumulated buffer after
+every delta, on synthetic responses of 1KB to 1MB (one create_file call whose
+file_contents parameter makes up most of the response).
+
+Usage:
+    python benchmark_xml_stream_parser.py
+    python benchmark_xml_stream_parser.py --sizes 1024 65536 --chunk-size 64 --repeat 5
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to the path so we can import modules
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from agentpress.xml_tool_parser import StreamingXMLToolParser, XMLToolParser
+
+DEFAULT_SIZES = [1024, 16 * 1024, 128 * 1024, 1024 * 1024]
+
+
+def build_response(size: int) -> str:
+    """Build an assistant response of roughly `size` characters."""
+    prefix = "I'll create the page now.\n\n<function_calls>\n<invoke name=\"create_file\">\n"
+    prefix += "<parameter name=\"file_path\">index.html</parameter>\n<parameter name=\"file_contents\">"
+    suffix = "</parameter>\n</invoke>\n</function_calls>\n\nThe page is ready."
+    line = "<div class=\"row\"><span>lorem ipsum dolor sit amet</span></div>\n"
+    body_size = max(size - len(prefix) - len(suffix), 0)
+    body = (line * (body_size // len(line) + 1))[:body_size]
+    return prefix + body + suffix
+
+
+def extract_xml_chunks(content: str):
+    """The block extraction previously run over the whole buffer on every delta."""
+    chunks = []
+    pos = 0
+    while pos < len(content):
+        start_pos = content.find('<function_calls>', pos)
+        if start_pos == -1:
+            break
+        end_pos = content.find('</function_calls>', start_pos)
+        if end_pos == -1:
+            break
+        chunk_end = end_pos + len('</function_calls>')
+        chunks.append(content[start_pos:chunk_end])
+        pos = chunk_end
+    return chunks
+
+
+def run_rescan(deltas, parser: XMLToolParser) -> int:
+    current_xml_content = ""
+    calls = 0
+    for delta in deltas:
+        current_xml_content += delta
+        for xml_chunk in extract_xml_chunks(current_xml_content):
+            current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
+            calls += len(parser.parse_content(xml_chunk)[:1])
+    return calls
+
+
+def run_incremental(deltas, parser: XMLToolParser) -> int:
+    stream_parser = StreamingXMLToolParser(parser)
+    calls = 0
+    for delta in deltas:
+        for block in stream_parser.feed(delta):
+            calls += len(block.tool_calls[:1])
+    return calls
+
+
+def benchmark(size: int, chunk_size: int, repeat: int):
+    response = build_response(size)
+    deltas = [response[i:i + chunk_size] for i in range(0, len(response), chunk_size)]
+    parser = XMLToolParser()
+
+    results = {}
+    for name, runner in (("rescan", run_rescan), ("incremental", run_incremental)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            calls = runner(deltas, parser)
+            best = min(best, time.perf_counter() - start)
+        if calls != 1:
+            raise RuntimeError(f"{name} parser found {calls} tool calls, expected 1")
+        results[name] = best
+
+    mb = len(response) / (1024 * 1024)
+    print(
+        f"{len(response):>9} chars {len(deltas):>6} deltas | "
+        f"rescan {results['rescan'] * 1000:9.2f} ms ({mb / results['rescan']:8.2f} MB/s) | "
+        f"incremental {results['incremental'] * 1000:8.2f} ms ({mb / results['incremental']:8.2f} MB/s) | "
+        f"speedup {results['rescan'] / results['incremental']:7.1f}x"
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark streaming XML tool-call parsing")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Response sizes in characters")
+    arg_parser.add_argument("--chunk-size", type=int, default=32, help="Characters per streamed delta")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per size (best is reported)")
+    args = arg_parser.parse_args()
+
+    for size in args.sizes:
+        benchmark(size, args.chunk_size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()